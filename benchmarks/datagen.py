@@ -0,0 +1,173 @@
+"""Synthetic dataset generator shared by the benchmark scripts.
+
+The generator writes straight into the application database with batched
+``executemany`` inserts so that large datasets can be seeded quickly.  It
+must be imported *after* ``DATABASE_PATH`` has been pointed at a scratch
+file, otherwise it will seed the development database. With
+``REPOSITORY_BACKEND=memory`` rows go through the in-memory repositories
+instead.
+"""
+import bisect
+import itertools
+import json
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+BENCH_PASSWORD = 'password123'
+
+BUSINESS_TYPES = [
+    'Restaurant', 'Software Development', 'Consulting', 'Bakery', 'Law Firm',
+    'Dental Clinic', 'Fitness Studio', 'Marketing Agency', 'Tech Startup', 'Food Truck',
+]
+INDUSTRIES = [
+    'Technology', 'Hospitality', 'Healthcare', 'Finance', 'Education',
+    'Retail', 'Real Estate', 'Legal', 'Italian', 'Manufacturing',
+]
+
+
+def make_content(company_name, business_type, industry):
+    """Return website content shaped like the template generator's output."""
+    return {
+        "title": f"{company_name} - Professional {business_type}",
+        "hero": f"Welcome to {company_name}, your trusted partner in {industry}. We provide exceptional {business_type.lower()} services tailored to your needs.",
+        "about": f"At {company_name}, we are a leading {business_type.lower()} specializing in {industry.lower()} solutions. Our experienced team is dedicated to delivering innovative services that drive success for our clients.",
+        "services": f"We offer comprehensive {industry.lower()} services including consultation, strategy development, implementation, and ongoing support.",
+        "contact": f"Ready to get started? Contact {company_name} today to learn more about how our {industry.lower()} expertise can benefit your business."
+    }
+
+
+def owner_weights(num_users, distribution='uniform', zipf_s=1.1):
+    """Return cumulative weights used to pick the owner of each website.
+
+    ``uniform`` spreads websites evenly; ``zipf`` gives a few agency-style
+    accounts most of the sites, which is what production looks like.
+    """
+    if distribution == 'uniform':
+        weights = [1.0] * num_users
+    elif distribution == 'zipf':
+        weights = [1.0 / (rank ** zipf_s) for rank in range(1, num_users + 1)]
+    else:
+        raise ValueError(f'Unknown distribution: {distribution}')
+    return list(itertools.accumulate(weights))
+
+
+def seed(num_users, num_websites, distribution='uniform', zipf_s=1.1,
+         admin_ratio=0.01, seed_value=42, batch_size=5000):
+    """Seed ``num_users`` users and ``num_websites`` websites.
+
+    Returns a dict with the seeded users (``id``, ``email``, ``role``) and a
+    mapping of user id to the ids of the websites they own. Websites go to
+    their owner's shard when ``WEBSITE_SHARDS`` is above 1.
+    """
+    from src.models.database import db
+    from src.models import shards
+    from src.models.user import User
+
+    if num_users < 0 or num_websites < 0 or batch_size < 1:
+        raise ValueError('num_users and num_websites must be >= 0 and batch_size >= 1')
+    if num_websites and not num_users:
+        raise ValueError('Seeding websites needs at least one user to own them')
+
+    rng = random.Random(seed_value)
+    # Hashing is deliberately expensive; every seeded user shares one hash.
+    password_hash = User('seed@example.com', BENCH_PASSWORD).password_hash
+    now = datetime.utcnow()
+
+    cursor = db.cursor()
+    row = cursor.execute('SELECT COALESCE(MAX(id), 0) AS max_id FROM users').fetchone()
+    first_user_id = row['max_id'] + 1
+
+    users = []
+    batch = []
+    for offset in range(num_users):
+        user_id = first_user_id + offset
+        email = f'bench{user_id}@example.com'
+        role = 'admin' if rng.random() < admin_ratio else 'editor'
+        created_at = (now - timedelta(days=rng.randint(0, 365))).isoformat()
+        users.append({'id': user_id, 'email': email, 'role': role})
+        batch.append((user_id, email, f'bench{user_id}', password_hash, role, created_at, created_at))
+        if len(batch) >= batch_size:
+            _insert_users(cursor, batch)
+            batch = []
+    if batch:
+        _insert_users(cursor, batch)
+    db.commit()
+
+    # Ids are assigned here so websites can be inserted with executemany too;
+    # explicit ids still advance the AUTOINCREMENT counter. Sharded, ids come
+    # from the blocks the app reserves for all shards.
+    if shards.is_sharded():
+        website_ids = iter(shards.allocate_ids(num_websites))
+    else:
+        row = cursor.execute('''
+            SELECT MAX(COALESCE((SELECT MAX(id) FROM websites), 0),
+                       COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'websites'), 0)) AS max_id
+        ''').fetchone()
+        website_ids = itertools.count(row['max_id'] + 1)
+
+    cumulative = owner_weights(num_users, distribution, zipf_s) if num_users else []
+    websites_by_user = {}
+    batch = []
+    for index in range(num_websites):
+        owner = users[bisect.bisect_left(cumulative, rng.random() * cumulative[-1])]
+        business_type = rng.choice(BUSINESS_TYPES)
+        industry = rng.choice(INDUSTRIES)
+        content = make_content(f'Company {index}', business_type, industry)
+        created_at = (now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))).isoformat()
+        batch.append((next(website_ids), content['title'], json.dumps(content), owner['id'],
+                      business_type, industry, created_at, created_at))
+        if len(batch) >= batch_size:
+            _insert_websites(batch, websites_by_user)
+            batch = []
+    if batch:
+        _insert_websites(batch, websites_by_user)
+
+    return {'users': users, 'websites_by_user': websites_by_user}
+
+
+USER_COLUMNS = ('id', 'email', 'username', 'password_hash', 'role', 'created_at', 'updated_at')
+WEBSITE_COLUMNS = ('id', 'title', 'content', 'user_id', 'business_type', 'industry', 'created_at', 'updated_at')
+
+
+def _memory_repositories():
+    from src.repositories.registry import backend, repositories
+    return repositories() if backend() == 'memory' else None
+
+
+def _insert_users(cursor, batch):
+    memory = _memory_repositories()
+    if memory:
+        for row in batch:
+            memory.users.insert(dict(zip(USER_COLUMNS, row)))
+        return
+    cursor.executemany('''
+        INSERT INTO users (id, email, username, password_hash, role, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', batch)
+
+
+def _insert_websites(batch, websites_by_user):
+    from src.models import shards
+
+    memory = _memory_repositories()
+    if memory:
+        items = [(SimpleNamespace(), dict(zip(WEBSITE_COLUMNS, row))) for row in batch]
+        memory.websites.bulk_insert(items)
+        for website, values in items:
+            websites_by_user.setdefault(values['user_id'], []).append(website.id)
+        return
+    # One executemany and commit per shard
+    by_shard = {}
+    for row in batch:
+        by_shard.setdefault(shards.shard_for(row[3]), []).append(row)
+    for shard, rows in by_shard.items():
+        connection = shards.connection(shard)
+        with connection.lock:
+            connection.executemany('''
+                INSERT INTO websites (id, title, content, user_id, business_type, industry, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            connection.commit()
+    for row in batch:
+        websites_by_user.setdefault(row[3], []).append(row[0])
@@ -0,0 +1,413 @@
+"""HTTP-level load test for the AI Website Builder API.
+
+Seeds a synthetic dataset, then replays a weighted mix of the requests from
+``AI_Website_Builder_API.postman_collection.json`` at a fixed concurrency and
+reports throughput plus p50/p95/p99 latency per endpoint.
+
+In-process (Flask test client, scratch database)::
+
+    python -m benchmarks.load_test --users 200 --websites 5000 --requests 5000
+
+Against a local gunicorn sharing the seeded database::
+
+    DATABASE_PATH=/tmp/bench.db gunicorn -w 4 src.main:app
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --database /tmp/bench.db
+
+Results are written as JSON; pass ``--baseline`` with an earlier result file
+to flag endpoints whose latency or throughput regressed.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_COLLECTION = os.path.join(ROOT, 'AI_Website_Builder_API.postman_collection.json')
+DEFAULT_MIX = 'login=15,signup=5,generate=10,list=35,update=15,preview=20'
+
+# Benchmark operation -> request name in the Postman collection
+OPERATIONS = {
+    'signup': 'Sign Up',
+    'login': 'Login',
+    'generate': 'Generate Website Content',
+    'list': 'Get All Websites',
+    'update': 'Update Website',
+    'preview': 'Preview Website',
+}
+
+
+def load_collection(path):
+    """Return ``{request name: {'method', 'path', 'body'}}`` from a Postman collection."""
+    with open(path) as f:
+        collection = json.load(f)
+
+    requests = {}
+
+    def walk(items):
+        for item in items:
+            if 'item' in item:
+                walk(item['item'])
+                continue
+            request = item['request']
+            url = request['url']
+            segments = url['path'] if isinstance(url, dict) else url.split('}}', 1)[-1].strip('/').split('/')
+            raw_body = (request.get('body') or {}).get('raw')
+            requests[item['name']] = {
+                'method': request['method'],
+                'path': '/' + '/'.join(segments),
+                'body': json.loads(raw_body) if raw_body else None,
+            }
+
+    walk(collection['item'])
+    return requests
+
+
+def load_replay(path):
+    """Load recorded requests (one JSON object per line with method and path).
+
+    Lines that do not describe an HTTP request are skipped, so backlog-style
+    JSONL files can be passed without pre-filtering.
+    """
+    entries = []
+    skipped = 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            if not isinstance(entry, dict) or 'method' not in entry or 'path' not in entry:
+                skipped += 1
+                continue
+            entries.append(entry)
+    return entries, skipped
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS and name != 'replay':
+            raise ValueError(f'Unknown operation in mix: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class InProcessClient:
+    """Wraps a Flask test client with the same interface as ``HttpClient``."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        data = response.get_json(silent=True)
+        return response.status_code, data
+
+
+class HttpClient:
+    """Keep-alive HTTP client for a running server."""
+
+    def __init__(self, base_url):
+        import httpx
+        self.client = httpx.Client(base_url=base_url, timeout=60.0)
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self.client.request(method, path, json=body, headers=headers)
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        return response.status_code, data
+
+
+class LoadTest:
+    def __init__(self, args, client_factory, dataset, collection, replay):
+        self.args = args
+        self.client_factory = client_factory
+        self.dataset = dataset
+        self.collection = collection
+        self.replay = replay
+        self.mix = parse_mix(args.mix)
+        if replay and 'replay' not in self.mix:
+            self.mix['replay'] = args.replay_weight
+        self.operations = list(self.mix)
+        self.weights = [self.mix[name] for name in self.operations]
+        self.sessions = []
+        self.results = {}
+        self.lock = threading.Lock()
+        self.issued = 0
+        self.signup_counter = 0
+
+    def login_sessions(self):
+        """Log in a pool of seeded users; the tokens are shared by the workers."""
+        client = self.client_factory()
+        users = self.dataset['users']
+        rng = random.Random(self.args.seed)
+        pool = rng.sample(users, min(len(users), self.args.sessions))
+        for user in pool:
+            status, data = client.request('POST', '/api/auth/login',
+                                          {'email': user['email'], 'password': self.args.password})
+            if status != 200:
+                raise RuntimeError(f'Login failed for {user["email"]}: {status} {data}')
+            self.sessions.append({
+                'token': data['access_token'],
+                'user_id': user['id'],
+                'email': user['email'],
+                'websites': list(self.dataset['websites_by_user'].get(user['id'], [])),
+            })
+
+    def next_slot(self):
+        with self.lock:
+            if self.issued >= self.args.requests:
+                return False
+            self.issued += 1
+            return True
+
+    def record(self, name, status, elapsed):
+        with self.lock:
+            stats = self.results.setdefault(name, {'latencies': [], 'errors': 0, 'status_codes': {}})
+            stats['latencies'].append(elapsed)
+            stats['status_codes'][str(status)] = stats['status_codes'].get(str(status), 0) + 1
+            if status >= 400:
+                stats['errors'] += 1
+
+    def build_request(self, operation, session, rng):
+        if operation == 'replay':
+            entry = rng.choice(self.replay)
+            website_ids = session['websites'] or [1]
+            path = entry['path'].replace('{website_id}', str(rng.choice(website_ids)))
+            name = entry.get('name') or f'{entry["method"]} {entry["path"]}'
+            return name, entry['method'], path, entry.get('body'), session['token'] if entry.get('auth', True) else None
+
+        template = self.collection[OPERATIONS[operation]]
+        body = dict(template['body']) if template['body'] else None
+        path = template['path']
+        token = session['token']
+
+        if operation == 'signup':
+            with self.lock:
+                self.signup_counter += 1
+                counter = self.signup_counter
+            body['email'] = f'signup{os.getpid()}_{counter}_{rng.randrange(10 ** 9)}@example.com'
+            body['username'] = f'signup{counter}'
+            token = None
+        elif operation == 'login':
+            body = {'email': session['email'], 'password': self.args.password}
+            token = None
+        elif operation in ('update', 'preview'):
+            if not session['websites']:
+                return None
+            path = path.rsplit('/', 1)[0] + '/' + str(rng.choice(session['websites']))
+            if operation == 'preview':
+                token = None
+        return operation, template['method'], path, body, token
+
+    def worker(self, worker_id):
+        client = self.client_factory()
+        rng = random.Random(self.args.seed + worker_id + 1)
+        deadline = time.perf_counter() + self.args.duration if self.args.duration else None
+        while self.next_slot():
+            if deadline and time.perf_counter() > deadline:
+                break
+            operation = rng.choices(self.operations, self.weights)[0]
+            session = rng.choice(self.sessions)
+            request = self.build_request(operation, session, rng)
+            if request is None:
+                continue
+            name, method, path, body, token = request
+            started = time.perf_counter()
+            try:
+                status, data = client.request(method, path, body, token)
+            except Exception:
+                status, data = 599, None
+            elapsed = time.perf_counter() - started
+            self.record(name, status, elapsed)
+            if name == 'generate' and status == 201 and data:
+                with self.lock:
+                    session['websites'].append(int(data['website']['id']))
+
+    def run(self):
+        self.login_sessions()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
+            list(executor.map(self.worker, range(self.args.concurrency)))
+        return time.perf_counter() - started
+
+    def report(self, duration):
+        endpoints = {}
+        total = 0
+        errors = 0
+        for name, stats in sorted(self.results.items()):
+            latencies = sorted(stats['latencies'])
+            count = len(latencies)
+            total += count
+            errors += stats['errors']
+            endpoints[name] = {
+                'count': count,
+                'errors': stats['errors'],
+                'status_codes': stats['status_codes'],
+                'throughput_rps': round(count / duration, 2) if duration else 0.0,
+                'mean_ms': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+                'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+                'max_ms': round(latencies[-1] * 1000, 3) if count else 0.0,
+            }
+        return {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat(),
+                'target': self.args.base_url or 'in-process',
+                'users': self.args.users,
+                'websites': self.args.websites,
+                'distribution': self.args.distribution,
+                'concurrency': self.args.concurrency,
+                'mix': self.mix,
+            },
+            'totals': {
+                'requests': total,
+                'errors': errors,
+                'duration_s': round(duration, 3),
+                'throughput_rps': round(total / duration, 2) if duration else 0.0,
+            },
+            'endpoints': endpoints,
+        }
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of human-readable regressions against ``baseline``."""
+    regressions = []
+    for name, current in result['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {previous[metric]} -> {current[metric]}')
+        if previous['throughput_rps'] and current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(f'{name}: throughput_rps {previous["throughput_rps"]} -> {current["throughput_rps"]}')
+    return regressions
+
+
+def print_report(result):
+    print(f'{"endpoint":<28}{"count":>8}{"err":>6}{"rps":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for name, stats in result['endpoints'].items():
+        print(f'{name[:27]:<28}{stats["count"]:>8}{stats["errors"]:>6}{stats["throughput_rps"]:>10}'
+              f'{stats["p50_ms"]:>10}{stats["p95_ms"]:>10}{stats["p99_ms"]:>10}')
+    totals = result['totals']
+    print(f'total: {totals["requests"]} requests, {totals["errors"]} errors, '
+          f'{totals["throughput_rps"]} req/s over {totals["duration_s"]}s')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100, help='number of synthetic users to seed')
+    parser.add_argument('--websites', type=int, default=1000, help='number of synthetic websites to seed')
+    parser.add_argument('--distribution', choices=['uniform', 'zipf'], default='zipf',
+                        help='how websites are spread across owners')
+    parser.add_argument('--zipf-s', type=float, default=1.1, help='zipf exponent for --distribution zipf')
+    parser.add_argument('--requests', type=int, default=2000, help='total requests to issue')
+    parser.add_argument('--duration', type=float, default=0, help='optional time limit in seconds')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of concurrent clients')
+    parser.add_argument('--sessions', type=int, default=32, help='number of logged-in users to drive')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='weighted operation mix, e.g. "login=1,list=4"')
+    parser.add_argument('--collection', default=DEFAULT_COLLECTION, help='Postman collection with request bodies')
+    parser.add_argument('--replay', help='JSONL file of recorded requests ({"method", "path", "body"})')
+    parser.add_argument('--replay-weight', type=float, default=10, help='mix weight for replayed requests')
+    parser.add_argument('--base-url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--database', help='database file to seed (defaults to a scratch file in-process)')
+    parser.add_argument('--no-seed', action='store_true', help='skip seeding (reuse --database as is)')
+    parser.add_argument('--password', default=None, help='password of the seeded users')
+    parser.add_argument('--rate-limits', action='store_true',
+                        help='keep rate limiting enabled for the in-process app (off by default)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--output', default='bench_output.json', help='where to write the JSON results')
+    parser.add_argument('--baseline', help='earlier JSON result to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.base_url and not args.database:
+        raise SystemExit('--database is required with --base-url so the server and the seeder share data')
+    if args.database:
+        os.environ['DATABASE_PATH'] = os.path.abspath(args.database)
+    else:
+        os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'app.db')
+
+    if not args.rate_limits:
+        # Every simulated client shares one address; throttling would dominate
+        os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+    from benchmarks import datagen
+    args.password = args.password or datagen.BENCH_PASSWORD
+
+    if args.no_seed:
+        from src.models.database import db
+        rows = db.execute('SELECT id, email, role FROM users').fetchall()
+        dataset = {'users': [dict(row) for row in rows], 'websites_by_user': {}}
+        for row in db.execute('SELECT id, user_id FROM websites'):
+            dataset['websites_by_user'].setdefault(row['user_id'], []).append(row['id'])
+    else:
+        started = time.perf_counter()
+        dataset = datagen.seed(args.users, args.websites, args.distribution, args.zipf_s, seed_value=args.seed)
+        print(f'seeded {args.users} users / {args.websites} websites in {time.perf_counter() - started:.1f}s')
+
+    if args.base_url:
+        client_factory = lambda: HttpClient(args.base_url)
+    else:
+        from src.main import app
+        client_factory = lambda: InProcessClient(app)
+
+    replay = []
+    if args.replay:
+        replay, skipped = load_replay(args.replay)
+        print(f'loaded {len(replay)} replay requests ({skipped} non-request lines skipped)')
+
+    test = LoadTest(args, client_factory, dataset, load_collection(args.collection), replay)
+    duration = test.run()
+    result = test.report(duration)
+    print_report(result)
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'results written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print('REGRESSIONS:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('no regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
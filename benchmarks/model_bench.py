@@ -0,0 +1,210 @@
+"""Micro-benchmarks for the model layer hot paths.
+
+Each dataset size runs in its own subprocess against a scratch database, so
+timings and tracemalloc peaks are not polluted by earlier sizes::
+
+    python -m benchmarks.model_bench --sizes 1000,100000
+    python -m benchmarks.model_bench --sizes 1000 --check benchmarks/model_thresholds.json
+    python -m benchmarks.model_bench --sizes 1000 --backend sqlalchemy
+    python -m benchmarks.model_bench --sizes 1000,100000 --record benchmarks/model_thresholds.json
+
+Sizes are row counts for both ``users`` and ``websites``.  With ``--check``
+the run exits non-zero when a benchmark is slower (mean) or allocates more
+(tracemalloc peak) than the thresholds recorded for its size.  ``--record``
+writes those thresholds from the run itself: the measured p95 and peak times
+``--margin``, so the gate sits well clear of run-to-run noise instead of at
+a hand-picked number next to the mean.  The committed thresholds were
+recorded that way with the default ``sqlite`` repository backend; re-record
+them on the CI machine after an intended change.  ``Website.save`` peaks
+include one zlib compressor (~45 KB) for the compressed content.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_thresholds.json')
+# Below these a threshold is timer resolution and allocator noise, not signal
+MIN_MEAN_MS = 0.05
+MIN_PEAK_KB = 16
+
+
+def measure(func, repeat):
+    """Return timing and allocation statistics for ``func``."""
+    func()  # warm caches and lazily compiled statements
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'repeat': repeat,
+        'mean_ms': round(statistics.fmean(timings) * 1000, 4),
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 4),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_size(size, repeat, skip):
+    """Seed ``size`` rows and run every benchmark; returns ``{name: stats}``."""
+    from benchmarks import datagen
+    from src.models.role import Role
+    from src.models.user import User
+    from src.models.website import Website
+    from src.services import json_codec
+
+    started = time.perf_counter()
+    dataset = datagen.seed(size, size, distribution='zipf', seed_value=size)
+    seed_seconds = time.perf_counter() - started
+
+    rng = random.Random(size)
+    user_ids = [user['id'] for user in dataset['users']]
+    website_ids = [website_id for ids in dataset['websites_by_user'].values() for website_id in ids]
+    heaviest_user = max(dataset['websites_by_user'], key=lambda user_id: len(dataset['websites_by_user'][user_id]))
+    user = User.find_by_id(user_ids[0])
+    website = Website.find_by_id(website_ids[0])
+    # Large scans are expensive; keep total runtime bounded as the dataset grows.
+    scan_repeat = max(1, min(repeat, 100000 // size))
+
+    benchmarks = {
+        'Website.find_all': (lambda: Website.find_all(), scan_repeat),
+        'Website.find_by_user_id[heaviest]': (lambda: Website.find_by_user_id(heaviest_user), scan_repeat),
+        'Website.find_by_user_id[random]': (lambda: Website.find_by_user_id(rng.choice(user_ids)), repeat),
+        'Website.find_by_id': (lambda: Website.find_by_id(rng.choice(website_ids)), repeat),
+        'Website.save[insert]': (
+            lambda: Website('Bench', datagen.make_content('Bench', 'Bakery', 'Retail'), user_ids[0]).save(), repeat),
+        'Website.save[update]': (lambda: website.save(), repeat),
+        'Website.to_dict': (lambda: website.to_dict(), repeat),
+        'Website.clone[100 copies]': (lambda: Website.clone(website, user_ids[0], [
+            {'title': f'Copy {i}', 'content': {'hero': f'Hero {i}'} if i % 2 else None} for i in range(100)]),
+            scan_repeat),
+        'Website.to_json[find_by_id]': (
+            lambda: json_codec.dumps_bytes(Website.find_by_id(rng.choice(website_ids)).to_dict()), repeat),
+        'User.find_by_id': (lambda: User.find_by_id(rng.choice(user_ids)), repeat),
+        'User.check_password': (lambda: user.check_password(datagen.BENCH_PASSWORD), repeat),
+        'Role.find_all': (lambda: Role.find_all(), repeat),
+    }
+
+    results = {'_seed_seconds': round(seed_seconds, 2)}
+    for name, (func, count) in benchmarks.items():
+        if any(name.startswith(prefix) for prefix in skip):
+            continue
+        results[name] = measure(func, count)
+        print(f'  {size:>8} {name:<36} mean {results[name]["mean_ms"]:>10} ms  '
+              f'peak {results[name]["peak_kb"]:>10} KB', file=sys.stderr)
+    return results
+
+
+def check(results, thresholds):
+    """Return the list of threshold violations."""
+    failures = []
+    for size, benchmarks in results.items():
+        for name, limits in thresholds.get(size, {}).items():
+            stats = benchmarks.get(name)
+            if stats is None:
+                continue
+            if 'max_mean_ms' in limits and stats['mean_ms'] > limits['max_mean_ms']:
+                failures.append(f'{size} {name}: mean {stats["mean_ms"]} ms > {limits["max_mean_ms"]} ms')
+            if 'max_peak_kb' in limits and stats['peak_kb'] > limits['max_peak_kb']:
+                failures.append(f'{size} {name}: peak {stats["peak_kb"]} KB > {limits["max_peak_kb"]} KB')
+    return failures
+
+
+def _round_up(value, floor):
+    """Round ``value`` up to two significant digits, but not below ``floor``."""
+    if value <= floor:
+        return floor
+    step = 10 ** (math.floor(math.log10(value)) - 1)
+    return round(math.ceil(value / step) * step, 6)
+
+
+def derive_thresholds(results, margin):
+    """Thresholds for ``results``: each benchmark's p95 and peak times ``margin``."""
+    thresholds = {}
+    for size, benchmarks in results.items():
+        thresholds[size] = {
+            name: {'max_mean_ms': _round_up(stats['p95_ms'] * margin, MIN_MEAN_MS),
+                   'max_peak_kb': _round_up(stats['peak_kb'] * margin, MIN_PEAK_KB)}
+            for name, stats in benchmarks.items() if not name.startswith('_')}
+    return thresholds
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,100000', help='comma-separated row counts (e.g. 1000,100000,1000000)')
+    parser.add_argument('--repeat', type=int, default=200, help='iterations per point benchmark')
+    parser.add_argument('--skip', default='', help='comma-separated benchmark name prefixes to skip')
+    parser.add_argument('--backend', default=os.getenv('REPOSITORY_BACKEND', 'sqlite'),
+                        help='repository backend: sqlite, sqlalchemy or memory')
+    parser.add_argument('--output', default='bench_output.json', help='where to write the JSON results')
+    parser.add_argument('--check', nargs='?', const=DEFAULT_THRESHOLDS,
+                        help='fail when results exceed the thresholds file')
+    parser.add_argument('--record', nargs='?', const=DEFAULT_THRESHOLDS,
+                        help='write thresholds derived from this run to the thresholds file')
+    parser.add_argument('--margin', type=float, default=1.5,
+                        help='headroom over the measured p95 and peak when recording (default 1.5)')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    skip = [prefix for prefix in args.skip.split(',') if prefix]
+
+    if args.child:
+        json.dump(run_size(args.child, args.repeat, skip), sys.stdout)
+        return 0
+
+    results = {}
+    for size in [int(value) for value in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory(prefix='model-bench-') as scratch:
+            env = dict(os.environ, DATABASE_PATH=os.path.join(scratch, 'app.db'), REPOSITORY_BACKEND=args.backend)
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.model_bench', '--child', str(size),
+                 '--repeat', str(args.repeat), '--skip', args.skip],
+                cwd=ROOT, env=env, stdout=subprocess.PIPE, check=True)
+        results[str(size)] = json.loads(completed.stdout)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {args.output}')
+
+    if args.record:
+        with open(args.record, 'w') as f:
+            json.dump(derive_thresholds(results, args.margin), f, indent=2)
+            f.write('\n')
+        print(f'thresholds ({args.margin}x p95 and peak) written to {args.record}')
+
+    if args.check:
+        with open(args.check) as f:
+            thresholds = json.load(f)
+        failures = check(results, thresholds)
+        if failures:
+            print('THRESHOLDS EXCEEDED:')
+            for line in failures:
+                print(f'  {line}')
+            return 1
+        print('all benchmarks within thresholds')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
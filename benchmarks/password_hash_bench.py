@@ -0,0 +1,90 @@
+"""Login throughput of the password hashing service.
+
+Runs a storm of password verifications from many threads for each pool size
+and reports logins per second, logins per second per core, and how late a
+10 ms ticker thread wakes up while the storm is running (a proxy for how much
+the storm stalls unrelated requests)::
+
+    python -m benchmarks.password_hash_bench --workers 0,1,2,4 --logins 200
+
+``--workers 0`` hashes inline on the request threads for comparison.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.services.password_hasher import PasswordHasher
+
+
+def ticker(stop, delays, interval=0.01):
+    """Record how late each 10 ms tick fires."""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        time.sleep(interval)
+        delays.append(max(0.0, time.perf_counter() - expected))
+
+
+def run(workers, logins, concurrency):
+    hasher = PasswordHasher(workers=workers)
+    stored = hasher.hash('password123')
+    hasher.verify('password123', stored)  # start the pool outside the timing
+
+    stop = threading.Event()
+    delays = []
+    tick_thread = threading.Thread(target=ticker, args=(stop, delays), daemon=True)
+    tick_thread.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: hasher.verify('password123', stored), range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    tick_thread.join()
+    hasher.shutdown()
+
+    assert all(results)
+    delays.sort()
+    cores = max(1, workers)
+    return {
+        'workers': workers,
+        'logins': logins,
+        'seconds': round(elapsed, 3),
+        'logins_per_second': round(logins / elapsed, 1),
+        'logins_per_second_per_core': round(logins / elapsed / cores, 1),
+        'ticker_p99_delay_ms': round(delays[int(len(delays) * 0.99) - 1] * 1000, 2) if delays else 0.0,
+        'ticker_max_delay_ms': round(delays[-1] * 1000, 2) if delays else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default=f'0,1,{os.cpu_count() or 1}', help='comma-separated pool sizes')
+    parser.add_argument('--logins', type=int, default=200, help='verifications per pool size')
+    parser.add_argument('--concurrency', type=int, default=32, help='request threads')
+    parser.add_argument('--output', default='bench_output.json', help='where to write the JSON results')
+    args = parser.parse_args(argv)
+
+    results = []
+    for workers in sorted({int(value) for value in args.workers.split(',')}):
+        result = run(workers, args.logins, args.concurrency)
+        results.append(result)
+        print(f'workers={workers:<3} {result["logins_per_second"]:>8} logins/s  '
+              f'{result["logins_per_second_per_core"]:>8} /s/core  '
+              f'ticker p99 {result["ticker_p99_delay_ms"]} ms')
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
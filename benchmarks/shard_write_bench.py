@@ -0,0 +1,96 @@
+"""Website save throughput for different ``WEBSITE_SHARDS`` values.
+
+Starts ``--writers`` processes that each own one user and keep saving that
+user's website, against a fresh scratch database per shard count, and
+reports saves per second. With one shard every commit queues for the same
+write lock; with more shards writers whose users hash to different shards
+commit side by side::
+
+    python -m benchmarks.shard_write_bench --shards 1,2,4 --writers 8 --saves 300
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure(directory, shards):
+    # Settings are read at import time, so each process configures itself first
+    os.environ['DATABASE_PATH'] = os.path.join(directory, 'app.db')
+    os.environ['WEBSITE_SHARDS'] = str(shards)
+    sys.path.insert(0, ROOT)
+
+
+def prepare(directory, shards):
+    """Create every shard's schema once so writers do not race to migrate it."""
+    configure(directory, shards)
+    from src.models import shards as shard_router
+    shard_router.connections()
+
+
+def writer(directory, shards, user_id, saves, start, results):
+    configure(directory, shards)
+    from src.models.website import Website
+
+    website = Website(f'Site {user_id}', {'hero': 'Welcome'}, user_id).save()
+    start.wait()
+    started = time.perf_counter()
+    for number in range(saves):
+        website.content = {'hero': f'Welcome, version {number}'}
+        website.save()
+    results.put(time.perf_counter() - started)
+
+
+def run(shards, writers, saves):
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        setup = context.Process(target=prepare, args=(directory, shards))
+        setup.start()
+        setup.join()
+
+        start = context.Barrier(writers)
+        results = context.Queue()
+        processes = [context.Process(target=writer, args=(directory, shards, user_id, saves, start, results))
+                     for user_id in range(1, writers + 1)]
+        for process in processes:
+            process.start()
+        elapsed = max(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+
+    return {
+        'shards': shards,
+        'writers': writers,
+        'saves': writers * saves,
+        'seconds': round(elapsed, 3),
+        'saves_per_second': round(writers * saves / elapsed, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', default='1,2,4', help='comma-separated shard counts')
+    parser.add_argument('--writers', type=int, default=8, help='writer processes, one user each')
+    parser.add_argument('--saves', type=int, default=300, help='saves per writer')
+    parser.add_argument('--output', default='bench_output.json', help='where to write the JSON results')
+    args = parser.parse_args(argv)
+
+    results = []
+    for shards in sorted({int(value) for value in args.shards.split(',')}):
+        result = run(shards, args.writers, args.saves)
+        results.append(result)
+        print(f'shards={shards:<3} {result["saves_per_second"]:>8} saves/s  ({result["seconds"]} s)')
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
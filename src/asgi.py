@@ -0,0 +1,101 @@
+"""ASGI entry point.
+
+Run with any ASGI server, e.g.::
+
+    pip install uvicorn
+    uvicorn src.asgi:app --workers 2
+
+Connections live on the server's event loop: slow uploads are buffered there
+(in memory up to 64 KiB, then spooled to disk) and idle keep-alive
+connections cost no thread. Once its body has arrived, a request takes one
+of ``ASGI_THREADS`` slots (default 32) and runs through asgiref's
+``WsgiToAsgi`` on a thread of its own, through the same Flask views, models
+and services as the WSGI deployment. Async views (see ``src.models.aio``)
+run on the event loop itself and only hand database calls to a small pool.
+"""
+import asyncio
+import os
+import sys
+from tempfile import SpooledTemporaryFile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+try:
+    from asgiref.sync import ThreadSensitiveContext, sync_to_async
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError as e:
+    raise RuntimeError('ASGI mode needs asgiref from requirements.txt: pip install -r requirements.txt') from e
+
+from src.main import app as flask_app
+from src.services.autosave import autosave_buffer
+
+BODY_CHUNK = 64 * 1024
+
+
+async def _buffer_body(receive):
+    """Read the whole request body on the loop; None if the client went away."""
+    body = SpooledTemporaryFile(max_size=BODY_CHUNK)
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    size = body.tell()
+    body.seek(0)
+    return body, size
+
+
+def _replay(body, size):
+    """A ``receive`` that hands the buffered body to the WSGI adapter again."""
+    async def receive():
+        chunk = body.read(BODY_CHUNK)
+        return {'type': 'http.request', 'body': chunk, 'more_body': body.tell() < size}
+    return receive
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """``WsgiToAsgi`` that runs up to ``threads`` requests side by side.
+
+    Left alone, asgiref runs every request on one shared thread, which would
+    serialise the whole app; a ``ThreadSensitiveContext`` per request gives
+    each its own thread instead.
+    """
+
+    def __init__(self, wsgi_application, threads):
+        super().__init__(wsgi_application)
+        self.threads = threads
+        self._slots = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.threads)
+
+        # Wait for slow uploads here, before taking a thread
+        buffered = await _buffer_body(receive)
+        if buffered is None:
+            return
+        body, size = buffered
+        try:
+            async with self._slots, ThreadSensitiveContext():
+                await super().__call__(scope, _replay(body, size), send)
+        finally:
+            body.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Write pending autosaves before the server stops
+                await sync_to_async(autosave_buffer.flush, thread_sensitive=False)()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = PooledWsgiToAsgi(flask_app, threads=int(os.getenv('ASGI_THREADS', 32)))
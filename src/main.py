@@ -11,6 +11,7 @@ from dotenv import load_dotenv
 # Import models to initialize database connection
 from src.models.database import db
 from src.models.role import Role
+from src.models import aio
 
 # Import routes
 from src.routes.auth import auth_bp
@@ -18,11 +19,24 @@ from src.routes.website import website_bp
 from src.routes.role import role_bp
 from src.routes.ai import ai_bp
 from src.routes.user import user_bp
+from src.routes.admin import admin_bp
+from src.services.load_shedding import limit_concurrency
+from src.services.purge_worker import purge_worker
+from src.services.maintenance import maintenance_scheduler
+from src.services.json_codec import JSONProvider
+from src.services.template_registry import template_registry
+from src.services.password_hasher import password_hasher
 
 # Load environment variables
 load_dotenv()
 
+# Hashing workers are forked before any background thread starts
+password_hasher.start()
+
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+app.json = JSONProvider(app)
+# Async views share one event loop rather than each starting its own
+app.async_to_sync = aio.async_to_sync
 
 # Configuration
 app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key-change-in-production')
@@ -38,11 +52,21 @@ app.register_blueprint(website_bp, url_prefix='/api/websites')
 app.register_blueprint(role_bp, url_prefix='/api/roles')
 app.register_blueprint(ai_bp, url_prefix='/api/ai')
 app.register_blueprint(user_bp, url_prefix='/api')
+app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
 # Initialize default roles
 with app.app_context():
     Role.initialize_default_roles()
 
+# Compile the content templates now so a broken file fails the start, not a request
+template_registry.reload()
+
+# Finish user deletions interrupted by a restart
+purge_worker.resume()
+
+# Periodic SQLite housekeeping (one process at a time runs the tasks)
+maintenance_scheduler.start()
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -60,15 +84,25 @@ def serve(path):
             return "index.html not found", 404
 
 @app.route('/preview/<website_id>')
+@limit_concurrency('preview')
 def preview_website(website_id):
     """Route for live preview of websites"""
     from src.models.website import Website
-    from flask import render_template_string
-    
+    from src.services.shared_cache import shared_cache
+
     website = Website.find_by_id(website_id)
     if not website:
         return "Website not found", 404
-    
+
+    if hasattr(website, '_autosave_seq'):
+        # Unflushed autosave edits are only visible in this worker
+        return _render_preview(website)
+    return shared_cache.get_or_load(f'preview:{website.id}:{website.version}',
+                                    lambda: _render_preview(website), tag=f'website:{website.id}')
+
+def _render_preview(website):
+    from flask import render_template_string
+
     # Basic HTML template for preview
     template = """
     <!DOCTYPE html>
@@ -0,0 +1,125 @@
+"""Async access to the models for code running on an event loop.
+
+SQLite calls block, so coroutines hand them to a small bounded thread pool
+(``ASYNC_DB_WORKERS``, default 4) instead of stalling the loop. SQLite only
+allows one writer at a time, so a larger pool would mostly add lock waits.
+The wrappers call the regular models, so validation, triggers, revisions and
+caches behave exactly as on the synchronous path.
+
+The async views in ``src.routes.ai`` and ``src.routes.website`` use them.
+Flask runs those views through ``async_to_sync``, installed as the app's
+``async_to_sync``: every view runs on one shared event loop thread, instead
+of Flask's default of a new thread and event loop per request, which costs
+more than the view itself. The request's thread waits for its view, and
+the views' database calls share the pool.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial, wraps
+
+from src.models.user import User
+from src.models.website import Website
+
+_executor = None
+_executor_lock = threading.Lock()
+_loop = None
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(os.getenv('ASYNC_DB_WORKERS', 4)),
+                                           thread_name_prefix='db')
+        return _executor
+
+
+def event_loop():
+    """The event loop async views run on, started on first use."""
+    global _loop
+    with _executor_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='async-views', daemon=True).start()
+        return _loop
+
+
+def async_to_sync(func):
+    """Wrap coroutine function ``func`` to run on ``event_loop()`` and wait for it.
+
+    The coroutine runs in a copy of the caller's context, so Flask's request
+    and application contexts stay available to it.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        loop = event_loop()
+        context = contextvars.copy_context()
+        result = Future()
+
+        def done(task):
+            if task.cancelled():
+                result.cancel()
+            elif task.exception() is not None:
+                result.set_exception(task.exception())
+            else:
+                result.set_result(task.result())
+
+        def start():
+            context.run(loop.create_task, func(*args, **kwargs)).add_done_callback(done)
+
+        loop.call_soon_threadsafe(start)
+        return result.result()
+    return wrapper
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking model call on the database pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor(), partial(func, *args, **kwargs))
+
+
+class AsyncWebsite:
+    @staticmethod
+    async def find_by_id(website_id):
+        return await run_db(Website.find_by_id, website_id)
+
+    @staticmethod
+    async def find_by_user_id(user_id):
+        return await run_db(Website.find_by_user_id, user_id)
+
+    @staticmethod
+    async def find_filtered(**filters):
+        return await run_db(Website.find_filtered, **filters)
+
+    @staticmethod
+    async def search(query, user_id=None, page=1, per_page=20):
+        return await run_db(Website.search, query, user_id=user_id, page=page, per_page=per_page)
+
+    @staticmethod
+    async def save(website):
+        return await run_db(website.save)
+
+    @staticmethod
+    async def delete(website):
+        return await run_db(website.delete)
+
+
+class AsyncUser:
+    @staticmethod
+    async def find_by_id(user_id):
+        return await run_db(User.find_by_id, user_id)
+
+    @staticmethod
+    async def find_by_email(email, include_deleted=False):
+        return await run_db(User.find_by_email, email, include_deleted)
+
+    @staticmethod
+    async def check_password(user, password):
+        return await run_db(user.check_password, password)
+
+    @staticmethod
+    async def save(user):
+        return await run_db(user.save)
@@ -0,0 +1,216 @@
+"""Cold storage for websites nobody has touched in a long time.
+
+Archiving moves a website's content and revision history into a separate,
+zlib-compressed SQLite database (``ARCHIVE_DATABASE_PATH``, default
+``archive.db`` next to the main database) and leaves a stub row in
+``websites`` with the metadata, ``content`` NULL and ``archived_at``
+set. Stubs keep listings, facets and statistics correct while the hot table,
+its search index and the revision table only hold active data.
+``Website.find_by_id`` restores archived websites on first access.
+
+Both databases are written in an order that never loses data: the archive
+copy is committed before the hot row is stripped, and the hot row is restored
+before the archive copy is removed.
+"""
+from datetime import datetime, timedelta
+from src.models import content_codec, shards
+from src.models.database import SerializedConnection, db_instance
+from src.models.revision import WebsiteRevision
+from src.services.shared_cache import shared_cache
+from src.services import json_codec
+import os
+import sqlite3
+import threading
+import zlib
+
+
+class WebsiteArchive:
+    _connection = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def path():
+        return os.getenv('ARCHIVE_DATABASE_PATH') or os.path.join(
+            os.path.dirname(os.path.abspath(db_instance.path)), 'archive.db')
+
+    @staticmethod
+    def connection():
+        with WebsiteArchive._lock:
+            if WebsiteArchive._connection is None:
+                path = WebsiteArchive.path()
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                connection = sqlite3.connect(path, check_same_thread=False)
+                connection.row_factory = sqlite3.Row
+                connection = SerializedConnection(connection)
+                connection.execute('''
+                    CREATE TABLE IF NOT EXISTS archived_websites (
+                        id INTEGER PRIMARY KEY,
+                        user_id INTEGER,
+                        data BLOB NOT NULL,
+                        archived_at TEXT
+                    )
+                ''')
+                connection.commit()
+                WebsiteArchive._connection = connection
+            return WebsiteArchive._connection
+
+    @staticmethod
+    def archive_inactive(days=None, batch_size=200, progress=None):
+        """Archive websites whose ``updated_at`` is older than ``days``.
+
+        Defaults to ``ARCHIVE_AFTER_DAYS`` (180). Works in batches of
+        ``batch_size`` websites, one short transaction per database each,
+        one website shard after the other. Returns the number of websites
+        archived.
+        """
+        if days is None:
+            days = int(os.getenv('ARCHIVE_AFTER_DAYS', 180))
+        cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+        archived = 0
+        for connection in shards.connections():
+            archived += WebsiteArchive._archive_shard(connection, cutoff, batch_size, progress, archived)
+        return archived
+
+    @staticmethod
+    def _archive_shard(connection, cutoff, batch_size, progress, archived_before):
+        archive = WebsiteArchive.connection()
+        cursor = connection.cursor()
+        last_id = 0
+        archived = 0
+
+        while True:
+            cursor.execute('''
+                SELECT id, user_id, content, updated_at FROM websites
+                WHERE id > ? AND archived_at IS NULL AND updated_at < ?
+                ORDER BY id LIMIT ?
+            ''', (last_id, cutoff, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            now = datetime.utcnow().isoformat()
+
+            entries = []
+            for row in rows:
+                cursor.execute('''
+                    SELECT revision, kind, data, created_at FROM website_revisions
+                    WHERE website_id = ? ORDER BY revision
+                ''', (row['id'],))
+                payload = {
+                    'content': content_codec.decode(row['content']),
+                    'revisions': [list(revision) for revision in cursor.fetchall()]
+                }
+                data = zlib.compress(json_codec.dumps_bytes(payload), 9)
+                entries.append((row['id'], row['user_id'], data, now))
+
+            archive.executemany('''
+                INSERT OR REPLACE INTO archived_websites (id, user_id, data, archived_at) VALUES (?, ?, ?, ?)
+            ''', entries)
+            archive.commit()
+
+            stripped = set()
+            try:
+                for row in rows:
+                    # Skip websites edited since they were read
+                    cursor.execute('''
+                        UPDATE websites SET content = NULL, archived_at = ?
+                        WHERE id = ? AND archived_at IS NULL AND updated_at = ?
+                    ''', (now, row['id'], row['updated_at']))
+                    if cursor.rowcount:
+                        cursor.execute('DELETE FROM website_revisions WHERE website_id = ?', (row['id'],))
+                        stripped.add(row['id'])
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+            for website_id in stripped:
+                WebsiteRevision.forget(website_id)
+            shared_cache.invalidate(*(f'website:{website_id}' for website_id in stripped))
+            skipped = [(row['id'],) for row in rows if row['id'] not in stripped]
+            if skipped:
+                archive.executemany('DELETE FROM archived_websites WHERE id = ?', skipped)
+                archive.commit()
+
+            archived += len(stripped)
+            if progress:
+                progress(last_id, archived_before + archived)
+        return archived
+
+    @staticmethod
+    def restore(website_id, connection=None):
+        """Move an archived website back into the hot tables.
+
+        ``connection`` is the website's shard. Returns False when there is
+        nothing to restore (e.g. another request restored it first).
+        """
+        archive = WebsiteArchive.connection()
+        row = archive.execute('SELECT data FROM archived_websites WHERE id = ?', (website_id,)).fetchone()
+        if row is None:
+            return False
+        payload = json_codec.loads(zlib.decompress(row['data']))
+
+        connection = connection or shards.for_website(website_id)
+        cursor = connection.cursor()
+        try:
+            cursor.execute('''
+                UPDATE websites SET content = ?, archived_at = NULL
+                WHERE id = ? AND archived_at IS NOT NULL
+            ''', (content_codec.encode(payload['content']), website_id))
+            restored = cursor.rowcount > 0
+            if restored:
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO website_revisions (website_id, revision, kind, data, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(website_id, *revision) for revision in payload['revisions']])
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+        WebsiteArchive.discard(website_id)
+        if restored:
+            shared_cache.invalidate(f'website:{website_id}')
+        return restored
+
+    @staticmethod
+    def content(website_id):
+        """Archived content of a website without restoring it ({} if missing)."""
+        row = WebsiteArchive.connection().execute(
+            'SELECT data FROM archived_websites WHERE id = ?', (website_id,)).fetchone()
+        return json_codec.loads(zlib.decompress(row['data']))['content'] if row else {}
+
+    @staticmethod
+    def contents(website_ids):
+        """Archived content of several websites, by id, in a few queries.
+
+        Websites without an archived copy are left out.
+        """
+        website_ids = list(website_ids)
+        contents = {}
+        # Chunked to stay under SQLite's bound parameter limit
+        for start in range(0, len(website_ids), 500):
+            chunk = website_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            for row in WebsiteArchive.connection().execute(
+                    f'SELECT id, data FROM archived_websites WHERE id IN ({placeholders})', chunk):
+                contents[row['id']] = json_codec.loads(zlib.decompress(row['data']))['content']
+        return contents
+
+    @staticmethod
+    def _discard(where, params):
+        if WebsiteArchive._connection is None and not os.path.exists(WebsiteArchive.path()):
+            return
+        archive = WebsiteArchive.connection()
+        archive.execute(f'DELETE FROM archived_websites WHERE {where}', params)
+        archive.commit()
+
+    @staticmethod
+    def discard(website_id):
+        """Drop the archived copy of a website, if any."""
+        WebsiteArchive._discard('id = ?', (website_id,))
+
+    @staticmethod
+    def discard_user(user_id):
+        """Drop the archived copies of a user's websites."""
+        WebsiteArchive._discard('user_id = ?', (user_id,))
@@ -0,0 +1,345 @@
+"""Storage encoding for ``websites.content``.
+
+Two formats coexist in the column and are told apart by SQLite storage class:
+
+- TEXT: plain JSON, as written before compression existed.
+- BLOB: ``b'ZC'`` + format version (1 byte) + dictionary id (2 bytes, big
+  endian, 0 for none) + zlib stream of the JSON text.
+
+Generated sites share most of their wording, so a preset dictionary trained
+from existing content (``train_dictionary``) lets even short documents
+compress well. Dictionaries live in ``content_dictionaries`` and are never
+modified once written; new content uses the newest one.
+
+With ``CONTENT_DEDUP`` enabled a third format is written instead:
+
+- BLOB: ``b'ZR'`` + format version + 2 unused bytes + a JSON manifest
+  ``{"content": {...}, "refs": {section: hash}}``. String sections of at
+  least ``CONTENT_DEDUP_MIN_BYTES`` (default 64) are replaced by the hash of
+  their text and stored once in ``content_sections``; triggers keep
+  ``website_section_refs`` and the per-section reference counts in step and
+  drop sections nobody references any more.
+
+Settings: ``CONTENT_COMPRESSION`` (default on), ``CONTENT_COMPRESSION_LEVEL``
+(default 6), ``CONTENT_COMPRESSION_MIN_BYTES`` (default 128; smaller
+documents stay plain JSON), ``CONTENT_DEDUP`` (default off),
+``CONTENT_SECTION_CACHE_SIZE`` (hot sections kept in memory, default 4096)
+and ``CONTENT_JSON_CACHE_BYTES`` (decoded JSON text kept in memory, default
+8 MiB).
+"""
+from collections import Counter, OrderedDict
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import zlib
+
+from src.services import json_codec
+
+MAGIC = b'ZC'
+SECTION_MAGIC = b'ZR'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('>2sBH')
+MAX_DICTIONARY_BYTES = 32 * 1024
+
+_dictionaries = {}
+_active_dictionary_id = None
+_lock = threading.Lock()
+_connection = None
+_sections = OrderedDict()
+_sections_lock = threading.Lock()
+_json_texts = OrderedDict()
+_json_texts_bytes = 0
+_json_texts_lock = threading.Lock()
+
+def bind(connection):
+    """Attach the connection that stores trained dictionaries."""
+    global _connection, _active_dictionary_id, _json_texts_bytes
+    with _lock:
+        _connection = connection
+        _dictionaries.clear()
+        _active_dictionary_id = None
+    with _sections_lock:
+        _sections.clear()
+    with _json_texts_lock:
+        # Cached texts may have been decoded with another database's dictionaries
+        _json_texts.clear()
+        _json_texts_bytes = 0
+
+def _setting_enabled(name, default='1'):
+    return os.getenv(name, default).lower() not in ('0', 'false', 'no')
+
+def _dictionary(dictionary_id):
+    with _lock:
+        if dictionary_id not in _dictionaries:
+            row = _connection.execute('SELECT data FROM content_dictionaries WHERE id = ?',
+                                      (dictionary_id,)).fetchone()
+            if row is None:
+                raise ValueError(f'Unknown content dictionary {dictionary_id}')
+            _dictionaries[dictionary_id] = bytes(row[0])
+        return _dictionaries[dictionary_id]
+
+def active_dictionary_id():
+    global _active_dictionary_id
+    with _lock:
+        if _active_dictionary_id is None:
+            row = _connection.execute('SELECT MAX(id) FROM content_dictionaries').fetchone()
+            _active_dictionary_id = row[0] or 0
+        return _active_dictionary_id
+
+def is_compressed(raw):
+    return isinstance(raw, (bytes, memoryview)) and bytes(raw[:2]) == MAGIC
+
+def is_manifest(raw):
+    return isinstance(raw, (bytes, memoryview)) and bytes(raw[:2]) == SECTION_MAGIC
+
+def is_encoded(raw):
+    return is_compressed(raw) or is_manifest(raw)
+
+def section_hash(body):
+    return hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+
+def _cache_sections(items):
+    limit = int(os.getenv('CONTENT_SECTION_CACHE_SIZE', 4096))
+    with _sections_lock:
+        for key, body in items:
+            _sections[key] = body
+            _sections.move_to_end(key)
+        while len(_sections) > limit:
+            _sections.popitem(last=False)
+
+def _load_sections(hashes):
+    """Section bodies by hash, from the hot-section cache or the database."""
+    bodies = {}
+    missing = []
+    with _sections_lock:
+        for key in set(hashes):
+            if key in _sections:
+                _sections.move_to_end(key)
+                bodies[key] = _sections[key]
+            else:
+                missing.append(key)
+    if missing:
+        placeholders = ', '.join('?' * len(missing))
+        loaded = [tuple(row) for row in _connection.execute(
+            f'SELECT hash, body FROM content_sections WHERE hash IN ({placeholders})', missing)]
+        if len(loaded) != len(missing):
+            raise ValueError('Missing content sections')
+        _cache_sections(loaded)
+        bodies.update(loaded)
+    return bodies
+
+def _encode_manifest(content):
+    """Move large string sections into ``content_sections``; None if none qualify."""
+    min_bytes = int(os.getenv('CONTENT_DEDUP_MIN_BYTES', 64))
+    inline = {}
+    refs = {}
+    for key, value in content.items():
+        if isinstance(value, str) and len(value.encode()) >= min_bytes:
+            refs[key] = section_hash(value)
+            inline[key] = None
+        else:
+            inline[key] = value
+    if not refs:
+        return None
+
+    # Sections must exist before the website row that references them is
+    # written; reference counts are maintained by triggers from there on.
+    # A release elsewhere may still delete a section before that write, so
+    # the triggers re-create it from the cache (``content_section_body``).
+    sections = [(refs[key], content[key]) for key in refs]
+    _connection.executemany(
+        'INSERT INTO content_sections (hash, body) VALUES (?, ?) ON CONFLICT (hash) DO NOTHING', sections)
+    _cache_sections(sections)
+    manifest = json_codec.dumps({'content': inline, 'refs': refs})
+    return HEADER.pack(SECTION_MAGIC, FORMAT_VERSION, 0) + manifest.encode()
+
+def _decode_manifest(raw):
+    _, version, _ = HEADER.unpack_from(raw)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported content format version {version}')
+    manifest = json_codec.loads(raw[HEADER.size:])
+    content = manifest['content']
+    bodies = _load_sections(manifest['refs'].values())
+    for key, section in manifest['refs'].items():
+        content[key] = bodies[section]
+    return content
+
+def encode(content, dedup=None):
+    """Encode website content for storage.
+
+    ``dedup`` overrides ``CONTENT_DEDUP``, which is ignored while website
+    storage is sharded or not on the sqlite repository backend: the section
+    store only exists in the main database, written on its shared connection.
+    """
+    if dedup is None:
+        dedup = (_setting_enabled('CONTENT_DEDUP', '0') and int(os.getenv('WEBSITE_SHARDS', 1)) <= 1
+                 and os.getenv('REPOSITORY_BACKEND', 'sqlite').lower() == 'sqlite')
+    if isinstance(content, dict) and dedup:
+        manifest = _encode_manifest(content)
+        if manifest is not None:
+            return manifest
+
+    text = content if isinstance(content, str) else json_codec.dumps(content)
+    data = text.encode()
+    if not _setting_enabled('CONTENT_COMPRESSION') or len(data) < int(os.getenv('CONTENT_COMPRESSION_MIN_BYTES', 128)):
+        return text
+
+    level = int(os.getenv('CONTENT_COMPRESSION_LEVEL', 6))
+    dictionary_id = active_dictionary_id()
+    zdict = _dictionary(dictionary_id) if dictionary_id else b''
+    compressor = _compressor(level, len(zdict) + len(data), zdict)
+    return HEADER.pack(MAGIC, FORMAT_VERSION, dictionary_id) + compressor.compress(data) + compressor.flush()
+
+def _compressor(level, size, zdict):
+    """A compressor whose window just covers ``size`` bytes of dictionary plus data.
+
+    zlib's defaults allocate ~256 KB of state per call, sized for long
+    streams; a smaller window loses nothing when the whole input fits in it,
+    and ``decompressobj()`` reads any window size.
+    """
+    wbits = min(zlib.MAX_WBITS, max(9, (size - 1).bit_length()))
+    # Hash chains no larger than the window
+    mem_level = max(1, min(zlib.DEF_MEM_LEVEL, wbits - 7))
+    if zdict:
+        return zlib.compressobj(level, zlib.DEFLATED, wbits, mem_level, zdict=zdict)
+    return zlib.compressobj(level, zlib.DEFLATED, wbits, mem_level)
+
+def decode_text(raw):
+    """Return the stored content as JSON text (None stays None)."""
+    if raw is None or isinstance(raw, str):
+        return raw
+    raw = bytes(raw)
+    if raw[:2] == SECTION_MAGIC:
+        return json_codec.dumps(_decode_manifest(raw))
+    if raw[:2] != MAGIC:
+        return raw.decode()
+    _, version, dictionary_id = HEADER.unpack_from(raw)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported content format version {version}')
+    if dictionary_id:
+        decompressor = zlib.decompressobj(zdict=_dictionary(dictionary_id))
+    else:
+        decompressor = zlib.decompressobj()
+    return (decompressor.decompress(raw[HEADER.size:]) + decompressor.flush()).decode()
+
+def decode(raw):
+    """Return stored content as Python data, like the original finders did."""
+    if is_manifest(raw):
+        return _decode_manifest(bytes(raw))
+    text = decode_text(raw)
+    if not text:
+        return {}
+    try:
+        return json_codec.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+def json_text(raw):
+    """Stored content as JSON text, or None if it is not valid JSON.
+
+    Also the SQLite function ``content_json(content)``. Cached because the
+    search triggers call it once per indexed section and responses embed
+    its result as is.
+    """
+    cacheable = isinstance(raw, (str, bytes))
+    if cacheable:
+        with _json_texts_lock:
+            if raw in _json_texts:
+                _json_texts.move_to_end(raw)
+                return _json_texts[raw]
+    try:
+        text = decode_text(raw)
+        json_codec.loads(text)
+    except (TypeError, ValueError, zlib.error):
+        text = None
+    if cacheable:
+        _cache_json_text(raw, text)
+    return text
+
+def _cache_json_text(raw, text):
+    """LRU bounded by ``CONTENT_JSON_CACHE_BYTES`` of stored plus decoded content."""
+    global _json_texts_bytes
+    limit = int(os.getenv('CONTENT_JSON_CACHE_BYTES', 8 << 20))
+    size = len(raw) + len(text or '')
+    if size > limit // 16:
+        # A few huge documents would push out everything else
+        return
+    with _json_texts_lock:
+        if raw in _json_texts:
+            return
+        _json_texts[raw] = text
+        _json_texts_bytes += size
+        while _json_texts_bytes > limit:
+            old_raw, old_text = _json_texts.popitem(last=False)
+            _json_texts_bytes -= len(old_raw) + len(old_text or '')
+
+sql_content_json = json_text
+
+def sql_encode(text):
+    """SQLite function ``content_encode(json)``: JSON text in its storage encoding.
+
+    Never deduplicates, since it runs inside a statement writing websites.
+    """
+    return None if text is None else encode(text, dedup=False)
+
+def sql_section_refs(raw):
+    """SQLite function ``content_section_refs(content)``: ``{section: hash}`` JSON or NULL."""
+    if not is_manifest(raw):
+        return None
+    try:
+        return json_codec.dumps(json_codec.loads(bytes(raw)[HEADER.size:])['refs'])
+    except (KeyError, ValueError):
+        return None
+
+def sql_section_body(section):
+    """SQLite function ``content_section_body(hash)``: the cached body, or NULL."""
+    with _sections_lock:
+        return _sections.get(section)
+
+def train_dictionary(samples, max_bytes=MAX_DICTIONARY_BYTES):
+    """Build a zlib preset dictionary from sample JSON documents.
+
+    Picks the word sequences that recur across the most documents; zlib
+    prefers matches near the end of the dictionary, so the most common
+    phrases are placed last.
+    """
+    counts = Counter()
+    for sample in samples:
+        words = re.findall(r'\S+\s*', sample)
+        seen = set()
+        for size in (12, 8, 4):
+            for start in range(0, max(0, len(words) - size + 1)):
+                phrase = ''.join(words[start:start + size])
+                if phrase not in seen:
+                    seen.add(phrase)
+                    counts[phrase] += 1
+
+    chosen = []
+    total = 0
+    for phrase, count in counts.most_common():
+        if count < 2:
+            break
+        if any(phrase in existing for existing in chosen):
+            continue
+        encoded = phrase.encode()
+        if total + len(encoded) > max_bytes:
+            break
+        chosen.append(phrase)
+        total += len(encoded)
+    return ''.join(reversed(chosen)).encode()
+
+def store_dictionary(data, created_at):
+    """Persist a trained dictionary and make it the active one."""
+    global _active_dictionary_id
+    cursor = _connection.cursor()
+    cursor.execute('INSERT INTO content_dictionaries (data, created_at) VALUES (?, ?)', (data, created_at))
+    dictionary_id = cursor.lastrowid
+    if dictionary_id > 0xFFFF:
+        raise ValueError('Too many content dictionaries')
+    with _lock:
+        _dictionaries[dictionary_id] = bytes(data)
+        _active_dictionary_id = dictionary_id
+    return dictionary_id
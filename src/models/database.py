@@ -1,7 +1,101 @@
 import sqlite3
 import os
 import json
+import threading
 from datetime import datetime
+from src.models import content_codec
+
+# Content sections covered by the full-text index
+SEARCH_SECTIONS = ('hero', 'about', 'services', 'contact')
+
+# Website columns with maintained per-value counts
+FACET_COLUMNS = ('industry', 'business_type')
+
+JOURNAL_MODES = ('delete', 'truncate', 'persist', 'memory', 'wal')
+
+class SerializedCursor:
+    """Cursor of a ``SerializedConnection``; every step holds the connection lock."""
+
+    def __init__(self, cursor, lock):
+        self._cursor = cursor
+        self._lock = lock
+
+    def execute(self, sql, parameters=()):
+        with self._lock:
+            self._cursor.execute(sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        with self._lock:
+            self._cursor.executemany(sql, seq_of_parameters)
+        return self
+
+    def fetchone(self):
+        with self._lock:
+            return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        with self._lock:
+            return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        with self._lock:
+            return self._cursor.fetchall()
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class SerializedConnection:
+    """A connection shared by request threads, used by one thread at a time.
+
+    Triggers call Python functions (``content_json`` and friends) while
+    SQLite holds the connection's mutex, and some driver calls take that
+    mutex without releasing the GIL, so two threads stepping statements on
+    one connection can deadlock. Every call goes through ``lock``; hold it
+    around a whole write transaction so other threads cannot commit or roll
+    back half of it.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self.lock = threading.RLock()
+
+    def cursor(self):
+        return SerializedCursor(self._connection.cursor(), self.lock)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        with self.lock:
+            return self._connection.executescript(script)
+
+    def commit(self):
+        with self.lock:
+            self._connection.commit()
+
+    def rollback(self):
+        with self.lock:
+            self._connection.rollback()
+
+    def close(self):
+        with self.lock:
+            self._connection.close()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
 
 class Database:
     _instance = None
@@ -14,12 +108,45 @@ class Database:
 
     def __init__(self):
         if self._connection is None:
-            db_path = os.path.join(os.path.dirname(__file__), '..', 'database', 'app.db')
-            os.makedirs(os.path.dirname(db_path), exist_ok=True)
-            self._connection = sqlite3.connect(db_path, check_same_thread=False)
-            self._connection.row_factory = sqlite3.Row
+            db_path = os.getenv('DATABASE_PATH') or os.path.join(os.path.dirname(__file__), '..', 'database', 'app.db')
+            if os.path.dirname(db_path):
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self.path = db_path
+            self._connection = SerializedConnection(self.connect())
+            content_codec.bind(self._connection)
+            if self._connection.execute('PRAGMA page_count').fetchone()[0] == 0:
+                # New databases return freed pages through incremental vacuum
+                self._connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
             self._initialize_tables()
 
+    def connect(self, path=None, cached_statements=128):
+        """Open a new connection configured like the shared one.
+
+        Background jobs use their own connection so their commits never
+        interleave with request transactions on the shared connection.
+        Wrap a connection in ``SerializedConnection`` before sharing it
+        between threads.
+        ``path`` opens another database file, e.g. a website shard.
+        ``cached_statements`` sizes the driver's prepared statement cache.
+        """
+        connection = sqlite3.connect(path or self.path, check_same_thread=False,
+                                     cached_statements=cached_statements)
+        connection.row_factory = sqlite3.Row
+        journal_mode = os.getenv('DATABASE_JOURNAL_MODE', '').lower()
+        if journal_mode in JOURNAL_MODES:
+            connection.execute(f'PRAGMA journal_mode = {journal_mode}')
+        self.register_functions(connection)
+        return connection
+
+    @staticmethod
+    def register_functions(connection):
+        """SQL functions used by triggers; every connection writing websites needs them."""
+        connection.create_function('content_json', 1, content_codec.sql_content_json, deterministic=True)
+        connection.create_function('content_section_refs', 1, content_codec.sql_section_refs, deterministic=True)
+        # Not deterministic: new content uses whatever dictionary is active
+        connection.create_function('content_encode', 1, content_codec.sql_encode)
+        connection.create_function('content_section_body', 1, content_codec.sql_section_body)
+
     def _initialize_tables(self):
         cursor = self._connection.cursor()
         
@@ -35,7 +162,106 @@ class Database:
                 updated_at TEXT
             )
         ''')
+        # Set while a deleted user's data is being purged
+        self._add_column(cursor, 'users', 'deleted_at', 'TEXT')
         
+        self._initialize_websites(cursor)
+
+        # Roles table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS roles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                permissions TEXT,
+                created_at TEXT,
+                updated_at TEXT
+            )
+        ''')
+
+        # Preset dictionaries for compressed website content
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS content_dictionaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                data BLOB NOT NULL,
+                created_at TEXT
+            )
+        ''')
+
+        # Background deletion of users and their websites (see ``PurgeJob``)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS purge_jobs (
+                user_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                websites_total INTEGER NOT NULL DEFAULT 0,
+                websites_deleted INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TEXT,
+                updated_at TEXT,
+                finished_at TEXT
+            )
+        ''')
+
+        # Buffered autosaves that could not be written (see ``AutosaveBuffer``)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS autosave_failures (
+                website_id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                base_version INTEGER,
+                current_version INTEGER,
+                changes TEXT NOT NULL,
+                error TEXT NOT NULL,
+                failed_at TEXT NOT NULL
+            )
+        ''')
+
+        # Housekeeping runs and the lease electing the process that runs them.
+        # Runs are kept per database file; tables from before that only knew
+        # the main database and are recreated, so every task runs once more
+        if 'database' not in [row[1] for row in cursor.execute('PRAGMA table_info(maintenance_runs)')]:
+            cursor.execute('DROP TABLE IF EXISTS maintenance_runs')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS maintenance_runs (
+                database TEXT NOT NULL,
+                task TEXT NOT NULL,
+                status TEXT NOT NULL,
+                detail TEXT,
+                started_at TEXT,
+                finished_at TEXT,
+                duration_ms INTEGER,
+                holder TEXT,
+                PRIMARY KEY (database, task)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS maintenance_lease (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+        # Website id blocks handed out while website storage is sharded
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS id_blocks (
+                name TEXT PRIMARY KEY,
+                next_id INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self._connection.commit()
+
+    def initialize_shard(self, connection):
+        """Create the website tables on a shard database (see ``src.models.shards``)."""
+        if connection.execute('PRAGMA page_count').fetchone()[0] == 0:
+            connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self._initialize_websites(connection.cursor(), users=False)
+        connection.commit()
+
+    def _initialize_websites(self, cursor, users=True):
+        """Websites plus everything kept next to them.
+
+        Runs on the main database and on every website shard; ``users`` is
+        False on shards, which have no users table.
+        """
         # Websites table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS websites (
@@ -50,19 +276,354 @@ class Database:
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
-        
-        # Roles table
+
+        # Set on stub rows whose content lives in the archive database
+        self._add_column(cursor, 'websites', 'archived_at', 'TEXT')
+        # Bumped by every save; saves compare-and-swap on it
+        self._add_column(cursor, 'websites', 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+        self._initialize_search(cursor)
+        self._initialize_facets(cursor)
+        self._initialize_stats(cursor, users)
+        self._initialize_revisions(cursor)
+        self._initialize_sections(cursor)
+
+    def _initialize_search(self, cursor):
+        """Full-text index over website titles and content sections.
+
+        The index is kept in sync by triggers so every write path (models,
+        raw SQL in routes, bulk jobs) updates it in the same transaction.
+        The ``owner`` column holds a ``u<user_id>`` token so ownership
+        filtering is an index intersection rather than a post-filter.
+        """
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS roles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                permissions TEXT,
-                created_at TEXT,
-                updated_at TEXT
+            CREATE VIRTUAL TABLE IF NOT EXISTS websites_fts USING fts5(
+                title, hero, about, services, contact, owner,
+                tokenize='porter unicode61'
             )
         ''')
-        
-        self._connection.commit()
+
+        def indexed_values(row):
+            # content_json() decodes compressed rows and yields NULL for invalid JSON
+            sections = ', '.join(
+                f"json_extract(content_json({row}.content), '$.{section}')"
+                for section in SEARCH_SECTIONS
+            )
+            return f"{row}.id, {row}.title, {sections}, 'u' || {row}.user_id"
+
+        columns = 'rowid, title, ' + ', '.join(SEARCH_SECTIONS) + ', owner'
+        self._create_trigger(cursor, 'websites_fts_insert', f'''
+            AFTER INSERT ON websites BEGIN
+                INSERT INTO websites_fts ({columns}) VALUES ({indexed_values('new')});
+            END
+        ''')
+        self._create_trigger(cursor, 'websites_fts_update', f'''
+            AFTER UPDATE OF title, content, user_id ON websites
+            WHEN old.title IS NOT new.title OR old.user_id IS NOT new.user_id
+                 OR content_json(old.content) IS NOT content_json(new.content)
+            BEGIN
+                DELETE FROM websites_fts WHERE rowid = old.id;
+                INSERT INTO websites_fts ({columns}) VALUES ({indexed_values('new')});
+            END
+        ''')
+        self._create_trigger(cursor, 'websites_fts_delete', '''
+            AFTER DELETE ON websites BEGIN
+                DELETE FROM websites_fts WHERE rowid = old.id;
+            END
+        ''')
+
+        # Backfill databases created before the index existed
+        if cursor.execute('SELECT 1 FROM websites_fts LIMIT 1').fetchone() is None:
+            cursor.execute(f'INSERT INTO websites_fts ({columns}) SELECT {indexed_values("websites")} FROM websites')
+
+    def _initialize_facets(self, cursor):
+        """Filter indexes plus per-value counts for industry/business_type.
+
+        ``website_facet_counts`` holds one row per (facet, value, owner);
+        owner 0 aggregates every user. Triggers adjust the counts in the same
+        transaction as the website write, so reading facets never scans
+        ``websites``.
+        """
+        for name, columns in (
+            ('idx_websites_user_created', 'user_id, created_at'),
+            ('idx_websites_user_updated', 'user_id, updated_at'),
+            ('idx_websites_user_industry', 'user_id, industry'),
+            ('idx_websites_user_business_type', 'user_id, business_type'),
+            ('idx_websites_industry_created', 'industry, created_at'),
+            ('idx_websites_business_type_created', 'business_type, created_at'),
+            ('idx_websites_created', 'created_at'),
+            ('idx_websites_updated', 'updated_at'),
+        ):
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON websites ({columns})')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS website_facet_counts (
+                facet TEXT NOT NULL,
+                value TEXT NOT NULL,
+                owner_id INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (facet, value, owner_id)
+            ) WITHOUT ROWID
+        ''')
+
+        def adjust(row, delta):
+            statements = []
+            for facet in FACET_COLUMNS:
+                for owner in (f'{row}.user_id', '0'):
+                    statements.append(f'''
+                        INSERT INTO website_facet_counts (facet, value, owner_id, count)
+                        SELECT '{facet}', {row}.{facet}, {owner}, {delta} WHERE {row}.{facet} IS NOT NULL
+                        ON CONFLICT (facet, value, owner_id) DO UPDATE SET count = count + ({delta});
+                    ''')
+                if delta < 0:
+                    statements.append(f'''
+                        DELETE FROM website_facet_counts
+                        WHERE facet = '{facet}' AND value = {row}.{facet}
+                          AND owner_id IN ({row}.user_id, 0) AND count <= 0;
+                    ''')
+            return ''.join(statements)
+
+        changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in FACET_COLUMNS + ('user_id',))
+        self._create_trigger(cursor, 'website_facets_insert', f'''
+            AFTER INSERT ON websites BEGIN
+                {adjust('new', 1)}
+            END
+        ''')
+        self._create_trigger(cursor, 'website_facets_update', f'''
+            AFTER UPDATE OF {', '.join(FACET_COLUMNS)}, user_id ON websites WHEN {changed} BEGIN
+                {adjust('old', -1)}
+                {adjust('new', 1)}
+            END
+        ''')
+        self._create_trigger(cursor, 'website_facets_delete', f'''
+            AFTER DELETE ON websites BEGIN
+                {adjust('old', -1)}
+            END
+        ''')
+
+        # Backfill databases created before the counts table existed
+        if cursor.execute('SELECT 1 FROM website_facet_counts LIMIT 1').fetchone() is None:
+            for facet in FACET_COLUMNS:
+                for owner, group_by in (('user_id', f'{facet}, user_id'), ('0', facet)):
+                    cursor.execute(f'''
+                        INSERT INTO website_facet_counts (facet, value, owner_id, count)
+                        SELECT '{facet}', {facet}, {owner}, COUNT(*) FROM websites
+                        WHERE {facet} IS NOT NULL GROUP BY {group_by}
+                    ''')
+
+    def _initialize_stats(self, cursor, users=True):
+        """Summary tables behind the admin dashboard.
+
+        Every counter is adjusted by triggers inside the transaction that
+        writes the user or website, so reading the dashboard is a handful of
+        primary-key lookups regardless of table size. Website shards keep
+        their own website counters, which ``Stats`` adds up.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_totals (
+                name TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_users_by_role (
+                role TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_websites_by_user (
+                user_id INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_stats_websites_by_user_count ON stats_websites_by_user (count)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_websites_by_day (
+                day TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+
+        def bump(table, key_column, key, delta):
+            return f'''
+                INSERT INTO {table} ({key_column}, count)
+                SELECT {key}, {delta} WHERE {key} IS NOT NULL
+                ON CONFLICT ({key_column}) DO UPDATE SET count = count + ({delta});
+            '''
+
+        def user_change(row, delta):
+            return (bump('stats_totals', 'name', "'users'", delta)
+                    + bump('stats_users_by_role', 'role', f"COALESCE({row}.role, 'editor')", delta))
+
+        def website_change(row, delta):
+            return (bump('stats_totals', 'name', "'websites'", delta)
+                    + bump('stats_websites_by_user', 'user_id', f'{row}.user_id', delta)
+                    + bump('stats_websites_by_day', 'day', f'substr({row}.created_at, 1, 10)', delta))
+
+        if users:
+            self._create_trigger(cursor, 'stats_users_insert', f'''
+                AFTER INSERT ON users BEGIN {user_change('new', 1)} END
+            ''')
+            self._create_trigger(cursor, 'stats_users_update', f'''
+                AFTER UPDATE OF role ON users WHEN old.role IS NOT new.role BEGIN
+                    {user_change('old', -1)}
+                    {user_change('new', 1)}
+                END
+            ''')
+            self._create_trigger(cursor, 'stats_users_delete', f'''
+                AFTER DELETE ON users BEGIN
+                    {user_change('old', -1)}
+                    DELETE FROM stats_websites_by_user WHERE user_id = old.id AND count <= 0;
+                END
+            ''')
+        self._create_trigger(cursor, 'stats_websites_insert', f'''
+            AFTER INSERT ON websites BEGIN {website_change('new', 1)} END
+        ''')
+        self._create_trigger(cursor, 'stats_websites_update', f'''
+            AFTER UPDATE OF user_id, created_at ON websites
+            WHEN old.user_id IS NOT new.user_id OR old.created_at IS NOT new.created_at BEGIN
+                {website_change('old', -1)}
+                {website_change('new', 1)}
+            END
+        ''')
+        self._create_trigger(cursor, 'stats_websites_delete', f'''
+            AFTER DELETE ON websites BEGIN {website_change('old', -1)} END
+        ''')
+
+        if cursor.execute('SELECT 1 FROM stats_totals LIMIT 1').fetchone() is None:
+            self.rebuild_stats(cursor, users)
+
+    def _initialize_revisions(self, cursor):
+        """Delta-compressed website history (see ``WebsiteRevision``)."""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS website_revisions (
+                website_id INTEGER NOT NULL,
+                revision INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at TEXT,
+                PRIMARY KEY (website_id, revision)
+            ) WITHOUT ROWID
+        ''')
+        # Website version the revision was written as; unknown for older revisions
+        self._add_column(cursor, 'website_revisions', 'version', 'INTEGER')
+        self._create_trigger(cursor, 'website_revisions_delete', '''
+            AFTER DELETE ON websites BEGIN
+                DELETE FROM website_revisions WHERE website_id = old.id;
+            END
+        ''')
+
+    def _initialize_sections(self, cursor):
+        """Shared section store for deduplicated content (``CONTENT_DEDUP``).
+
+        ``website_section_refs`` mirrors the hashes named in each website's
+        content manifest and is maintained by triggers, which also keep
+        ``content_sections.refcount`` current and delete sections whose last
+        reference goes away. Rewriting a website only touches the refs of
+        sections that actually changed. Taking a reference re-creates a
+        section deleted since its content was encoded.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS content_sections (
+                hash TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                refcount INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS website_section_refs (
+                website_id INTEGER NOT NULL,
+                section TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (website_id, section)
+            ) WITHOUT ROWID
+        ''')
+
+        def acquire(row):
+            return f'''
+                INSERT INTO content_sections (hash, body, refcount)
+                VALUES ({row}.hash, COALESCE(content_section_body({row}.hash),
+                                             (SELECT body FROM content_sections WHERE hash = {row}.hash)), 1)
+                ON CONFLICT (hash) DO UPDATE SET refcount = refcount + 1;
+            '''
+
+        def release(row):
+            return f'''
+                UPDATE content_sections SET refcount = refcount - 1 WHERE hash = {row}.hash;
+                DELETE FROM content_sections WHERE hash = {row}.hash AND refcount <= 0;
+            '''
+
+        self._create_trigger(cursor, 'section_refs_insert', f'''
+            AFTER INSERT ON website_section_refs BEGIN {acquire('new')} END
+        ''')
+        self._create_trigger(cursor, 'section_refs_update', f'''
+            AFTER UPDATE OF hash ON website_section_refs WHEN old.hash IS NOT new.hash BEGIN
+                {acquire('new')}
+                {release('old')}
+            END
+        ''')
+        self._create_trigger(cursor, 'section_refs_delete', f'''
+            AFTER DELETE ON website_section_refs BEGIN {release('old')} END
+        ''')
+
+        self._create_trigger(cursor, 'website_sections_insert', '''
+            AFTER INSERT ON websites WHEN content_section_refs(new.content) IS NOT NULL BEGIN
+                INSERT INTO website_section_refs (website_id, section, hash)
+                SELECT new.id, key, value FROM json_each(content_section_refs(new.content));
+            END
+        ''')
+        self._create_trigger(cursor, 'website_sections_update', '''
+            AFTER UPDATE OF content ON websites WHEN old.content IS NOT new.content BEGIN
+                DELETE FROM website_section_refs
+                WHERE website_id = new.id
+                  AND section NOT IN (SELECT key FROM json_each(content_section_refs(new.content)));
+                INSERT INTO website_section_refs (website_id, section, hash)
+                SELECT new.id, key, value FROM json_each(content_section_refs(new.content)) WHERE true
+                ON CONFLICT (website_id, section) DO UPDATE SET hash = excluded.hash
+                WHERE hash IS NOT excluded.hash;
+            END
+        ''')
+        self._create_trigger(cursor, 'website_sections_delete', '''
+            AFTER DELETE ON websites BEGIN
+                DELETE FROM website_section_refs WHERE website_id = old.id;
+            END
+        ''')
+
+    @staticmethod
+    def rebuild_stats(cursor, users=True):
+        """Recompute every summary table from the base tables."""
+        for table in ('stats_totals', 'stats_users_by_role', 'stats_websites_by_user', 'stats_websites_by_day'):
+            cursor.execute(f'DELETE FROM {table}')
+        cursor.execute("INSERT INTO stats_totals (name, count) SELECT 'websites', COUNT(*) FROM websites")
+        if users:
+            cursor.execute("INSERT INTO stats_totals (name, count) SELECT 'users', COUNT(*) FROM users")
+            cursor.execute('''
+                INSERT INTO stats_users_by_role (role, count)
+                SELECT COALESCE(role, 'editor'), COUNT(*) FROM users GROUP BY COALESCE(role, 'editor')
+            ''')
+        cursor.execute('''
+            INSERT INTO stats_websites_by_user (user_id, count)
+            SELECT user_id, COUNT(*) FROM websites WHERE user_id IS NOT NULL GROUP BY user_id
+        ''')
+        cursor.execute('''
+            INSERT INTO stats_websites_by_day (day, count)
+            SELECT substr(created_at, 1, 10), COUNT(*) FROM websites
+            WHERE created_at IS NOT NULL GROUP BY substr(created_at, 1, 10)
+        ''')
+
+    @staticmethod
+    def _add_column(cursor, table, column, definition):
+        """Add a column to tables created before it existed."""
+        columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    @staticmethod
+    def _create_trigger(cursor, name, definition):
+        """(Re)create a trigger so existing databases pick up definition changes."""
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'CREATE TRIGGER {name} {definition}')
 
     @property
     def connection(self):
@@ -0,0 +1,127 @@
+from contextlib import nullcontext
+from datetime import datetime
+from src.models.database import db
+from src.models import shards
+from src.models.archive import WebsiteArchive
+from src.models.revision import WebsiteRevision
+from src.repositories.registry import backend
+from src.services.shared_cache import shared_cache
+
+class PurgeJob:
+    """Deletes a user's websites in small batches, then the user.
+
+    ``start`` only marks the user as deleted and records a job, so the admin
+    request returns at once. ``run_batch`` deletes up to ``batch_size``
+    websites per transaction; database triggers clean up their revisions,
+    search index entries, facet counts and statistics in the same
+    transaction. Progress is committed with every batch, so a crashed or
+    restarted worker simply carries on where it stopped.
+    """
+
+    @staticmethod
+    def start(user_id):
+        """Mark ``user_id`` as deleted and queue its purge; returns the job."""
+        if backend() == 'memory':
+            # The worker deletes straight from the database tables, so it would
+            # report success while the in-memory websites stay
+            raise RuntimeError('REPOSITORY_BACKEND=memory does not support deleting users')
+        now = datetime.utcnow().isoformat()
+        row = shards.for_user(user_id).execute(
+            'SELECT count FROM stats_websites_by_user WHERE user_id = ?', (user_id,)).fetchone()
+        cursor = db.cursor()
+        try:
+            cursor.execute('UPDATE users SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL', (now, user_id))
+            cursor.execute('''
+                INSERT INTO purge_jobs (user_id, status, websites_total, created_at, updated_at)
+                VALUES (?, 'pending', ?, ?, ?)
+                ON CONFLICT (user_id) DO NOTHING
+            ''', (user_id, row['count'] if row else 0, now, now))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        shared_cache.invalidate(f'user:{user_id}')
+        return PurgeJob.find(user_id)
+
+    @staticmethod
+    def find(user_id, connection=None):
+        row = (connection or db).execute('SELECT * FROM purge_jobs WHERE user_id = ?', (user_id,)).fetchone()
+        return PurgeJob.to_dict(row) if row else None
+
+    @staticmethod
+    def unfinished(connection=None):
+        """User ids whose purge has not completed, oldest first."""
+        rows = (connection or db).execute(
+            "SELECT user_id FROM purge_jobs WHERE status != 'done' ORDER BY created_at, user_id").fetchall()
+        return [row['user_id'] for row in rows]
+
+    @staticmethod
+    def run_batch(connection, user_id, batch_size=100):
+        """Purge the next batch for ``user_id``; returns True once the job is done.
+
+        ``connection`` is the worker's own connection to the main database.
+        Websites on another shard are deleted and committed there first;
+        repeating a batch is harmless.
+        """
+        now = datetime.utcnow().isoformat()
+        shard = shards.shard_for(user_id)
+        websites = connection if shard == 0 else shards.connection(shard)
+        website_ids = [row['id'] for row in websites.execute(
+            'SELECT id FROM websites WHERE user_id = ? ORDER BY id LIMIT ?', (user_id, batch_size))]
+
+        # A shard's connection is shared with request threads: hold its lock
+        # from each write to its commit or rollback
+        with getattr(websites, 'lock', None) or nullcontext():
+            try:
+                if website_ids:
+                    placeholders = ', '.join('?' * len(website_ids))
+                    websites.execute(f'DELETE FROM websites WHERE id IN ({placeholders})', website_ids)
+                    websites.commit()
+                    connection.execute('''
+                        UPDATE purge_jobs SET status = 'running', websites_deleted = websites_deleted + ?,
+                               error = NULL, updated_at = ?
+                        WHERE user_id = ?
+                    ''', (len(website_ids), now, user_id))
+                    connection.commit()
+                else:
+                    if websites is not connection:
+                        websites.execute('DELETE FROM stats_websites_by_user WHERE user_id = ? AND count <= 0',
+                                         (user_id,))
+                        websites.commit()
+                    # Archived copies first: the user row is what makes the job resumable
+                    WebsiteArchive.discard_user(user_id)
+                    connection.execute('DELETE FROM users WHERE id = ? AND deleted_at IS NOT NULL', (user_id,))
+                    connection.execute('''
+                        UPDATE purge_jobs SET status = 'done', error = NULL, updated_at = ?, finished_at = ?
+                        WHERE user_id = ?
+                    ''', (now, now, user_id))
+                    connection.commit()
+            except Exception:
+                websites.rollback()
+                connection.rollback()
+                raise
+
+        for website_id in website_ids:
+            WebsiteRevision.forget(website_id)
+            shards.forget(website_id)
+        shared_cache.invalidate(*(f'website:{website_id}' for website_id in website_ids))
+        return not website_ids
+
+    @staticmethod
+    def record_error(connection, user_id, error):
+        connection.execute('UPDATE purge_jobs SET error = ?, updated_at = ? WHERE user_id = ?',
+                           (str(error), datetime.utcnow().isoformat(), user_id))
+        connection.commit()
+
+    @staticmethod
+    def to_dict(row):
+        return {
+            'user_id': str(row['user_id']),
+            'status': row['status'],
+            'websites_total': row['websites_total'],
+            'websites_deleted': row['websites_deleted'],
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'finished_at': row['finished_at']
+        }
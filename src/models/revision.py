@@ -0,0 +1,252 @@
+from datetime import datetime
+from collections import OrderedDict
+from src.models import shards
+from src.services import json_codec
+import os
+import threading
+
+# Website fields tracked by revisions; content sections are tracked one by one
+TRACKED_FIELDS = ('title', 'business_type', 'industry')
+
+def flatten_state(title, content, business_type, industry):
+    """Flatten a website into ``{key: value}`` with one key per content section."""
+    state = {'title': title, 'business_type': business_type, 'industry': industry}
+    if isinstance(content, dict):
+        for section, value in content.items():
+            state[f'content.{section}'] = value
+    elif content not in (None, ''):
+        state['content'] = content
+    return state
+
+def unflatten_state(state):
+    """Inverse of ``flatten_state``; returns a dict shaped like ``Website.to_dict``."""
+    result = {field: state.get(field) for field in TRACKED_FIELDS}
+    if 'content' in state:
+        result['content'] = state['content']
+    else:
+        result['content'] = {key[len('content.'):]: value for key, value in state.items()
+                             if key.startswith('content.')}
+    return result
+
+def diff_states(old, new):
+    """Per-key delta turning ``old`` into ``new``."""
+    changed = {key: value for key, value in new.items() if key not in old or old[key] != value}
+    removed = [key for key in old if key not in new]
+    delta = {}
+    if changed:
+        delta['set'] = changed
+    if removed:
+        delta['unset'] = removed
+    return delta
+
+def apply_delta(state, delta):
+    state = dict(state)
+    state.update(delta.get('set', {}))
+    for key in delta.get('unset', []):
+        state.pop(key, None)
+    return state
+
+class WebsiteRevision:
+    """Delta-compressed history of website changes.
+
+    Every save appends a revision. Most revisions store only the per-section
+    delta against the previous one; every ``REVISION_SNAPSHOT_INTERVAL``
+    revisions a full snapshot is written, so rebuilding any revision reads at
+    most that many rows. Only the newest ``REVISION_RETENTION`` revisions are
+    kept: older ones are dropped and the oldest survivor is rewritten as a
+    snapshot.
+    """
+
+    # Last reconstructed state per website, so saves usually skip the replay
+    _state_cache = OrderedDict()
+    _state_cache_lock = threading.Lock()
+    _state_cache_size = 1024
+
+    @staticmethod
+    def snapshot_interval():
+        return max(1, int(os.getenv('REVISION_SNAPSHOT_INTERVAL', 10)))
+
+    @staticmethod
+    def retention():
+        return max(1, int(os.getenv('REVISION_RETENTION', 50)))
+
+    @staticmethod
+    def record(website, load_previous_state=None, connection=None, version=None):
+        """Append a revision for ``website``; the caller commits.
+
+        ``load_previous_state`` returns the flattened state currently stored;
+        it is only called for websites saved before revisions existed, to
+        seed their history. Returns the new revision number, or None when
+        nothing changed. ``connection`` is the website's shard, where the
+        caller's transaction is open. ``version`` is the website version
+        this save writes, so ``state_at_version`` can find it again.
+        """
+        cursor = (connection or shards.for_user(website.user_id)).cursor()
+        new_state = flatten_state(website.title, website.content, website.business_type, website.industry)
+
+        cursor.execute('''
+            SELECT MAX(revision) AS latest,
+                   MAX(CASE WHEN kind = 'snapshot' THEN revision END) AS last_snapshot
+            FROM website_revisions WHERE website_id = ?
+        ''', (website.id,))
+        row = cursor.fetchone()
+        latest, last_snapshot = row['latest'], row['last_snapshot']
+
+        previous_state = load_previous_state() if latest is None and load_previous_state else None
+        if previous_state is not None and previous_state != new_state:
+            # First change to a pre-existing website: keep what it looked like
+            WebsiteRevision._insert(cursor, website.id, 1, 'snapshot', previous_state,
+                                    version - 1 if version is not None else None)
+            latest, last_snapshot = 1, 1
+
+        if latest is None:
+            revision, kind, data = 1, 'snapshot', new_state
+        else:
+            old_state = WebsiteRevision.state_at(website.id, latest, cursor.connection)
+            delta = diff_states(old_state, new_state)
+            if not delta:
+                return None
+            revision = latest + 1
+            if revision - (last_snapshot or 0) >= WebsiteRevision.snapshot_interval():
+                kind, data = 'snapshot', new_state
+            else:
+                kind, data = 'delta', delta
+
+        WebsiteRevision._insert(cursor, website.id, revision, kind, data, version)
+        WebsiteRevision._cache_put(website.id, revision, new_state)
+        WebsiteRevision._compact(cursor, website.id, revision)
+        return revision
+
+    @staticmethod
+    def seed_state(website_id, load_previous_state, connection):
+        """``load_previous_state()`` if the website has no revisions yet, else None.
+
+        Call it before the website row is written and hand the result to
+        ``record``, which seeds the history from what was stored.
+        """
+        if load_previous_state is None or connection.execute(
+                'SELECT 1 FROM website_revisions WHERE website_id = ? LIMIT 1', (website_id,)).fetchone():
+            return None
+        return load_previous_state()
+
+    @staticmethod
+    def _insert(cursor, website_id, revision, kind, data, version=None):
+        cursor.execute('''
+            INSERT INTO website_revisions (website_id, revision, kind, data, created_at, version)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (website_id, revision, kind, json_codec.dumps(data), datetime.utcnow().isoformat(), version))
+
+    @staticmethod
+    def _compact(cursor, website_id, latest):
+        """Enforce retention once enough revisions have piled up.
+
+        Runs only every ``snapshot_interval`` revisions past the limit, so the
+        rewrite cost is amortised across saves.
+        """
+        retention = WebsiteRevision.retention()
+        cursor.execute('SELECT MIN(revision) AS oldest FROM website_revisions WHERE website_id = ?', (website_id,))
+        oldest = cursor.fetchone()['oldest']
+        if latest - oldest + 1 < retention + WebsiteRevision.snapshot_interval():
+            return
+
+        cutoff = latest - retention + 1
+        state = WebsiteRevision.state_at(website_id, cutoff, cursor.connection)
+        cursor.execute('''
+            UPDATE website_revisions SET kind = 'snapshot', data = ?
+            WHERE website_id = ? AND revision = ?
+        ''', (json_codec.dumps(state), website_id, cutoff))
+        cursor.execute('DELETE FROM website_revisions WHERE website_id = ? AND revision < ?', (website_id, cutoff))
+
+    @staticmethod
+    def _cache_put(website_id, revision, state):
+        cache = WebsiteRevision._state_cache
+        with WebsiteRevision._state_cache_lock:
+            cache[website_id] = (revision, state)
+            cache.move_to_end(website_id)
+            if len(cache) > WebsiteRevision._state_cache_size:
+                cache.popitem(last=False)
+
+    @staticmethod
+    def state_at(website_id, revision, connection=None):
+        """Rebuild the flattened state at ``revision``, or None if unknown."""
+        with WebsiteRevision._state_cache_lock:
+            cached = WebsiteRevision._state_cache.get(website_id)
+        if cached and cached[0] == revision:
+            return dict(cached[1])
+
+        cursor = (connection or shards.for_website(website_id)).cursor()
+        cursor.execute('''
+            SELECT revision, kind, data FROM website_revisions
+            WHERE website_id = ? AND revision <= ? AND revision >= (
+                SELECT MAX(revision) FROM website_revisions
+                WHERE website_id = ? AND kind = 'snapshot' AND revision <= ?
+            )
+            ORDER BY revision
+        ''', (website_id, revision, website_id, revision))
+        rows = cursor.fetchall()
+        if not rows or rows[-1]['revision'] != revision:
+            return None
+
+        state = {}
+        for row in rows:
+            data = json_codec.loads(row['data'])
+            state = data if row['kind'] == 'snapshot' else apply_delta(state, data)
+        return state
+
+    @staticmethod
+    def state_at_version(website_id, version, connection=None):
+        """Rebuild the flattened state the website had at ``version``, or None if unknown.
+
+        Saves that changed nothing bump the version without a revision, so
+        this is the newest revision written at or before ``version``. None
+        once retention dropped it or for versions saved before revisions
+        recorded their version.
+        """
+        row = (connection or shards.for_website(website_id)).execute('''
+            SELECT MAX(revision) AS revision FROM website_revisions
+            WHERE website_id = ? AND version <= ?
+        ''', (website_id, version)).fetchone()
+        if row['revision'] is None:
+            return None
+        return WebsiteRevision.state_at(website_id, row['revision'], connection)
+
+    @staticmethod
+    def find_by_website_id(website_id, limit=50, before=None):
+        """List revision metadata, newest first."""
+        cursor = shards.for_website(website_id).cursor()
+        cursor.execute('''
+            SELECT revision, kind, data, created_at FROM website_revisions
+            WHERE website_id = ? AND revision < ?
+            ORDER BY revision DESC LIMIT ?
+        ''', (website_id, before if before is not None else 2 ** 62, limit))
+
+        revisions = []
+        for row in cursor.fetchall():
+            data = json_codec.loads(row['data'])
+            revisions.append({
+                'revision': row['revision'],
+                'kind': row['kind'],
+                'changed': sorted(data.get('set', {})) + sorted(data.get('unset', []))
+                           if row['kind'] == 'delta' else None,
+                'created_at': row['created_at']
+            })
+        return revisions
+
+    @staticmethod
+    def get(website_id, revision):
+        state = WebsiteRevision.state_at(website_id, revision)
+        return unflatten_state(state) if state is not None else None
+
+    @staticmethod
+    def diff(website_id, revision, against):
+        """Delta turning revision ``against`` into ``revision``."""
+        new_state = WebsiteRevision.state_at(website_id, revision)
+        old_state = WebsiteRevision.state_at(website_id, against)
+        if new_state is None or old_state is None:
+            return None
+        return diff_states(old_state, new_state)
+
+    @staticmethod
+    def forget(website_id):
+        with WebsiteRevision._state_cache_lock:
+            WebsiteRevision._state_cache.pop(website_id, None)
@@ -1,7 +1,12 @@
 from datetime import datetime
-from src.models.database import db
+from src.repositories.registry import repositories
+from src.services.shared_cache import shared_cache
+from src.services import json_codec
 import json
 
+def _as_dict(row):
+    return dict(row) if row else None
+
 class Role:
     def __init__(self, name, permissions=None):
         self.name = name
@@ -10,89 +15,59 @@ class Role:
         self.updated_at = datetime.utcnow().isoformat()
 
     def save(self):
-        cursor = db.cursor()
-        permissions_json = json.dumps(self.permissions)
+        permissions_json = json_codec.dumps(self.permissions)
         
         if hasattr(self, 'id'):
             # Update existing role
-            cursor.execute('''
-                UPDATE roles SET name=?, permissions=?, updated_at=?
-                WHERE id=?
-            ''', (self.name, permissions_json, datetime.utcnow().isoformat(), self.id))
+            repositories().roles.update(self.id, {
+                'name': self.name, 'permissions': permissions_json, 'updated_at': datetime.utcnow().isoformat()
+            })
         else:
             # Create new role
-            cursor.execute('''
-                INSERT INTO roles (name, permissions, created_at, updated_at)
-                VALUES (?, ?, ?, ?)
-            ''', (self.name, permissions_json, self.created_at, self.updated_at))
-            self.id = cursor.lastrowid
-        
-        db.commit()
+            self.id = repositories().roles.insert({
+                'name': self.name, 'permissions': permissions_json,
+                'created_at': self.created_at, 'updated_at': self.updated_at
+            })
+        shared_cache.invalidate('roles')
         return self
 
+    @staticmethod
+    def _from_row(row):
+        role = Role.__new__(Role)
+        role.id = row['id']
+        role.name = row['name']
+        try:
+            role.permissions = json_codec.loads(row['permissions']) if row['permissions'] else []
+        except json.JSONDecodeError:
+            role.permissions = []
+        role.created_at = row['created_at']
+        role.updated_at = row['updated_at']
+        return role
+
+    @staticmethod
+    def _cached(key, loader):
+        # Any role change invalidates every cached role lookup
+        return shared_cache.get_or_load(key, loader, tag='roles')
+
     @staticmethod
     def find_by_id(role_id):
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM roles WHERE id = ?', (role_id,))
-        row = cursor.fetchone()
-        
-        if row:
-            role = Role.__new__(Role)
-            role.id = row['id']
-            role.name = row['name']
-            try:
-                role.permissions = json.loads(row['permissions']) if row['permissions'] else []
-            except json.JSONDecodeError:
-                role.permissions = []
-            role.created_at = row['created_at']
-            role.updated_at = row['updated_at']
-            return role
-        return None
+        row = Role._cached(f'role:{role_id}', lambda: _as_dict(repositories().roles.get(role_id)))
+        return Role._from_row(row) if row else None
 
     @staticmethod
     def find_by_name(name):
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM roles WHERE name = ?', (name,))
-        row = cursor.fetchone()
-        
-        if row:
-            role = Role.__new__(Role)
-            role.id = row['id']
-            role.name = row['name']
-            try:
-                role.permissions = json.loads(row['permissions']) if row['permissions'] else []
-            except json.JSONDecodeError:
-                role.permissions = []
-            role.created_at = row['created_at']
-            role.updated_at = row['updated_at']
-            return role
-        return None
+        row = Role._cached(f'role-name:{name}', lambda: _as_dict(repositories().roles.get_by_name(name)))
+        return Role._from_row(row) if row else None
 
     @staticmethod
     def find_all():
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM roles')
-        rows = cursor.fetchall()
-        
-        roles = []
-        for row in rows:
-            role = Role.__new__(Role)
-            role.id = row['id']
-            role.name = row['name']
-            try:
-                role.permissions = json.loads(row['permissions']) if row['permissions'] else []
-            except json.JSONDecodeError:
-                role.permissions = []
-            role.created_at = row['created_at']
-            role.updated_at = row['updated_at']
-            roles.append(role)
-        return roles
+        rows = Role._cached('roles', lambda: [dict(row) for row in repositories().roles.list()])
+        return [Role._from_row(row) for row in rows]
 
     def delete(self):
         if hasattr(self, 'id'):
-            cursor = db.cursor()
-            cursor.execute('DELETE FROM roles WHERE id = ?', (self.id,))
-            db.commit()
+            repositories().roles.delete(self.id)
+            shared_cache.invalidate('roles')
             return True
         return False
 
@@ -0,0 +1,283 @@
+"""Horizontal sharding of website storage.
+
+``WEBSITE_SHARDS`` (default 1) spreads websites, together with everything
+stored next to them (search index, facet counts, website statistics and
+revisions), over that many SQLite files, so saves for different users no
+longer queue for the same write lock. Shard 0 is the main database; shard
+``k`` is ``websites-<k>.db`` in ``WEBSITE_SHARD_DIR`` (default: next to the
+main database). Users, roles and job tables always stay in the main database.
+
+All websites of a user live on one shard, picked by a jump consistent hash of
+the user id, so going from N to N+1 shards only moves 1/(N+1) of the users.
+``flask admin reshard`` moves them; run it with the app stopped, then restart
+the app with the new ``WEBSITE_SHARDS``. With more than one shard, website ids
+are handed out in blocks of ``WEBSITE_ID_BLOCK`` (default 100) by the main
+database so they stay unique across files.
+
+Content deduplication (``CONTENT_DEDUP``) only applies unsharded, because its
+section store lives in the main database.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import re
+import threading
+
+from src.models.database import db, db_instance, SerializedConnection
+from src.models import content_codec
+from src.services.shared_cache import shared_cache
+
+WEBSITE_COLUMNS = ('id', 'title', 'content', 'user_id', 'business_type', 'industry',
+                   'created_at', 'updated_at', 'archived_at', 'version')
+
+_connections = {}
+_lock = threading.Lock()
+_executor = None
+
+# website id -> shard; ids only change shard during an offline reshard
+_locations = OrderedDict()
+_locations_lock = threading.Lock()
+_locations_size = 65536
+
+_id_lock = threading.Lock()
+_id_connection = None
+_id_block = [0, 0]  # next id, end of the reserved block
+
+
+def shard_count():
+    return max(1, int(os.getenv('WEBSITE_SHARDS', 1)))
+
+
+def is_sharded():
+    return shard_count() > 1
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping & Veach) of a 64-bit key."""
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(user_id, count=None):
+    """Shard holding the websites of ``user_id``."""
+    count = count or shard_count()
+    if count == 1 or user_id is None:
+        return 0
+    # Sequential ids are mixed first; the jump hash expects uniform keys
+    digest = hashlib.blake2b(str(int(user_id)).encode(), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, 'big'), count)
+
+
+def shard_path(shard):
+    directory = os.getenv('WEBSITE_SHARD_DIR') or os.path.dirname(os.path.abspath(db_instance.path))
+    return os.path.join(directory, f'websites-{shard}.db')
+
+
+def connection(shard):
+    """Shared connection to ``shard``, created and migrated on first use."""
+    if shard == 0:
+        return db
+    with _lock:
+        if shard not in _connections:
+            path = shard_path(shard)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shard_connection = SerializedConnection(db_instance.connect(path))
+            db_instance.initialize_shard(shard_connection)
+            _connections[shard] = shard_connection
+        return _connections[shard]
+
+
+def connections():
+    return [connection(shard) for shard in range(shard_count())]
+
+
+def for_user(user_id):
+    return connection(shard_for(user_id))
+
+
+def for_website(website_id):
+    """Connection to the shard holding ``website_id`` (the main one if none does)."""
+    shard = locate(website_id)
+    return connection(shard or 0)
+
+
+def fan_out(func, targets=None):
+    """Call ``func(connection)`` for every shard in parallel; results in shard order.
+
+    SQLite releases the GIL while it runs a query, so the shards are read
+    concurrently. ``targets`` narrows the call to some connections.
+    """
+    global _executor
+    targets = connections() if targets is None else targets
+    if len(targets) == 1:
+        return [func(targets[0])]
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(2, shard_count()), thread_name_prefix='shard')
+    return list(_executor.map(func, targets))
+
+
+def remember(website_id, shard):
+    if not is_sharded():
+        return
+    with _locations_lock:
+        _locations[website_id] = shard
+        _locations.move_to_end(website_id)
+        if len(_locations) > _locations_size:
+            _locations.popitem(last=False)
+
+
+def forget(website_id):
+    with _locations_lock:
+        _locations.pop(website_id, None)
+
+
+def locate(website_id):
+    """Shard holding ``website_id``, or None if no shard has it."""
+    try:
+        website_id = int(website_id)
+    except (TypeError, ValueError):
+        return None
+    if not is_sharded():
+        return 0
+    with _locations_lock:
+        if website_id in _locations:
+            _locations.move_to_end(website_id)
+            return _locations[website_id]
+    for shard in range(shard_count()):
+        if connection(shard).execute('SELECT 1 FROM websites WHERE id = ?', (website_id,)).fetchone():
+            remember(website_id, shard)
+            return shard
+    return None
+
+
+def allocate_ids(count=1):
+    """Reserve ``count`` new website ids.
+
+    Unsharded this returns Nones and ``AUTOINCREMENT`` assigns the ids as
+    before. Sharded, ids come from a block reserved in the main database, so
+    a save only touches the main database once per ``WEBSITE_ID_BLOCK`` ids.
+    """
+    if not is_sharded():
+        return [None] * count
+    ids = []
+    with _id_lock:
+        while len(ids) < count:
+            if _id_block[0] >= _id_block[1]:
+                _id_block[:] = _reserve_block(max(int(os.getenv('WEBSITE_ID_BLOCK', 100)), count - len(ids)))
+            take = min(count - len(ids), _id_block[1] - _id_block[0])
+            ids.extend(range(_id_block[0], _id_block[0] + take))
+            _id_block[0] += take
+    return ids
+
+
+def _reserve_block(size):
+    global _id_connection
+    if _id_connection is None:
+        _id_connection = db_instance.connect()
+    # Blocks never start below the main table's AUTOINCREMENT counter, which
+    # covers every website created or moved there while unsharded
+    row = _id_connection.execute('''
+        INSERT INTO id_blocks (name, next_id)
+        VALUES ('websites', COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'websites'), 0) + 1 + ?)
+        ON CONFLICT (name) DO UPDATE SET next_id = MAX(
+            next_id, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'websites'), 0) + 1) + ?
+        RETURNING next_id
+    ''', (size, size)).fetchone()
+    _id_connection.commit()
+    return [row[0] - size, row[0]]
+
+
+def existing_shards():
+    """Shards with a database file, whatever ``WEBSITE_SHARDS`` says."""
+    directory = os.path.dirname(shard_path(1))
+    found = {0}
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            match = re.fullmatch(r'websites-(\d+)\.db', name)
+            if match:
+                found.add(int(match.group(1)))
+    return sorted(found)
+
+
+def rebalance(target, batch_size=200, progress=None):
+    """Move every website to the shard it belongs on with ``target`` shards.
+
+    Each batch is copied to its destination and committed before it is
+    deleted from the source, and copies skip rows that already exist, so an
+    interrupted run can simply be started again. Triggers rebuild the search
+    index, facet counts and statistics on both sides. Deduplicated content
+    is stored inline when it leaves the main database. Returns the number of
+    websites moved.
+    """
+    columns = ', '.join(WEBSITE_COLUMNS)
+    placeholders = ', '.join('?' * len(WEBSITE_COLUMNS))
+    moved = 0
+
+    for source_shard in sorted(set(existing_shards()) | set(range(target))):
+        source = connection(source_shard)
+        last_id = 0
+        while True:
+            rows = source.execute(f'SELECT {columns} FROM websites WHERE id > ? ORDER BY id LIMIT ?',
+                                  (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+            by_destination = {}
+            for row in rows:
+                destination = shard_for(row['user_id'], target)
+                if destination != source_shard:
+                    by_destination.setdefault(destination, []).append(row)
+
+            for destination, batch in by_destination.items():
+                target_connection = connection(destination)
+                ids = [row['id'] for row in batch]
+                id_list = ', '.join('?' * len(ids))
+                revisions = source.execute(f'''
+                    SELECT website_id, revision, kind, data, created_at FROM website_revisions
+                    WHERE website_id IN ({id_list})
+                ''', ids).fetchall()
+                values = []
+                for row in batch:
+                    row = dict(row)
+                    if destination != 0 and content_codec.is_manifest(row['content']):
+                        row['content'] = content_codec.encode(content_codec.decode(row['content']), dedup=False)
+                    values.append(tuple(row[column] for column in WEBSITE_COLUMNS))
+                try:
+                    target_connection.executemany(f'''
+                        INSERT INTO websites ({columns}) VALUES ({placeholders})
+                        ON CONFLICT (id) DO NOTHING
+                    ''', values)
+                    target_connection.executemany('''
+                        INSERT OR IGNORE INTO website_revisions (website_id, revision, kind, data, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', [tuple(revision) for revision in revisions])
+                    target_connection.commit()
+                except Exception:
+                    target_connection.rollback()
+                    raise
+
+                try:
+                    source.execute(f'DELETE FROM websites WHERE id IN ({id_list})', ids)
+                    source.commit()
+                except Exception:
+                    source.rollback()
+                    raise
+                shared_cache.invalidate(*(f'website:{website_id}' for website_id in ids))
+                moved += len(batch)
+
+            if progress:
+                progress(source_shard, last_id, moved)
+
+    with _locations_lock:
+        _locations.clear()
+    with _id_lock:
+        # The main table's counter may have moved past the cached block
+        _id_block[:] = [0, 0]
+    return moved
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from src.models.database import db, Database
+from src.models import shards
+
+class Stats:
+    """Read side of the trigger-maintained summary tables.
+
+    User counters live in the main database; website counters are kept per
+    shard and added up here.
+    """
+
+    @staticmethod
+    def overview(days=30, top=10):
+        cursor = db.cursor()
+
+        cursor.execute("SELECT count FROM stats_totals WHERE name = 'users'")
+        row = cursor.fetchone()
+        total_users = row['count'] if row else 0
+
+        cursor.execute('SELECT role, count FROM stats_users_by_role WHERE count > 0 ORDER BY role')
+        users_by_role = {row['role']: row['count'] for row in cursor.fetchall()}
+
+        since = (datetime.utcnow() - timedelta(days=days - 1)).date().isoformat()
+
+        def website_stats(connection):
+            total = connection.execute("SELECT count FROM stats_totals WHERE name = 'websites'").fetchone()
+            owners = connection.execute('''
+                SELECT user_id, count FROM stats_websites_by_user
+                WHERE count > 0 ORDER BY count DESC LIMIT ?
+            ''', (top,)).fetchall()
+            per_day = connection.execute('''
+                SELECT day, count FROM stats_websites_by_day
+                WHERE day >= ? AND count > 0
+            ''', (since,)).fetchall()
+            return (total['count'] if total else 0), owners, per_day
+
+        total_websites = 0
+        owners = []
+        created_per_day = {}
+        for shard_total, shard_owners, per_day in shards.fan_out(website_stats):
+            total_websites += shard_total
+            # A user's websites are all on one shard, so the top lists just merge
+            owners.extend(shard_owners)
+            for row in per_day:
+                created_per_day[row['day']] = created_per_day.get(row['day'], 0) + row['count']
+        top_owners = [{'user_id': str(row['user_id']), 'websites': row['count']}
+                      for row in sorted(owners, key=lambda row: -row['count'])[:top]]
+        created_per_day = dict(sorted(created_per_day.items()))
+
+        return {
+            'total_users': total_users,
+            'total_websites': total_websites,
+            'users_by_role': users_by_role,
+            'websites_per_user': {
+                'average': round(total_websites / total_users, 2) if total_users else 0,
+                'top': top_owners
+            },
+            'websites_created_per_day': created_per_day
+        }
+
+    @staticmethod
+    def rebuild():
+        """Recompute the summary tables from scratch to repair any drift."""
+        for shard, connection in enumerate(shards.connections()):
+            try:
+                Database.rebuild_stats(connection.cursor(), users=shard == 0)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        return Stats.overview()
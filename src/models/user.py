@@ -1,7 +1,7 @@
 from datetime import datetime
-from src.models.database import db
-import hashlib
-import secrets
+from src.repositories.registry import repositories
+from src.services.password_hasher import password_hasher
+from src.services.shared_cache import shared_cache
 
 class User:
     def __init__(self, email, password, role='editor', username=None):
@@ -11,102 +11,90 @@ class User:
         self.username = username or email.split('@')[0]
         self.created_at = datetime.utcnow().isoformat()
         self.updated_at = datetime.utcnow().isoformat()
+        self.deleted_at = None
 
     def _hash_password(self, password):
-        # Use a simple salt + hash approach for deployment compatibility
-        salt = secrets.token_hex(16)
-        hash_obj = hashlib.sha256((password + salt).encode())
-        return salt + hash_obj.hexdigest()
+        return password_hasher.hash(password)
+
+    def set_password(self, password):
+        self.password_hash = self._hash_password(password)
 
     def check_password(self, password):
-        if len(self.password_hash) < 32:
-            return False
-        salt = self.password_hash[:32]
-        stored_hash = self.password_hash[32:]
-        hash_obj = hashlib.sha256((password + salt).encode())
-        return hash_obj.hexdigest() == stored_hash
+        return password_hasher.verify(password, self.password_hash)
+
+    def needs_rehash(self):
+        """True when the stored hash predates the current algorithm or cost."""
+        return password_hasher.needs_rehash(self.password_hash)
 
     def save(self):
-        cursor = db.cursor()
         if hasattr(self, 'id'):
             # Update existing user
-            cursor.execute('''
-                UPDATE users SET email=?, username=?, password_hash=?, role=?, updated_at=?
-                WHERE id=?
-            ''', (self.email, self.username, self.password_hash, self.role, 
-                  datetime.utcnow().isoformat(), self.id))
+            repositories().users.update(self.id, {
+                'email': self.email, 'username': self.username, 'password_hash': self.password_hash,
+                'role': self.role, 'updated_at': datetime.utcnow().isoformat()
+            })
+            shared_cache.invalidate(f'user:{self.id}')
         else:
             # Create new user
-            cursor.execute('''
-                INSERT INTO users (email, username, password_hash, role, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (self.email, self.username, self.password_hash, self.role, 
-                  self.created_at, self.updated_at))
-            self.id = cursor.lastrowid
-        
-        db.commit()
+            self.id = repositories().users.insert({
+                'email': self.email, 'username': self.username, 'password_hash': self.password_hash,
+                'role': self.role, 'created_at': self.created_at, 'updated_at': self.updated_at
+            })
         return self
 
     @staticmethod
-    def find_by_email(email):
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
-        row = cursor.fetchone()
-        
-        if row:
-            user = User.__new__(User)
-            user.id = row['id']
-            user.email = row['email']
-            user.username = row['username']
-            user.password_hash = row['password_hash']
-            user.role = row['role']
-            user.created_at = row['created_at']
-            user.updated_at = row['updated_at']
-            return user
+    def _from_row(row):
+        user = User.__new__(User)
+        user.id = row['id']
+        user.email = row['email']
+        user.username = row['username']
+        user.password_hash = row['password_hash']
+        user.role = row['role']
+        user.created_at = row['created_at']
+        user.updated_at = row['updated_at']
+        user.deleted_at = row['deleted_at']
+        return user
+
+    @staticmethod
+    def authenticate(email, password):
+        """The user with ``email`` and ``password``, or None.
+
+        Unknown emails cost the same key derivation as a wrong password, so
+        response times do not reveal which accounts exist.
+        """
+        user = User.find_by_email(email)
+        if user is None:
+            password_hasher.verify_dummy(password)
+            return None
+        return user if user.check_password(password) else None
+
+    @staticmethod
+    def find_by_email(email, include_deleted=False):
+        """Users being purged are only returned with ``include_deleted``."""
+        row = repositories().users.get_by_email(email)
+        if row and (include_deleted or row['deleted_at'] is None):
+            return User._from_row(row)
         return None
 
     @staticmethod
     def find_by_id(user_id):
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        row = cursor.fetchone()
-        
-        if row:
-            user = User.__new__(User)
-            user.id = row['id']
-            user.email = row['email']
-            user.username = row['username']
-            user.password_hash = row['password_hash']
-            user.role = row['role']
-            user.created_at = row['created_at']
-            user.updated_at = row['updated_at']
-            return user
-        return None
+        # Looked up on every authenticated request; shared by all workers
+        row = shared_cache.get_or_load(f'user:{user_id}', lambda: User._load_row(user_id), tag=f'user:{user_id}')
+        return User._from_row(row) if row else None
+
+    @staticmethod
+    def _load_row(user_id):
+        row = repositories().users.get(user_id)
+        return dict(row) if row else None
 
     @staticmethod
     def find_all():
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM users')
-        rows = cursor.fetchall()
-        
-        users = []
-        for row in rows:
-            user = User.__new__(User)
-            user.id = row['id']
-            user.email = row['email']
-            user.username = row['username']
-            user.password_hash = row['password_hash']
-            user.role = row['role']
-            user.created_at = row['created_at']
-            user.updated_at = row['updated_at']
-            users.append(user)
-        return users
+        return [User._from_row(row) for row in repositories().users.list()]
 
     def delete(self):
         if hasattr(self, 'id'):
-            cursor = db.cursor()
-            cursor.execute('DELETE FROM users WHERE id = ?', (self.id,))
-            db.commit()
+            repositories().users.delete(self.id)
+            shared_cache.invalidate(f'user:{self.id}')
             return True
         return False
 
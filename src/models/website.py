@@ -1,6 +1,22 @@
 from datetime import datetime
-from src.models.database import db
-import json
+from itertools import islice
+from src.models.database import db, FACET_COLUMNS
+from src.models import content_codec, shards
+from src.models.revision import WebsiteRevision, flatten_state, unflatten_state, diff_states, apply_delta
+from src.models.archive import WebsiteArchive
+from src.repositories.registry import repositories
+from src.services.autosave import autosave_buffer
+from src.services.shared_cache import shared_cache
+from src.services import json_codec
+import os
+import re
+
+class VersionConflict(Exception):
+    """The website was saved by someone else since it was loaded."""
+
+    def __init__(self, current_version):
+        super().__init__('Website was changed by someone else; reload it and try again')
+        self.current_version = current_version
 
 class Website:
     def __init__(self, title, content, user_id, business_type=None, industry=None):
@@ -11,116 +27,390 @@ class Website:
         self.industry = industry
         self.created_at = datetime.utcnow().isoformat()
         self.updated_at = datetime.utcnow().isoformat()
+        self.archived_at = None
+        self.version = 1
+        self._base = None
 
-    def save(self):
-        cursor = db.cursor()
-        content_json = json.dumps(self.content) if isinstance(self.content, dict) else self.content
-        
-        if hasattr(self, 'id'):
-            # Update existing website
-            cursor.execute('''
-                UPDATE websites SET title=?, content=?, business_type=?, industry=?, updated_at=?
-                WHERE id=?
-            ''', (self.title, content_json, self.business_type, self.industry,
-                  datetime.utcnow().isoformat(), self.id))
-        else:
-            # Create new website
-            cursor.execute('''
-                INSERT INTO websites (title, content, user_id, business_type, industry, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (self.title, content_json, self.user_id, self.business_type, 
-                  self.industry, self.created_at, self.updated_at))
-            self.id = cursor.lastrowid
-        
-        db.commit()
+    @property
+    def content(self):
+        # Stored content is only decompressed and parsed when first accessed
+        if self._content_raw is not None:
+            self._content = content_codec.decode(self._content_raw)
+            self._content_raw = None
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+        self._content_raw = None
+
+    @staticmethod
+    def _from_row(row):
+        website = Website.__new__(Website)
+        website.id = row['id']
+        website.title = row['title']
+        website._content = None
+        website._content_raw = row['content'] if row['content'] else b'{}'
+        website.user_id = row['user_id']
+        website.business_type = row['business_type']
+        website.industry = row['industry']
+        website.created_at = row['created_at']
+        website.updated_at = row['updated_at']
+        website.archived_at = row['archived_at']
+        website.version = row['version']
+        # What was stored at ``version``; conflicting saves merge against it
+        website._base = (row['title'], website._content_raw, row['business_type'], row['industry'])
+        # Edits still waiting in the autosave buffer are part of what readers see
+        return autosave_buffer.overlay(website)
+
+    @staticmethod
+    def _from_rows(rows):
+        """``_from_row`` for a listing; archived stubs get their archived content.
+
+        Listed websites stay archived; their content is read from the archive
+        in batches rather than restoring each of them.
+        """
+        websites = [Website._from_row(row) for row in rows]
+        archived = [website for website in websites if website.archived_at]
+        if archived:
+            contents = WebsiteArchive.contents(website.id for website in archived)
+            for website in archived:
+                website.content = contents.get(website.id, {})
+        return websites
+
+    def _values(self):
+        # Untouched content is written back in its stored encoding
+        content = self._content_raw if self._content_raw is not None else content_codec.encode(self.content)
+        return {'title': self.title, 'content': content, 'business_type': self.business_type,
+                'industry': self.industry}
+
+    def save(self, merge=True):
+        """Insert or update the website.
+
+        Updates only apply if nobody saved the website since it was loaded
+        (``version`` still matches). Otherwise, with ``merge``, edits are
+        carried over to the stored version as long as they touch other
+        fields and content sections than the intervening saves, and the save
+        is retried; anything else raises ``VersionConflict``.
+        """
+        try:
+            if hasattr(self, 'id'):
+                # Update existing website
+                for _ in range(max(1, int(os.getenv('WEBSITE_SAVE_RETRIES', 3)))):
+                    values = dict(self._values(), updated_at=datetime.utcnow().isoformat())
+                    if repositories().websites.update(self, values, load_previous_state=self._stored_state):
+                        break
+                    if not merge:
+                        raise VersionConflict(Website._stored_version(self.id))
+                    self._rebase()
+                else:
+                    raise VersionConflict(Website._stored_version(self.id))
+                self.version += 1
+            else:
+                # Create new website
+                values = dict(self._values(), user_id=self.user_id,
+                              created_at=self.created_at, updated_at=self.updated_at)
+                repositories().websites.insert(self, values)
+                self.version = 1
+        except Exception:
+            if hasattr(self, 'id'):
+                WebsiteRevision.forget(self.id)
+            raise
+        self._base = (self.title, values['content'], self.business_type, self.industry)
+        shared_cache.invalidate(f'website:{self.id}')
+        autosave_buffer.saved(self)
         return self
 
+    def _base_state(self):
+        """Flattened state this website was loaded from, or None if unknown."""
+        if self._base is None:
+            return None
+        title, raw, business_type, industry = self._base
+        try:
+            return flatten_state(title, content_codec.decode(raw) if raw else {}, business_type, industry)
+        except Exception:
+            return None
+
+    def _rebase(self):
+        """Move unsaved edits on top of the stored version, or raise ``VersionConflict``."""
+        stored = Website.find_by_id(self.id, cached=False)
+        if not stored:
+            raise VersionConflict(None)
+        base, theirs = self._base_state(), stored._base_state()
+        if base is None or theirs is None:
+            raise VersionConflict(stored.version)
+
+        ours = diff_states(base, flatten_state(self.title, self.content, self.business_type, self.industry))
+        touched = lambda delta: set(delta.get('set', {})) | set(delta.get('unset', []))
+        if touched(ours) & touched(diff_states(base, theirs)):
+            raise VersionConflict(stored.version)
+
+        merged = unflatten_state(apply_delta(theirs, ours))
+        self.title = merged['title']
+        self.content = merged['content']
+        self.business_type = merged['business_type']
+        self.industry = merged['industry']
+        self.version, self._base = stored.version, stored._base
+
+    def edit_from(self, version):
+        """Start edits from what was stored at an older ``version``; False if it is no longer known.
+
+        The website is reset to that state; ``save`` then merges the edits
+        made on top of it with everything saved since, like any concurrent
+        save, and raises ``VersionConflict`` when they touch the same fields.
+        """
+        state = WebsiteRevision.state_at_version(self.id, version) if version < self.version else None
+        if state is None:
+            return False
+        base = unflatten_state(state)
+        self.title = base['title']
+        self.content = base['content']
+        self.business_type = base['business_type']
+        self.industry = base['industry']
+        self.version = version
+        self._base = (self.title, content_codec.encode(self.content), self.business_type, self.industry)
+        return True
+
+    @staticmethod
+    def _stored_version(website_id):
+        row = repositories().websites.get(website_id)
+        return row['version'] if row else None
+
+    def _stored_state(self):
+        stored = Website.find_by_id(self.id, cached=False)
+        if not stored:
+            return None
+        # Pending autosaves are not stored yet
+        return stored._base_state()
+
+    @staticmethod
+    def find_by_id(website_id, cached=True):
+        """Load a website; ``cached=False`` skips the shared cache (e.g. to check the stored version)."""
+        if cached:
+            row = shared_cache.get_or_load(f'website:{website_id}', lambda: Website._load_row(website_id),
+                                           tag=f'website:{website_id}')
+        else:
+            row = Website._load_row(website_id)
+        return Website._from_row(row) if row else None
+
     @staticmethod
-    def find_by_id(website_id):
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM websites WHERE id = ?', (website_id,))
-        row = cursor.fetchone()
-        
-        if row:
-            website = Website.__new__(Website)
-            website.id = row['id']
-            website.title = row['title']
-            try:
-                website.content = json.loads(row['content']) if row['content'] else {}
-            except json.JSONDecodeError:
-                website.content = row['content']
-            website.user_id = row['user_id']
-            website.business_type = row['business_type']
-            website.industry = row['industry']
-            website.created_at = row['created_at']
-            website.updated_at = row['updated_at']
-            return website
-        return None
+    def _load_row(website_id):
+        row = repositories().websites.get(website_id)
+
+        if row and row['archived_at']:
+            # Bring archived websites back on first access
+            WebsiteArchive.restore(row['id'])
+            row = repositories().websites.get(website_id)
+
+        return dict(row) if row else None
 
     @staticmethod
     def find_by_user_id(user_id):
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM websites WHERE user_id = ?', (user_id,))
-        rows = cursor.fetchall()
-        
-        websites = []
-        for row in rows:
-            website = Website.__new__(Website)
-            website.id = row['id']
-            website.title = row['title']
-            try:
-                website.content = json.loads(row['content']) if row['content'] else {}
-            except json.JSONDecodeError:
-                website.content = row['content']
-            website.user_id = row['user_id']
-            website.business_type = row['business_type']
-            website.industry = row['industry']
-            website.created_at = row['created_at']
-            website.updated_at = row['updated_at']
-            websites.append(website)
-        return websites
+        return Website._from_rows(repositories().websites.list_by_user(user_id))
 
     @staticmethod
     def find_all():
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM websites')
-        rows = cursor.fetchall()
-        
-        websites = []
-        for row in rows:
-            website = Website.__new__(Website)
-            website.id = row['id']
-            website.title = row['title']
-            try:
-                website.content = json.loads(row['content']) if row['content'] else {}
-            except json.JSONDecodeError:
-                website.content = row['content']
-            website.user_id = row['user_id']
-            website.business_type = row['business_type']
-            website.industry = row['industry']
-            website.created_at = row['created_at']
-            website.updated_at = row['updated_at']
-            websites.append(website)
+        return Website.find_filtered()
+
+    @staticmethod
+    def find_filtered(**filters):
+        """Websites matching ``filters`` in id order.
+
+        Supported keys: ``user_id``, ``industry``, ``business_type``,
+        ``created_from``/``created_to`` and ``updated_from``/``updated_to``
+        (ISO timestamps, inclusive). Missing or ``None`` values are ignored.
+        """
+        return Website._from_rows(repositories().websites.list(filters))
+
+    @staticmethod
+    def find_page(page=1, per_page=50, **filters):
+        """One page of ``find_filtered``; returns ``(websites, has_more)``.
+
+        Only the matches up to the end of the requested page are read.
+        """
+        rows = repositories().websites.list(filters, limit=page * per_page + 1)[(page - 1) * per_page:]
+        return Website._from_rows(rows[:per_page]), len(rows) > per_page
+
+    @staticmethod
+    def iter_filtered(batch_size=500, **filters):
+        """Yield websites matching ``filters`` in id order, ``batch_size`` rows per query.
+
+        Uses keyset pagination, so no read transaction stays open between
+        batches and memory use does not grow with the result size. Archived
+        websites are yielded with their archived content but stay archived.
+        """
+        rows = repositories().websites.iterate(filters, batch_size)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield from Website._from_rows(batch)
+
+    @staticmethod
+    def bulk_insert(websites):
+        """Insert new websites in as few transactions as the backend allows.
+
+        Skips the per-save revision bookkeeping; history starts with the
+        first edit, as for websites created before revisions existed. Ids
+        are only set on websites that were committed.
+        """
+        repositories().websites.bulk_insert([
+            (website, dict(website._values(), user_id=website.user_id,
+                           created_at=website.created_at, updated_at=website.updated_at))
+            for website in websites])
         return websites
 
+    @staticmethod
+    def clone(website, user_id, copies):
+        """Create ``copies`` of ``website`` owned by ``user_id``; returns the new ids.
+
+        Each copy is a dict with an optional ``title`` and ``content`` of
+        sections that replace the original's (``None`` removes a section).
+        The copies are made by the database in one statement and one
+        transaction, without decoding the content in Python, and start
+        without revisions like ``bulk_insert``.
+        """
+        if getattr(website, '_autosave_seq', None):
+            # Copy what the owner sees, pending autosaves included
+            autosave_buffer.flush(website.id)
+        if any(copy.get('content') is not None for copy in copies) and not isinstance(website.content, dict):
+            raise ValueError('Sections can only be overridden on websites whose content is an object')
+        now = datetime.utcnow().isoformat()
+        return repositories().websites.clone(website.id, copies, {
+            'user_id': int(user_id), 'created_at': now, 'updated_at': now})
+
+    @staticmethod
+    def facets(**filters):
+        """Return ``{facet: {value: count}}`` for industry and business_type."""
+        totals = {facet: {} for facet in FACET_COLUMNS}
+        for facet, value, count in repositories().websites.facets(filters, FACET_COLUMNS):
+            totals[facet][value] = totals[facet].get(value, 0) + count
+        return {facet: dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+                for facet, counts in totals.items()}
+
+    @staticmethod
+    def search(query, user_id=None, page=1, per_page=20):
+        """Full-text search over titles and content sections.
+
+        Returns ``(results, has_more)`` where each result is a summary dict
+        with a highlighted ``snippet``, best matches first. Passing
+        ``user_id`` restricts the search to that user's websites.
+        """
+        terms = re.findall(r'\w+', query or '')
+        if not terms:
+            return [], False
+
+        rows = repositories().websites.search(terms, user_id, page * per_page + 1)[(page - 1) * per_page:]
+        results = []
+        for row in rows[:per_page]:
+            results.append({
+                'id': str(row['id']),
+                'title': row['title'],
+                'user_id': str(row['user_id']),
+                'business_type': row['business_type'],
+                'industry': row['industry'],
+                'created_at': row['created_at'],
+                'updated_at': row['updated_at'],
+                'snippet': row['snippet'],
+                'score': row['score']
+            })
+        return results, len(rows) > per_page
+
     def delete(self):
         if hasattr(self, 'id'):
-            cursor = db.cursor()
-            cursor.execute('DELETE FROM websites WHERE id = ?', (self.id,))
-            db.commit()
+            autosave_buffer.discard(self.id)
+            repositories().websites.delete(self)
+            shared_cache.invalidate(f'website:{self.id}')
+            WebsiteRevision.forget(self.id)
+            if self.archived_at:
+                WebsiteArchive.discard(self.id)
             return True
         return False
 
+    @staticmethod
+    def train_content_dictionary(sample_size=2000):
+        """Train and store a compression dictionary from a sample of websites.
+
+        Dictionaries are shared by all shards and live in the main database.
+        """
+        per_shard = -(-sample_size // shards.shard_count())
+        results = shards.fan_out(lambda connection: connection.execute(
+            'SELECT content FROM websites WHERE content IS NOT NULL ORDER BY RANDOM() LIMIT ?',
+            (per_shard,)).fetchall())
+        samples = [content_codec.decode_text(row['content']) for rows in results for row in rows]
+        data = content_codec.train_dictionary(samples)
+        if not data:
+            return None
+        dictionary_id = content_codec.store_dictionary(data, datetime.utcnow().isoformat())
+        db.commit()
+        return dictionary_id
+
+    @staticmethod
+    def compress_stored_content(batch_size=500, recompress=False, progress=None):
+        """Re-encode stored content with the current codec settings.
+
+        Works through the table in primary-key order, committing every
+        ``batch_size`` rows so the write lock is only held briefly and the
+        app keeps serving while it runs. Plain JSON rows are encoded; with
+        ``recompress`` already encoded rows are re-encoded too (e.g. to pick
+        up a newly trained dictionary or to switch on ``CONTENT_DEDUP``), and
+        rows whose encoding would not change are skipped. ``updated_at`` is
+        left untouched. Shards are processed one after the other. Returns the
+        number of rows rewritten.
+        """
+        rewritten = 0
+        for connection in shards.connections():
+            rewritten = Website._compress_shard(connection, batch_size, recompress, progress, rewritten)
+        return rewritten
+
+    @staticmethod
+    def _compress_shard(connection, batch_size, recompress, progress, rewritten):
+        cursor = connection.cursor()
+        last_id = 0
+        while True:
+            cursor.execute('''
+                SELECT id, content FROM websites WHERE id > ? AND content IS NOT NULL
+                ORDER BY id LIMIT ?
+            ''', (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+            updates = []
+            for row in rows:
+                raw = row['content']
+                if content_codec.is_encoded(raw) and not recompress:
+                    continue
+                encoded = content_codec.encode(content_codec.decode(raw))
+                if encoded != raw:
+                    updates.append((encoded, row['id']))
+
+            if updates:
+                cursor.executemany('UPDATE websites SET content = ? WHERE id = ?', updates)
+                connection.commit()
+                # Cached rows may reference sections the new encoding released
+                shared_cache.invalidate(*(f'website:{website_id}' for _, website_id in updates))
+                rewritten += len(updates)
+            if progress:
+                progress(last_id, rewritten)
+        return rewritten
+
     def to_dict(self):
+        """Dict for responses; content nobody touched is ``RawJSON`` as stored."""
+        # Spliced into the response without parsing and re-encoding it
+        text = content_codec.json_text(self._content_raw) if self._content_raw is not None else None
         return {
             'id': str(self.id) if hasattr(self, 'id') else None,
             'title': self.title,
-            'content': self.content,
+            'content': json_codec.RawJSON(text) if text is not None else self.content,
             'user_id': str(self.user_id),
             'business_type': self.business_type,
             'industry': self.industry,
             'created_at': self.created_at,
-            'updated_at': self.updated_at
+            'updated_at': self.updated_at,
+            'archived_at': self.archived_at,
+            'version': self.version
         }
 
     def __repr__(self):
@@ -0,0 +1,151 @@
+"""Storage interfaces behind the ``User``, ``Website`` and ``Role`` models.
+
+Models keep the domain logic (defaults, content encoding, permissions,
+paging) and hand rows to a repository, which only moves them in and out of
+a store. Rows come back as mappings keyed by column name. Website
+repositories also own the write transaction, so they record revisions as
+part of it.
+
+``REPOSITORY_BACKEND`` picks the implementation (see
+``src.repositories.registry``); routes only ever talk to the models.
+"""
+from collections import namedtuple
+import operator
+
+Repositories = namedtuple('Repositories', ['users', 'roles', 'websites'])
+
+# Website list filters: (key, column, operator). Missing or None values are
+# ignored; timestamps are ISO strings and the ranges are inclusive.
+WEBSITE_FILTERS = (
+    ('user_id', 'user_id', '='),
+    ('industry', 'industry', '='),
+    ('business_type', 'business_type', '='),
+    ('created_from', 'created_at', '>='),
+    ('created_to', 'created_at', '<='),
+    ('updated_from', 'updated_at', '>='),
+    ('updated_to', 'updated_at', '<='),
+)
+FILTER_OPERATORS = {'=': operator.eq, '>=': operator.ge, '<=': operator.le}
+
+# Columns of a search result row besides ``snippet`` and ``score``
+WEBSITE_SUMMARY_COLUMNS = ('id', 'title', 'user_id', 'business_type', 'industry', 'created_at', 'updated_at')
+
+
+def active_filters(filters):
+    """``[(column, operator, value)]`` for the filters that are set."""
+    return [(column, op, filters[key]) for key, column, op in WEBSITE_FILTERS
+            if filters.get(key) is not None]
+
+
+class UserRepository:
+    def get(self, user_id):
+        """Row of a user that is not being deleted, or None."""
+        raise NotImplementedError
+
+    def get_by_email(self, email):
+        """Row for ``email``, including users being deleted, or None."""
+        raise NotImplementedError
+
+    def list(self):
+        """Rows of every user that is not being deleted."""
+        raise NotImplementedError
+
+    def insert(self, values):
+        """Insert a user from a column dict; returns the new id."""
+        raise NotImplementedError
+
+    def update(self, user_id, values):
+        raise NotImplementedError
+
+    def delete(self, user_id):
+        raise NotImplementedError
+
+
+class RoleRepository:
+    def get(self, role_id):
+        raise NotImplementedError
+
+    def get_by_name(self, name):
+        raise NotImplementedError
+
+    def list(self):
+        raise NotImplementedError
+
+    def insert(self, values):
+        """Insert a role from a column dict; returns the new id."""
+        raise NotImplementedError
+
+    def update(self, role_id, values):
+        raise NotImplementedError
+
+    def delete(self, role_id):
+        raise NotImplementedError
+
+
+class WebsiteRepository:
+    """Website rows; ``filters`` are keyed like ``WEBSITE_FILTERS``."""
+
+    def get(self, website_id):
+        raise NotImplementedError
+
+    def list_by_user(self, user_id):
+        raise NotImplementedError
+
+    def list(self, filters, limit=None):
+        """Rows matching ``filters`` in id order, at most ``limit`` of them."""
+        raise NotImplementedError
+
+    def iterate(self, filters, batch_size):
+        """Yield rows matching ``filters`` in id order, reading ``batch_size`` at a time."""
+        raise NotImplementedError
+
+    def insert(self, website, values):
+        """Insert ``website`` from a column dict and record its first revision.
+
+        Returns the new id.
+        """
+        raise NotImplementedError
+
+    def update(self, website, values, load_previous_state):
+        """Write back an existing website and record the change as a revision.
+
+        Only writes if the stored version is still ``website.version``, and
+        bumps it. Returns False, with nothing written, when it is not.
+        """
+        raise NotImplementedError
+
+    def bulk_insert(self, items):
+        """Insert ``(website, values)`` pairs without revisions.
+
+        Sets ``id`` on each website once it is stored.
+        """
+        raise NotImplementedError
+
+    def clone(self, website_id, copies, values):
+        """Insert ``copies`` of the stored website ``website_id`` in one transaction, without revisions.
+
+        Each copy is a dict with an optional ``title`` and an optional
+        ``content`` dict whose sections replace the original's (``None``
+        removes one). ``values`` holds the columns every copy gets
+        (``user_id``, ``created_at``, ``updated_at``). Returns the new ids in
+        the order of ``copies``; empty if the website no longer exists.
+        """
+        raise NotImplementedError
+
+    def delete(self, website):
+        raise NotImplementedError
+
+    def facets(self, filters, columns):
+        """``[(facet, value, count)]`` over ``columns`` for the matching websites.
+
+        A value may appear in several rows; the counts add up.
+        """
+        raise NotImplementedError
+
+    def search(self, terms, user_id, limit):
+        """Up to ``limit`` best matches for all ``terms`` (the last one a prefix).
+
+        Rows carry ``WEBSITE_SUMMARY_COLUMNS`` plus a highlighted ``snippet``
+        and a ``score`` (higher is better), best first.
+        """
+        raise NotImplementedError
@@ -0,0 +1,223 @@
+"""In-memory repositories for tests and backend benchmarks.
+
+Rows live in process-local dicts and disappear with the process. Search is
+a plain substring scan with a title-weighted score. Revisions, archiving,
+statistics and background user deletion stay SQLite features: they read
+and write the database directly, which this backend never touches.
+"""
+import bisect
+import re
+import threading
+
+from src.models import content_codec
+from src.repositories.base import (Repositories, UserRepository, RoleRepository, WebsiteRepository,
+                                   WEBSITE_SUMMARY_COLUMNS, FILTER_OPERATORS, active_filters)
+
+
+def _key(row_id):
+    try:
+        return int(row_id)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Table:
+    def __init__(self):
+        self.rows = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def get(self, row_id):
+        row = self.rows.get(_key(row_id))
+        return dict(row) if row else None
+
+    def select(self, predicate=None):
+        with self.lock:
+            rows = [row for _, row in sorted(self.rows.items())]
+        return [dict(row) for row in rows if predicate is None or predicate(row)]
+
+    def page(self, after, limit, predicate=None):
+        """Up to ``limit`` matching rows with ids above ``after``, in id order."""
+        rows = []
+        with self.lock:
+            keys = sorted(self.rows)
+            for key in keys[bisect.bisect_right(keys, after):]:
+                row = self.rows[key]
+                if predicate is None or predicate(row):
+                    rows.append(dict(row))
+                    if len(rows) == limit:
+                        break
+        return rows
+
+    def insert(self, values):
+        with self.lock:
+            row_id = values.get('id') or self.next_id
+            self.next_id = max(self.next_id, row_id + 1)
+            self.rows[row_id] = dict(values, id=row_id)
+        return row_id
+
+    def update(self, row_id, values, version=None):
+        """Update a row; with ``version``, only if it matches, bumping it. Returns False otherwise."""
+        with self.lock:
+            row = self.rows.get(_key(row_id))
+            if row is None:
+                return version is None
+            if version is not None:
+                if row['version'] != version:
+                    return False
+                values = dict(values, version=version + 1)
+            row.update(values)
+            return True
+
+    def delete(self, row_id):
+        with self.lock:
+            self.rows.pop(_key(row_id), None)
+
+
+class MemoryUserRepository(UserRepository):
+    columns = ('email', 'username', 'password_hash', 'role', 'created_at', 'updated_at', 'deleted_at')
+
+    def __init__(self):
+        self.table = _Table()
+
+    def get(self, user_id):
+        row = self.table.get(user_id)
+        return row if row and row['deleted_at'] is None else None
+
+    def get_by_email(self, email):
+        rows = self.table.select(lambda row: row['email'] == email)
+        return rows[0] if rows else None
+
+    def list(self):
+        return self.table.select(lambda row: row['deleted_at'] is None)
+
+    def insert(self, values):
+        if self.get_by_email(values['email']):
+            raise ValueError("UNIQUE constraint failed: users.email")
+        return self.table.insert(dict(dict.fromkeys(self.columns), **values))
+
+    def update(self, user_id, values):
+        self.table.update(user_id, values)
+
+    def delete(self, user_id):
+        self.table.delete(user_id)
+
+
+class MemoryRoleRepository(RoleRepository):
+    def __init__(self):
+        self.table = _Table()
+
+    def get(self, role_id):
+        return self.table.get(role_id)
+
+    def get_by_name(self, name):
+        rows = self.table.select(lambda row: row['name'] == name)
+        return rows[0] if rows else None
+
+    def list(self):
+        return self.table.select()
+
+    def insert(self, values):
+        return self.table.insert(values)
+
+    def update(self, role_id, values):
+        self.table.update(role_id, values)
+
+    def delete(self, role_id):
+        self.table.delete(role_id)
+
+
+class MemoryWebsiteRepository(WebsiteRepository):
+    def __init__(self):
+        self.table = _Table()
+
+    @staticmethod
+    def _predicate(filters):
+        conditions = active_filters(filters)
+        if filters.get('user_id') is not None:
+            # Ids arrive as strings from the routes; SQLite compares them as integers
+            conditions = [(column, op, _key(value) if column == 'user_id' else value)
+                          for column, op, value in conditions]
+        return lambda row: all(row[column] is not None and FILTER_OPERATORS[op](row[column], value)
+                               for column, op, value in conditions)
+
+    def get(self, website_id):
+        return self.table.get(website_id)
+
+    def list_by_user(self, user_id):
+        return self.list({'user_id': user_id})
+
+    def list(self, filters, limit=None):
+        return self.table.select(self._predicate(filters))[:limit]
+
+    def iterate(self, filters, batch_size):
+        # Keyset pagination, like the SQL backends: rows added or removed
+        # while iterating are picked up or skipped by id
+        predicate = self._predicate(filters)
+        last_id = 0
+        while True:
+            batch = self.table.page(last_id, batch_size, predicate)
+            if not batch:
+                return
+            yield from batch
+            last_id = batch[-1]['id']
+
+    def insert(self, website, values):
+        website.id = self.table.insert(dict(values, archived_at=None, version=1))
+        return website.id
+
+    def update(self, website, values, load_previous_state):
+        return self.table.update(website.id, values, version=website.version)
+
+    def bulk_insert(self, items):
+        for website, values in items:
+            self.insert(website, values)
+
+    def clone(self, website_id, copies, values):
+        source = self.table.get(website_id)
+        if source is None or source['archived_at']:
+            return []
+        ids = []
+        for copy in copies:
+            content = source['content']
+            if copy.get('content') is not None:
+                merged = dict(content_codec.decode(content) or {})
+                merged.update(copy['content'])
+                content = content_codec.encode({key: value for key, value in merged.items() if value is not None})
+            ids.append(self.table.insert(dict(source, id=None, title=copy.get('title') or source['title'],
+                                              content=content, version=1, **values)))
+        return ids
+
+    def delete(self, website):
+        self.table.delete(website.id)
+
+    def facets(self, filters, columns):
+        counts = {}
+        for row in self.list(filters):
+            for column in columns:
+                if row[column] is not None:
+                    counts[column, row[column]] = counts.get((column, row[column]), 0) + 1
+        return [(facet, value, total) for (facet, value), total in counts.items()]
+
+    def search(self, terms, user_id, limit):
+        words = [term.lower() for term in terms]
+        filters = {'user_id': user_id} if user_id is not None else {}
+        results = []
+        for row in self.list(filters):
+            title = (row['title'] or '').lower()
+            text = f"{title} {(content_codec.decode_text(row['content']) or '').lower()}"
+            tokens = re.findall(r'\w+', text)
+            if not all(word in tokens for word in words[:-1]) or \
+                    not any(token.startswith(words[-1]) for token in tokens):
+                continue
+            score = sum(text.count(word) + 2 * title.count(word) for word in words)
+            result = {column: row[column] for column in WEBSITE_SUMMARY_COLUMNS}
+            result.update(snippet=row['title'], score=float(score))
+            results.append(result)
+        results.sort(key=lambda result: (-result['score'], result['id']))
+        return results[:limit]
+
+
+def repositories():
+    return Repositories(users=MemoryUserRepository(), roles=MemoryRoleRepository(),
+                        websites=MemoryWebsiteRepository())
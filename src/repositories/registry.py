@@ -0,0 +1,49 @@
+"""Select the repository backend.
+
+``REPOSITORY_BACKEND`` is one of:
+
+- ``sqlite`` (default): raw sqlite3 on the shared connection, with sharding
+- ``sqlalchemy``: SQLAlchemy Core on a pooled engine over the same database
+- ``memory``: process-local dicts, for tests and benchmarks
+"""
+import importlib
+import os
+import threading
+
+BACKENDS = {
+    'sqlite': 'src.repositories.sqlite',
+    'sqlalchemy': 'src.repositories.sqlalchemy_core',
+    'memory': 'src.repositories.memory',
+}
+
+_repositories = None
+_lock = threading.Lock()
+
+
+def backend():
+    name = os.getenv('REPOSITORY_BACKEND', 'sqlite').lower()
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown REPOSITORY_BACKEND {name!r}; expected one of {", ".join(BACKENDS)}')
+    return name
+
+
+def repositories():
+    """The configured ``Repositories``, created on first use."""
+    global _repositories
+    if _repositories is None:
+        with _lock:
+            if _repositories is None:
+                _repositories = importlib.import_module(BACKENDS[backend()]).repositories()
+    return _repositories
+
+
+def use_backend(name):
+    """Switch backends at runtime, e.g. between benchmark runs; returns the new repositories.
+
+    A fresh in-memory backend starts out empty.
+    """
+    global _repositories
+    with _lock:
+        os.environ['REPOSITORY_BACKEND'] = name
+        _repositories = importlib.import_module(BACKENDS[backend()]).repositories()
+    return _repositories
@@ -0,0 +1,233 @@
+"""SQLAlchemy Core repositories on a pooled engine.
+
+Requests check a connection out of a ``QueuePool`` instead of sharing the
+single module-level connection, so concurrent requests no longer serialise
+on it. Connections are opened with ``Database.connect`` (same pragmas and
+SQL functions as the rest of the app) and stay open in the pool, so both
+SQLAlchemy's compiled statement cache and the driver's prepared statement
+cache stay warm between requests.
+
+Settings: ``REPOSITORY_POOL_SIZE`` (default 5), ``REPOSITORY_POOL_OVERFLOW``
+(default 10), ``REPOSITORY_POOL_TIMEOUT`` seconds (default 30) and
+``REPOSITORY_STATEMENT_CACHE`` statements per connection and per engine
+(default 500). Works on the main database only, not with ``WEBSITE_SHARDS``.
+"""
+import os
+
+try:
+    from sqlalchemy import (Column, Integer, MetaData, Table, bindparam, create_engine, delete, func,
+                            insert, select, text, update)
+    from sqlalchemy.pool import QueuePool
+except ImportError as e:
+    raise RuntimeError('REPOSITORY_BACKEND=sqlalchemy needs SQLAlchemy: pip install SQLAlchemy') from e
+
+from src.models.database import db_instance
+from src.models import shards
+from src.models.revision import WebsiteRevision
+from src.repositories.base import (Repositories, UserRepository, RoleRepository, WebsiteRepository,
+                                   FILTER_OPERATORS, active_filters)
+from src.repositories.sqlite import (CLONE_FROM_TABLE, CLONE_SQL, SEARCH_SQL, clone_params, fts_match,
+                                     search_result)
+
+# The schema is owned by Database; these tables only describe it for
+# queries, so columns are untyped and values pass through as stored.
+metadata = MetaData()
+
+users = Table(
+    'users', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('email'), Column('username'), Column('password_hash'), Column('role'),
+    Column('created_at'), Column('updated_at'), Column('deleted_at'),
+)
+
+roles = Table(
+    'roles', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name'), Column('permissions'), Column('created_at'), Column('updated_at'),
+)
+
+websites = Table(
+    'websites', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('title'), Column('content'), Column('user_id'), Column('business_type'), Column('industry'),
+    Column('created_at'), Column('updated_at'), Column('archived_at'), Column('version', Integer),
+)
+
+website_facet_counts = Table(
+    'website_facet_counts', metadata,
+    Column('owner_id'), Column('facet'), Column('value'), Column('count'),
+)
+
+_search = text(SEARCH_SQL)
+_clone = text(CLONE_SQL.format(source=CLONE_FROM_TABLE))
+
+
+def create_pooled_engine():
+    statement_cache = int(os.getenv('REPOSITORY_STATEMENT_CACHE', 500))
+    return create_engine(
+        'sqlite://',
+        creator=lambda: db_instance.connect(cached_statements=statement_cache),
+        poolclass=QueuePool,
+        pool_size=int(os.getenv('REPOSITORY_POOL_SIZE', 5)),
+        max_overflow=int(os.getenv('REPOSITORY_POOL_OVERFLOW', 10)),
+        pool_timeout=float(os.getenv('REPOSITORY_POOL_TIMEOUT', 30)),
+        query_cache_size=statement_cache,
+    )
+
+
+def _where(table, filters):
+    return [FILTER_OPERATORS[op](table.c[column], value) for column, op, value in active_filters(filters)]
+
+
+class _TableRepository:
+    table = None
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _one(self, *conditions):
+        with self.engine.connect() as connection:
+            return connection.execute(select(self.table).where(*conditions)).mappings().first()
+
+    def _all(self, *conditions):
+        with self.engine.connect() as connection:
+            return connection.execute(select(self.table).where(*conditions)).mappings().all()
+
+    def insert(self, values):
+        with self.engine.begin() as connection:
+            return connection.execute(insert(self.table), values).inserted_primary_key[0]
+
+    def update(self, row_id, values):
+        with self.engine.begin() as connection:
+            connection.execute(update(self.table).where(self.table.c.id == row_id), values)
+
+    def delete(self, row_id):
+        with self.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.id == row_id))
+
+
+class SqlAlchemyUserRepository(_TableRepository, UserRepository):
+    table = users
+
+    def get(self, user_id):
+        return self._one(users.c.id == user_id, users.c.deleted_at.is_(None))
+
+    def get_by_email(self, email):
+        return self._one(users.c.email == email)
+
+    def list(self):
+        return self._all(users.c.deleted_at.is_(None))
+
+
+class SqlAlchemyRoleRepository(_TableRepository, RoleRepository):
+    table = roles
+
+    def get(self, role_id):
+        return self._one(roles.c.id == role_id)
+
+    def get_by_name(self, name):
+        return self._one(roles.c.name == name)
+
+    def list(self):
+        return self._all()
+
+
+class SqlAlchemyWebsiteRepository(_TableRepository, WebsiteRepository):
+    table = websites
+
+    def get(self, website_id):
+        return self._one(websites.c.id == website_id)
+
+    def list_by_user(self, user_id):
+        return self._all(websites.c.user_id == user_id)
+
+    def list(self, filters, limit=None):
+        query = select(websites).where(*_where(websites, filters)).order_by(websites.c.id)
+        if limit is not None:
+            query = query.limit(limit)
+        with self.engine.connect() as connection:
+            return connection.execute(query).mappings().all()
+
+    def iterate(self, filters, batch_size):
+        # Keyset pagination; the connection goes back to the pool between batches
+        query = (select(websites).where(*_where(websites, filters), websites.c.id > bindparam('last_id'))
+                 .order_by(websites.c.id).limit(batch_size))
+        last_id = 0
+        while True:
+            with self.engine.connect() as connection:
+                batch = connection.execute(query, {'last_id': last_id}).mappings().all()
+            if not batch:
+                return
+            yield from batch
+            last_id = batch[-1]['id']
+
+    def insert(self, website, values):
+        with self.engine.begin() as connection:
+            website.id = connection.execute(insert(websites), values).inserted_primary_key[0]
+            # Revisions are written by the sqlite3 connection underneath,
+            # inside the same transaction
+            WebsiteRevision.record(website, connection=connection.connection.driver_connection, version=1)
+        return website.id
+
+    def update(self, website, values, load_previous_state):
+        with self.engine.begin() as connection:
+            driver_connection = connection.connection.driver_connection
+            previous_state = WebsiteRevision.seed_state(website.id, load_previous_state, driver_connection)
+            # Check and bump the version in the same statement as the write,
+            # as the sqlite backend does
+            claimed = connection.execute(
+                update(websites).where(websites.c.id == website.id, websites.c.version == website.version)
+                .values(dict(values, version=websites.c.version + 1))).rowcount
+            if not claimed:
+                return False
+            WebsiteRevision.record(website, load_previous_state=lambda: previous_state,
+                                   connection=driver_connection, version=website.version + 1)
+        return True
+
+    def bulk_insert(self, items):
+        with self.engine.begin() as connection:
+            inserted_ids = [connection.execute(insert(websites), values).inserted_primary_key[0]
+                            for _, values in items]
+        for (website, _), website_id in zip(items, inserted_ids):
+            website.id = website_id
+
+    def clone(self, website_id, copies, values):
+        with self.engine.begin() as connection:
+            rows = connection.execute(_clone, dict(clone_params(copies, values), website_id=website_id))
+            return [row[0] for row in rows]
+
+    def delete(self, website):
+        super().delete(website.id)
+
+    def facets(self, filters, columns):
+        with self.engine.connect() as connection:
+            if all(value is None for key, value in filters.items() if key != 'user_id'):
+                # Unfiltered and owner-only counts are maintained by triggers
+                rows = connection.execute(
+                    select(website_facet_counts.c.facet, website_facet_counts.c.value,
+                           website_facet_counts.c['count'])
+                    .where(website_facet_counts.c.owner_id == (filters.get('user_id') or 0),
+                           website_facet_counts.c['count'] > 0))
+                return [tuple(row) for row in rows]
+            results = []
+            for column in columns:
+                value = websites.c[column]
+                rows = connection.execute(
+                    select(value, func.count())
+                    .where(*_where(websites, filters), value.is_not(None))
+                    .group_by(value))
+                results.extend((column, row[0], row[1]) for row in rows)
+            return results
+
+    def search(self, terms, user_id, limit):
+        with self.engine.connect() as connection:
+            rows = connection.execute(_search, {'match': fts_match(terms, user_id), 'limit': limit}).mappings()
+            return [search_result(row) for row in rows]
+
+
+def repositories():
+    if shards.is_sharded():
+        raise RuntimeError('REPOSITORY_BACKEND=sqlalchemy does not support WEBSITE_SHARDS > 1')
+    engine = create_pooled_engine()
+    return Repositories(users=SqlAlchemyUserRepository(engine), roles=SqlAlchemyRoleRepository(engine),
+                        websites=SqlAlchemyWebsiteRepository(engine))
@@ -0,0 +1,337 @@
+"""Raw sqlite3 repositories on the shared connection, sharding aware."""
+from itertools import islice
+import heapq
+
+from src.models.database import db, SEARCH_SECTIONS
+from src.models import content_codec, shards
+from src.models.revision import WebsiteRevision
+from src.services import json_codec
+from src.repositories.base import (Repositories, UserRepository, RoleRepository, WebsiteRepository,
+                                   WEBSITE_SUMMARY_COLUMNS, active_filters)
+
+
+def filter_clause(filters, *extra):
+    """WHERE clause and parameters for website list filters.
+
+    ``extra`` conditions are ``(sql, value)`` pairs added to the filters.
+    """
+    conditions = [(f'{column} {op} ?', value) for column, op, value in active_filters(filters)]
+    conditions.extend(extra)
+    if not conditions:
+        return '', []
+    return ' WHERE ' + ' AND '.join(sql for sql, _ in conditions), [value for _, value in conditions]
+
+
+def fts_match(terms, user_id=None):
+    """FTS5 query matching every term in the title and searchable sections."""
+    # Quote every term so user input can never be parsed as FTS syntax;
+    # the last term is a prefix match to support search-as-you-type.
+    phrase = ' '.join(f'"{term}"' for term in terms) + '*'
+    match = '{title ' + ' '.join(SEARCH_SECTIONS) + '} : (' + phrase + ')'
+    if user_id is not None:
+        match += f' AND owner : u{int(user_id)}'
+    return match
+
+
+SEARCH_SQL = '''
+    SELECT w.id, w.title, w.user_id, w.business_type, w.industry, w.created_at, w.updated_at,
+           snippet(websites_fts, -1, '<mark>', '</mark>', '…', 16) AS snippet,
+           -bm25(websites_fts, 10.0, 4.0, 2.0, 2.0, 1.0, 0.0) AS score
+    FROM websites_fts
+    JOIN websites w ON w.id = websites_fts.rowid
+    WHERE websites_fts MATCH :match
+    ORDER BY score DESC
+    LIMIT :limit
+'''
+
+
+# One row per entry of the ``:copies`` JSON array, in array order. Copies
+# without content overrides keep the stored encoding as is; the others get
+# the original with the overridden sections cleared and then patched in,
+# re-encoded by ``content_encode``. ``{source}`` is the row to copy.
+CLONE_SQL = '''
+    WITH copies AS (SELECT key AS position, value AS spec FROM json_each(:copies))
+    INSERT INTO websites (id, title, content, user_id, business_type, industry, created_at, updated_at)
+    SELECT json_extract(spec, '$.id'),
+           COALESCE(json_extract(spec, '$.title'), source.title),
+           CASE WHEN json_type(spec, '$.content') = 'object'
+                THEN content_encode(json_patch(json_patch(COALESCE(content_json(source.content), '{{}}'),
+                                                          json_extract(spec, '$.clear')),
+                                               json_extract(spec, '$.content')))
+                ELSE source.content END,
+           :user_id, source.business_type, source.industry, :created_at, :updated_at
+    FROM {source} AS source, copies
+    ORDER BY position
+    RETURNING id
+'''
+CLONE_FROM_TABLE = '(SELECT * FROM websites WHERE id = :website_id AND archived_at IS NULL)'
+CLONE_FROM_VALUES = ('(SELECT :title AS title, :content AS content, '
+                     ':business_type AS business_type, :industry AS industry)')
+
+
+def clone_params(copies, values, ids=None):
+    """Parameters of ``CLONE_SQL`` for ``copies`` (see ``WebsiteRepository.clone``)."""
+    specs = []
+    for copy, website_id in zip(copies, ids or [None] * len(copies)):
+        content = copy.get('content')
+        specs.append({'id': website_id, 'title': copy.get('title'), 'content': content,
+                      'clear': dict.fromkeys(content) if content is not None else None})
+    return dict(values, copies=json_codec.dumps(specs))
+
+
+def search_result(row):
+    result = {column: row[column] for column in WEBSITE_SUMMARY_COLUMNS}
+    result['snippet'] = row['snippet']
+    if result['snippet'] == f"<mark>u{row['user_id']}</mark>":
+        # Only the ownership filter matched in the best column
+        result['snippet'] = row['title']
+    result['score'] = row['score']
+    return result
+
+
+class SqliteUserRepository(UserRepository):
+    def get(self, user_id):
+        return db.execute('SELECT * FROM users WHERE id = ? AND deleted_at IS NULL', (user_id,)).fetchone()
+
+    def get_by_email(self, email):
+        return db.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
+
+    def list(self):
+        return db.execute('SELECT * FROM users WHERE deleted_at IS NULL').fetchall()
+
+    def insert(self, values):
+        return _insert(db, 'users', values)
+
+    def update(self, user_id, values):
+        _update(db, 'users', user_id, values)
+
+    def delete(self, user_id):
+        _delete(db, 'users', user_id)
+
+
+class SqliteRoleRepository(RoleRepository):
+    def get(self, role_id):
+        return db.execute('SELECT * FROM roles WHERE id = ?', (role_id,)).fetchone()
+
+    def get_by_name(self, name):
+        return db.execute('SELECT * FROM roles WHERE name = ?', (name,)).fetchone()
+
+    def list(self):
+        return db.execute('SELECT * FROM roles').fetchall()
+
+    def insert(self, values):
+        return _insert(db, 'roles', values)
+
+    def update(self, role_id, values):
+        _update(db, 'roles', role_id, values)
+
+    def delete(self, role_id):
+        _delete(db, 'roles', role_id)
+
+
+class SqliteWebsiteRepository(WebsiteRepository):
+    """Websites on their owner's shard (the main database when unsharded)."""
+
+    @staticmethod
+    def _shards_for(filters):
+        """Connections that can hold matches: the owner's shard, or all of them."""
+        if filters.get('user_id') is not None:
+            return [shards.for_user(filters['user_id'])]
+        return shards.connections()
+
+    def get(self, website_id):
+        return shards.for_website(website_id).execute('SELECT * FROM websites WHERE id = ?',
+                                                      (website_id,)).fetchone()
+
+    def list_by_user(self, user_id):
+        return shards.for_user(user_id).execute('SELECT * FROM websites WHERE user_id = ?', (user_id,)).fetchall()
+
+    def list(self, filters, limit=None):
+        where, params = filter_clause(filters)
+        sql = f'SELECT * FROM websites{where} ORDER BY id'
+        if limit is not None:
+            # Each shard reads its matches only up to the limit
+            sql += ' LIMIT ?'
+            params = params + [limit]
+        results = shards.fan_out(lambda connection: connection.execute(sql, params).fetchall(),
+                                 self._shards_for(filters))
+        return list(islice(heapq.merge(*results, key=lambda row: row['id']), limit))
+
+    def iterate(self, filters, batch_size):
+        # Keyset pagination: no read transaction stays open between batches.
+        # Shards are paged side by side and merged by id.
+        def rows(connection):
+            cursor = connection.cursor()
+            last_id = 0
+            while True:
+                where, params = filter_clause(filters, ('id > ?', last_id))
+                cursor.execute(f'SELECT * FROM websites{where} ORDER BY id LIMIT ?', params + [batch_size])
+                batch = cursor.fetchall()
+                if not batch:
+                    return
+                yield from batch
+                last_id = batch[-1]['id']
+
+        return heapq.merge(*map(rows, self._shards_for(filters)), key=lambda row: row['id'])
+
+    def insert(self, website, values):
+        shard = shards.shard_for(values['user_id'])
+        connection = shards.connection(shard)
+        website_id, = shards.allocate_ids(1)
+        with connection.lock:
+            try:
+                website.id = _insert(connection, 'websites', dict(values, id=website_id), commit=False)
+                WebsiteRevision.record(website, connection=connection, version=1)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        shards.remember(website.id, shard)
+        return website.id
+
+    def update(self, website, values, load_previous_state):
+        shard = shards.shard_for(website.user_id)
+        connection = shards.connection(shard)
+        assignments = ', '.join(f'{column}=?' for column in values)
+        with connection.lock:
+            previous_state = WebsiteRevision.seed_state(website.id, load_previous_state, connection)
+            try:
+                # Check and bump the version in the same statement as the write,
+                # so it holds across connections and processes
+                claimed = connection.execute(
+                    f'UPDATE websites SET {assignments}, version = version + 1 WHERE id = ? AND version = ?',
+                    (*values.values(), website.id, website.version)).rowcount
+                if not claimed:
+                    # Nothing was written; only end the transaction the UPDATE opened
+                    connection.commit()
+                    return False
+                WebsiteRevision.record(website, load_previous_state=lambda: previous_state, connection=connection,
+                                       version=website.version + 1)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        shards.remember(website.id, shard)
+        return True
+
+    def bulk_insert(self, items):
+        # One transaction per shard
+        by_shard = {}
+        for item, website_id in zip(items, shards.allocate_ids(len(items))):
+            by_shard.setdefault(shards.shard_for(item[1]['user_id']), []).append((item, website_id))
+
+        for shard, batch in by_shard.items():
+            connection = shards.connection(shard)
+            with connection.lock:
+                try:
+                    inserted_ids = [_insert(connection, 'websites', dict(values, id=website_id), commit=False)
+                                    for (_, values), website_id in batch]
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+            # Ids are only set once committed, so callers can tell which
+            # websites made it when a later shard fails
+            for ((website, _), _), website_id in zip(batch, inserted_ids):
+                website.id = website_id
+                shards.remember(website_id, shard)
+
+    def clone(self, website_id, copies, values):
+        shard = shards.shard_for(values['user_id'])
+        connection = shards.connection(shard)
+        params = clone_params(copies, values, shards.allocate_ids(len(copies)))
+        if shards.locate(website_id) == shard:
+            # Copied straight from the stored row, inside the insert
+            sql = CLONE_SQL.format(source=CLONE_FROM_TABLE)
+            params['website_id'] = website_id
+        else:
+            # Copies for a user on another shard: bind the row instead
+            row = self.get(website_id)
+            if row is None or row['archived_at']:
+                return []
+            content = row['content']
+            if shard != 0 and content_codec.is_manifest(content):
+                # The section store only exists in the main database
+                content = content_codec.encode(content_codec.decode(content), dedup=False)
+            sql = CLONE_SQL.format(source=CLONE_FROM_VALUES)
+            params.update(title=row['title'], content=content, business_type=row['business_type'],
+                          industry=row['industry'])
+        with connection.lock:
+            try:
+                ids = [row[0] for row in connection.execute(sql, params).fetchall()]
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        for website_id in ids:
+            shards.remember(website_id, shard)
+        return ids
+
+    def delete(self, website):
+        _delete(shards.for_user(website.user_id), 'websites', website.id)
+        shards.forget(website.id)
+
+    def facets(self, filters, columns):
+        # Unfiltered (or owner-only) requests read the incrementally
+        # maintained counts table; any other filter falls back to an indexed
+        # GROUP BY over the matching rows.
+        owner_only = all(value is None for key, value in filters.items() if key != 'user_id')
+        where, params = filter_clause(filters)
+
+        def count(connection):
+            cursor = connection.cursor()
+            if owner_only:
+                cursor.execute('''
+                    SELECT facet, value, count FROM website_facet_counts
+                    WHERE owner_id = ? AND count > 0
+                ''', (filters.get('user_id') or 0,))
+                return cursor.fetchall()
+            rows = []
+            for column in columns:
+                cursor.execute(f'''
+                    SELECT '{column}' AS facet, {column} AS value, COUNT(*) AS count FROM websites{where}
+                    {'AND' if where else 'WHERE'} {column} IS NOT NULL
+                    GROUP BY {column}
+                ''', params)
+                rows.extend(cursor.fetchall())
+            return rows
+
+        return [tuple(row) for rows in shards.fan_out(count, self._shards_for(filters)) for row in rows]
+
+    def search(self, terms, user_id, limit):
+        # bm25 weighs terms by their frequency on each shard, which evens
+        # out once shards hold many users
+        params = {'match': fts_match(terms, user_id), 'limit': limit}
+        results = shards.fan_out(lambda connection: connection.execute(SEARCH_SQL, params).fetchall(),
+                                 self._shards_for({'user_id': user_id}))
+        rows = islice(heapq.merge(*results, key=lambda row: -row['score']), limit)
+        return [search_result(row) for row in rows]
+
+
+def repositories():
+    return Repositories(users=SqliteUserRepository(), roles=SqliteRoleRepository(),
+                        websites=SqliteWebsiteRepository())
+
+
+def _insert(connection, table, values, commit=True):
+    columns = ', '.join(values)
+    placeholders = ', '.join('?' * len(values))
+    with connection.lock:
+        cursor = connection.execute(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', tuple(values.values()))
+        if commit:
+            connection.commit()
+        return cursor.lastrowid
+
+
+def _update(connection, table, row_id, values, commit=True):
+    assignments = ', '.join(f'{column}=?' for column in values)
+    with connection.lock:
+        connection.execute(f'UPDATE {table} SET {assignments} WHERE id=?', (*values.values(), row_id))
+        if commit:
+            connection.commit()
+
+
+def _delete(connection, table, row_id):
+    with connection.lock:
+        connection.execute(f'DELETE FROM {table} WHERE id = ?', (row_id,))
+        connection.commit()
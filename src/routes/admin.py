@@ -0,0 +1,135 @@
+from flask import Blueprint, request, jsonify
+import click
+from src.models.stats import Stats
+from src.models.website import Website
+from src.models.archive import WebsiteArchive
+from src.models import shards
+from src.services.load_shedding import all_metrics
+from src.services.autosave import autosave_buffer
+from src.services.shared_cache import shared_cache
+from src.services.template_registry import template_registry
+from src.services.maintenance import maintenance_scheduler, RUNNERS
+from src.routes.user import admin_required
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/stats', methods=['GET'])
+@admin_required
+def get_stats():
+    try:
+        try:
+            days = min(366, max(1, int(request.args.get('days', 30))))
+            top = min(100, max(1, int(request.args.get('top', 10))))
+        except ValueError:
+            return jsonify({'error': 'days and top must be integers'}), 400
+
+        return jsonify({'stats': Stats.overview(days=days, top=top)}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    try:
+        return jsonify({'concurrency': all_metrics(), 'autosave': autosave_buffer.metrics(),
+                        'shared_cache': shared_cache.metrics(), 'templates': template_registry.metrics()}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/templates/reload', methods=['POST'])
+@admin_required
+def reload_templates():
+    try:
+        try:
+            template_registry.reload()
+        except ValueError as e:
+            return jsonify({'error': str(e), 'templates': template_registry.metrics()}), 400
+
+        return jsonify({'message': 'Templates reloaded', 'templates': template_registry.metrics()}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/maintenance', methods=['GET'])
+@admin_required
+def get_maintenance():
+    try:
+        return jsonify({'maintenance': maintenance_scheduler.status()}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the admin statistics tables from users and websites."""
+    stats = Stats.rebuild()
+    click.echo(f"Rebuilt stats: {stats['total_users']} users, {stats['total_websites']} websites")
+
+@admin_bp.cli.command('compress-content')
+@click.option('--batch-size', default=500, show_default=True, help='Rows rewritten per transaction.')
+@click.option('--train-dictionary', is_flag=True, help='Train a shared compression dictionary first.')
+@click.option('--sample-size', default=2000, show_default=True, help='Websites sampled for training.')
+@click.option('--recompress', is_flag=True, help='Also re-encode rows compressed with an older dictionary.')
+def compress_content_command(batch_size, train_dictionary, sample_size, recompress):
+    """Compress website content in place while the app keeps running."""
+    if train_dictionary:
+        dictionary_id = Website.train_content_dictionary(sample_size)
+        if dictionary_id:
+            click.echo(f'Trained content dictionary {dictionary_id}')
+        else:
+            click.echo('Not enough repeated content to train a dictionary')
+
+    rewritten = Website.compress_stored_content(
+        batch_size=batch_size,
+        recompress=recompress,
+        progress=lambda last_id, count: click.echo(f'  up to id {last_id}: {count} rows rewritten')
+    )
+    click.echo(f'Compressed {rewritten} websites')
+
+@admin_bp.cli.command('archive-websites')
+@click.option('--days', type=int, default=None, help='Inactivity threshold (default: ARCHIVE_AFTER_DAYS or 180).')
+@click.option('--batch-size', default=200, show_default=True, help='Websites moved per transaction.')
+def archive_websites_command(days, batch_size):
+    """Move websites not updated for a long time to the archive database."""
+    archived = WebsiteArchive.archive_inactive(
+        days=days,
+        batch_size=batch_size,
+        progress=lambda last_id, count: click.echo(f'  up to id {last_id}: {count} archived')
+    )
+    click.echo(f'Archived {archived} websites')
+
+@admin_bp.cli.command('reshard')
+@click.option('--shards', 'count', type=click.IntRange(min=1), required=True, help='New number of website shards.')
+@click.option('--batch-size', default=200, show_default=True, help='Websites scanned per batch.')
+def reshard_command(count, batch_size):
+    """Move websites to the shards that a new WEBSITE_SHARDS value assigns.
+
+    Stop the app first and restart it with WEBSITE_SHARDS set to the new
+    count once this finishes; an interrupted run can be started again.
+    """
+    moved = shards.rebalance(
+        count,
+        batch_size=batch_size,
+        progress=lambda shard, last_id, moved: click.echo(f'  shard {shard} up to id {last_id}: {moved} moved')
+    )
+    click.echo(f'Moved {moved} websites; now start the app with WEBSITE_SHARDS={count}')
+
+@admin_bp.cli.command('maintenance')
+@click.argument('tasks', nargs=-1, type=click.Choice(sorted(RUNNERS)))
+def maintenance_command(tasks):
+    """Run database maintenance tasks now on every database (default: all scheduled tasks).
+
+    "vacuum" rebuilds the file and enables incremental vacuum on databases
+    created before it was the default; it blocks writers while it runs.
+    """
+    connection = maintenance_scheduler.connect()
+    try:
+        for database in maintenance_scheduler.databases():
+            for name in tasks or [name for name in RUNNERS if name != 'vacuum']:
+                result = maintenance_scheduler.run_task(connection, name, database)
+                detail = f" - {result['detail']}" if result['detail'] else ''
+                click.echo(f"{database} {name}: {result['status']} in {result['duration_ms']} ms{detail}")
+    finally:
+        connection.close()
@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import User
-from src.models.website import Website
+from src.models.website import Website, VersionConflict
+from src.models.aio import AsyncUser, AsyncWebsite
+from src.services.rate_limiter import rate_limit
+from src.services.load_shedding import limit_concurrency
+from src.services.validation import parse_body
+from src.services.template_registry import template_registry
+import asyncio
 import json
 import os
 
@@ -22,7 +28,8 @@ def check_permission(permission):
             
             # Admin has all permissions
             if user.role == 'admin':
-                return f(*args, **kwargs)
+                # ensure_sync runs async views to completion as well
+                return current_app.ensure_sync(f)(*args, **kwargs)
             
             # Check specific permissions based on role
             role_permissions = {
@@ -33,44 +40,29 @@ def check_permission(permission):
             if permission not in role_permissions.get(user.role, []):
                 return jsonify({'error': 'Insufficient permissions'}), 403
             
-            return f(*args, **kwargs)
+            return current_app.ensure_sync(f)(*args, **kwargs)
         return decorated_function
     return decorator
 
 @ai_bp.route('/generate', methods=['POST'])
+@rate_limit('generate')
+@limit_concurrency('ai')
 @check_permission('create_website')
-def generate_website():
+async def generate_website():
     try:
         current_user_id = get_jwt_identity()
-        data = request.get_json()
+        data, error = parse_body('generate')
+        if error:
+            return error
         
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        business_type = data.get('business_type')
-        industry = data.get('industry')
+        business_type = data['business_type']
+        industry = data['industry']
         company_name = data.get('company_name', 'Your Company')
         additional_info = data.get('additional_info', '')
         
-        if not business_type or not industry:
-            return jsonify({'error': 'Business type and industry are required'}), 400
-        
         # Generate content using template-based approach (fallback for deployment)
-        content = {
-            "title": f"{company_name} - Professional {business_type}",
-            "hero": f"Welcome to {company_name}, your trusted partner in {industry}. We provide exceptional {business_type.lower()} services tailored to your needs.",
-            "about": f"At {company_name}, we are a leading {business_type.lower()} specializing in {industry.lower()} solutions. Our experienced team is dedicated to delivering innovative services that drive success for our clients.",
-            "services": f"We offer comprehensive {industry.lower()} services including consultation, strategy development, implementation, and ongoing support. Our expertise in {business_type.lower()} ensures that we deliver results that exceed expectations.",
-            "contact": f"Ready to get started? Contact {company_name} today to learn more about how our {industry.lower()} expertise can benefit your business. We're here to help you succeed."
-        }
-        
-        # Add additional customization based on business type
-        if 'restaurant' in business_type.lower() or 'food' in business_type.lower():
-            content["services"] = f"We offer delicious {industry.lower()} cuisine with fresh ingredients and exceptional service. Our menu features carefully crafted dishes that celebrate the flavors of {industry.lower()} cooking."
-        elif 'tech' in business_type.lower() or 'software' in business_type.lower():
-            content["services"] = f"We provide cutting-edge {industry.lower()} technology solutions including software development, system integration, and digital transformation services."
-        elif 'consulting' in business_type.lower():
-            content["services"] = f"Our expert consultants provide strategic guidance and practical solutions in {industry.lower()}. We help businesses optimize operations and achieve their goals."
+        content = template_registry.generate(business_type, industry, company_name, additional_info,
+                                             seed=data.get('seed'))
         
         # Create and save the website
         website = Website(
@@ -80,7 +72,7 @@ def generate_website():
             business_type=business_type,
             industry=industry
         )
-        website.save()
+        await AsyncWebsite.save(website)
         
         return jsonify({
             'message': 'Website generated successfully',
@@ -92,14 +84,18 @@ def generate_website():
         return jsonify({'error': str(e)}), 500
 
 @ai_bp.route('/regenerate/<website_id>', methods=['POST'])
+@rate_limit('generate')
+@limit_concurrency('ai')
 @check_permission('update_website')
-def regenerate_content(website_id):
+async def regenerate_content(website_id):
     try:
         current_user_id = get_jwt_identity()
-        user = User.find_by_id(current_user_id)
-        data = request.get_json() or {}
+        data, error = parse_body('regenerate', required=False)
+        if error:
+            return error
         
-        website = Website.find_by_id(website_id)
+        user, website = await asyncio.gather(AsyncUser.find_by_id(current_user_id),
+                                             AsyncWebsite.find_by_id(website_id))
         if not website:
             return jsonify({'error': 'Website not found'}), 404
         
@@ -114,29 +110,39 @@ def regenerate_content(website_id):
         industry = website.industry or 'general'
         company_name = website.title.split(' - ')[0] if ' - ' in website.title else 'Your Company'
         
+        # A new variant per save unless a seed is given, never the text already there
+        seed = data.get('seed')
+        if seed is None:
+            seed = website.version
+        current = website.content if isinstance(website.content, dict) else {}
+        
+        changed = False
         if section == 'all':
             # Generate alternative full content
-            new_content = {
-                "title": f"{company_name} - Leading {business_type} Solutions",
-                "hero": f"Discover excellence with {company_name}. We're your premier {business_type.lower()} provider in the {industry.lower()} sector, committed to delivering outstanding results.",
-                "about": f"{company_name} stands at the forefront of {industry.lower()} innovation. As a trusted {business_type.lower()}, we combine expertise with passion to serve our clients with distinction.",
-                "services": f"Our comprehensive {industry.lower()} services are designed to meet your unique needs. From initial consultation to final delivery, we ensure quality and satisfaction in every project.",
-                "contact": f"Connect with {company_name} and experience the difference. Let us show you how our {industry.lower()} expertise can transform your business."
-            }
+            new_content = {}
+            for name in template_registry.sections():
+                current_text = website.title if name == 'title' else current.get(name)
+                new_content[name] = template_registry.regenerate(name, current_text, business_type, industry,
+                                                                 company_name, seed)
+            changed = new_content != current or new_content['title'] != website.title
             website.content = new_content
             website.title = new_content['title']
-        else:
+        elif section != 'title':
             # Generate alternative content for specific section
-            alternatives = {
-                'hero': f"Experience the difference with {company_name}. Our {business_type.lower()} expertise in {industry.lower()} delivers exceptional value and results.",
-                'about': f"With years of experience in {industry.lower()}, {company_name} has established itself as a premier {business_type.lower()} known for quality and reliability.",
-                'services': f"We specialize in {industry.lower()} solutions that drive growth and success. Our {business_type.lower()} services are tailored to exceed your expectations.",
-                'contact': f"Take the next step with {company_name}. Contact us today to discover how our {industry.lower()} services can benefit you."
-            }
-            if section in alternatives:
-                website.content[section] = alternatives[section]
+            text = template_registry.regenerate(section, current.get(section), business_type, industry,
+                                                company_name, seed)
+            if text is not None and text != current.get(section):
+                website.content[section] = text
+                changed = True
+        
+        # Nothing new to offer: no save, so no new version or revision
+        if not changed:
+            return jsonify({
+                'message': 'No other content variation available',
+                'website': website.to_dict()
+            }), 200
         
-        website.save()
+        await AsyncWebsite.save(website)
         
         return jsonify({
             'message': f'Content regenerated successfully',
@@ -144,6 +150,8 @@ def regenerate_content(website_id):
             'note': 'Content regenerated using template variations. For AI-powered generation, configure OpenAI API key.'
         }), 200
         
+    except VersionConflict as e:
+        return jsonify({'error': str(e), 'current_version': e.current_version}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
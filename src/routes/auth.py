@@ -1,47 +1,31 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from src.models.user import User
-import re
+from src.services.rate_limiter import rate_limit
+from src.services.validation import parse_body
 
 auth_bp = Blueprint('auth', __name__)
 
-def validate_email(email):
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
 @auth_bp.route('/signup', methods=['POST'])
+@rate_limit('signup')
 def signup():
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
+        data, error = parse_body('signup')
+        if error:
+            return error
         
-        email = data.get('email')
-        password = data.get('password')
+        email = data['email']
+        password = data['password']
         username = data.get('username')
         role = data.get('role', 'editor')
         
-        # Validation
-        if not email or not password:
-            return jsonify({'error': 'Email and password are required'}), 400
-        
-        if not validate_email(email):
-            return jsonify({'error': 'Invalid email format'}), 400
-        
-        if len(password) < 6:
-            return jsonify({'error': 'Password must be at least 6 characters long'}), 400
-        
         # Check if user already exists
-        existing_user = User.find_by_email(email)
+        existing_user = User.find_by_email(email, include_deleted=True)
+        if existing_user and existing_user.deleted_at:
+            return jsonify({'error': 'An account with this email is still being deleted, please retry later'}), 409
         if existing_user:
             return jsonify({'error': 'User with this email already exists'}), 409
         
-        # Validate role
-        valid_roles = ['admin', 'editor', 'viewer']
-        if role not in valid_roles:
-            return jsonify({'error': f'Invalid role. Must be one of: {", ".join(valid_roles)}'}), 400
-        
         # Create new user
         user = User(email=email, password=password, role=role, username=username)
         user.save()
@@ -59,23 +43,25 @@ def signup():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('login')
 def login():
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        email = data.get('email')
-        password = data.get('password')
+        data, error = parse_body('login')
+        if error:
+            return error
         
-        if not email or not password:
-            return jsonify({'error': 'Email and password are required'}), 400
+        email = data['email']
+        password = data['password']
         
         # Find user by email
-        user = User.find_by_email(email)
-        if not user or not user.check_password(password):
+        user = User.authenticate(email, password)
+        if not user:
             return jsonify({'error': 'Invalid email or password'}), 401
+
+        # Transparently upgrade legacy or outdated password hashes
+        if user.needs_rehash():
+            user.set_password(password)
+            user.save()
         
         # Create access token
         access_token = create_access_token(identity=str(user.id))
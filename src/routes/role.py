@@ -1,8 +1,8 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import User
 from src.models.role import Role
-from src.models.database import db
+from src.services.validation import parse_body
 from functools import wraps
 
 role_bp = Blueprint('role', __name__)
@@ -25,17 +25,13 @@ def admin_required(f):
 @admin_required
 def create_role():
     try:
-        data = request.get_json()
+        data, error = parse_body('role_create')
+        if error:
+            return error
         
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        name = data.get('name')
+        name = data['name']
         permissions = data.get('permissions', [])
         
-        if not name:
-            return jsonify({'error': 'Role name is required'}), 400
-        
         # Check if role already exists
         existing_role = Role.find_by_name(name)
         if existing_role:
@@ -69,10 +65,9 @@ def get_roles():
 @admin_required
 def update_role(role_id):
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
+        data, error = parse_body('role_update')
+        if error:
+            return error
         
         role = Role.find_by_id(role_id)
         if not role:
@@ -122,27 +117,18 @@ def delete_role(role_id):
 @admin_required
 def assign_role():
     try:
-        data = request.get_json()
+        data, error = parse_body('role_assign')
+        if error:
+            return error
         
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        user_id = data.get('user_id')
-        role_name = data.get('role')
-        
-        if not user_id or not role_name:
-            return jsonify({'error': 'User ID and role are required'}), 400
+        user_id = data['user_id']
+        role_name = data['role']
         
         # Find user
         user = User.find_by_id(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Validate role
-        valid_roles = ['admin', 'editor', 'viewer']
-        if role_name not in valid_roles:
-            return jsonify({'error': f'Invalid role. Must be one of: {", ".join(valid_roles)}'}), 400
-        
         # Update user role
         user.role = role_name
         user.save()
@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import User
-from src.models.database import db
+from src.models.purge_job import PurgeJob
+from src.services.purge_worker import purge_worker
+from src.services.validation import parse_body
 from functools import wraps
 
 user_bp = Blueprint('user', __name__)
@@ -47,10 +49,9 @@ def get_user(user_id):
 @admin_required
 def update_user(user_id):
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
+        data, error = parse_body('user_update')
+        if error:
+            return error
         
         user = User.find_by_id(user_id)
         if not user:
@@ -61,14 +62,11 @@ def update_user(user_id):
             user.username = data['username']
         if 'email' in data:
             # Check if email already exists
-            existing_user = User.find_by_email(data['email'])
+            existing_user = User.find_by_email(data['email'], include_deleted=True)
             if existing_user and str(existing_user.id) != user_id:
                 return jsonify({'error': 'Email already exists'}), 409
             user.email = data['email']
         if 'role' in data:
-            valid_roles = ['admin', 'editor', 'viewer']
-            if data['role'] not in valid_roles:
-                return jsonify({'error': f'Invalid role. Must be one of: {", ".join(valid_roles)}'}), 400
             user.role = data['role']
         
         user.save()
@@ -95,13 +93,27 @@ def delete_user(user_id):
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Delete user and their websites
-        cursor = db.cursor()
-        cursor.execute('DELETE FROM websites WHERE user_id = ?', (user_id,))
-        cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
-        db.commit()
+        # Mark the user deleted now; their websites are purged in the background
+        job = PurgeJob.start(user.id)
+        purge_worker.wake()
+        
+        return jsonify({
+            'message': 'User deleted successfully, their websites are being removed',
+            'purge': job
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_bp.route('/users/<user_id>/purge', methods=['GET'])
+@admin_required
+def get_user_purge(user_id):
+    try:
+        job = PurgeJob.find(user_id)
+        if not job:
+            return jsonify({'error': 'No deletion found for this user'}), 404
         
-        return jsonify({'message': 'User deleted successfully'}), 200
+        return jsonify({'purge': job}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,8 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import User
-from src.models.website import Website
+from src.models.website import Website, VersionConflict
+from src.models.aio import AsyncUser, AsyncWebsite, run_db
+from src.models.revision import WebsiteRevision
+from src.services.website_transfer import batch_size_from, export_lines, import_events
+from src.services.autosave import autosave_buffer
+from src.services.validation import parse_body
 from functools import wraps
+from datetime import datetime
+from src.services import json_codec
+import asyncio
 
 website_bp = Blueprint('website', __name__)
 
@@ -20,7 +28,8 @@ def check_permission(permission):
             
             # Admin has all permissions
             if user.role == 'admin':
-                return f(*args, **kwargs)
+                # ensure_sync runs async views to completion as well
+                return current_app.ensure_sync(f)(*args, **kwargs)
             
             # Check specific permissions based on role
             role_permissions = {
@@ -31,28 +40,60 @@ def check_permission(permission):
             if permission not in role_permissions.get(user.role, []):
                 return jsonify({'error': 'Insufficient permissions'}), 403
             
-            return f(*args, **kwargs)
+            return current_app.ensure_sync(f)(*args, **kwargs)
         return decorated_function
     return decorator
 
+def parse_website_filters(user, current_user_id):
+    """Read list filters from the query string.
+
+    Returns ``(filters, error)``. Non-admin users are always restricted to
+    their own websites; admins may pass ``owner`` to pick a user.
+    """
+    filters = {
+        'user_id': None,
+        'industry': request.args.get('industry') or None,
+        'business_type': request.args.get('business_type') or None,
+    }
+
+    if user.role != 'admin':
+        filters['user_id'] = int(current_user_id)
+    elif request.args.get('owner'):
+        try:
+            filters['user_id'] = int(request.args['owner'])
+        except ValueError:
+            return None, 'owner must be a user id'
+
+    for key in ('created_from', 'created_to', 'updated_from', 'updated_to'):
+        value = request.args.get(key)
+        if not value:
+            filters[key] = None
+            continue
+        try:
+            datetime.fromisoformat(value)
+        except ValueError:
+            return None, f'{key} must be an ISO date or datetime'
+        if key.endswith('_to') and len(value) == 10:
+            # A bare date as upper bound includes the whole day
+            value += 'T23:59:59.999999'
+        filters[key] = value
+
+    return filters, None
+
 @website_bp.route('', methods=['POST'])
 @check_permission('create_website')
 def create_website():
     try:
         current_user_id = get_jwt_identity()
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
+        data, error = parse_body('website_create')
+        if error:
+            return error
         
-        title = data.get('title')
+        title = data['title']
         content = data.get('content', {})
         business_type = data.get('business_type')
         industry = data.get('industry')
         
-        if not title:
-            return jsonify({'error': 'Title is required'}), 400
-        
         # Create new website
         website = Website(
             title=title,
@@ -73,12 +114,14 @@ def create_website():
 
 @website_bp.route('/<website_id>', methods=['GET'])
 @check_permission('read_website')
-def get_website(website_id):
+async def get_website(website_id):
     try:
         current_user_id = get_jwt_identity()
-        user = User.find_by_id(current_user_id)
-        
-        website = Website.find_by_id(website_id)
+        # Independent lookups, run side by side on the database pool. An
+        # autosave that could not be written stays visible until the next update.
+        user, website, failure = await asyncio.gather(AsyncUser.find_by_id(current_user_id),
+                                                      AsyncWebsite.find_by_id(website_id),
+                                                      run_db(autosave_buffer.failure, website_id))
         if not website:
             return jsonify({'error': 'Website not found'}), 404
         
@@ -86,7 +129,10 @@ def get_website(website_id):
         if user.role != 'admin' and str(website.user_id) != current_user_id:
             return jsonify({'error': 'Access denied'}), 403
         
-        return jsonify({'website': website.to_dict()}), 200
+        body = {'website': website.to_dict()}
+        if failure:
+            body['autosave_failure'] = failure
+        return jsonify(body), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -98,17 +144,120 @@ def get_websites():
         current_user_id = get_jwt_identity()
         user = User.find_by_id(current_user_id)
         
-        if user.role == 'admin':
+        filters, error = parse_website_filters(user, current_user_id)
+        if error:
+            return jsonify({'error': error}), 400
+
+        response = {}
+        if 'page' in request.args or 'per_page' in request.args:
+            try:
+                page = max(1, int(request.args.get('page', 1)))
+                per_page = min(200, max(1, int(request.args.get('per_page', 50))))
+            except ValueError:
+                return jsonify({'error': 'page and per_page must be integers'}), 400
+            websites, has_more = Website.find_page(page, per_page, **filters)
+            response.update(page=page, per_page=per_page, has_more=has_more)
+        elif not any(value is not None for value in filters.values()):
             # Admin can see all websites
             websites = Website.find_all()
-        else:
+        elif set(key for key, value in filters.items() if value is not None) == {'user_id'}:
             # Users can only see their own websites
-            websites = Website.find_by_user_id(current_user_id)
+            websites = Website.find_by_user_id(filters['user_id'])
+        else:
+            websites = Website.find_filtered(**filters)
+
+        response['websites'] = [website.to_dict() for website in websites]
+        if request.args.get('facets', '').lower() in ('1', 'true', 'yes'):
+            response['facets'] = Website.facets(**filters)
+
+        return jsonify(response), 200
         
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@website_bp.route('/facets', methods=['GET'])
+@check_permission('read_website')
+def get_website_facets():
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.find_by_id(current_user_id)
+
+        filters, error = parse_website_filters(user, current_user_id)
+        if error:
+            return jsonify({'error': error}), 400
+
+        return jsonify({'facets': Website.facets(**filters)}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@website_bp.route('/search', methods=['GET'])
+@check_permission('read_website')
+def search_websites():
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.find_by_id(current_user_id)
+
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Search query is required'}), 400
+
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(100, max(1, int(request.args.get('per_page', 20))))
+        except ValueError:
+            return jsonify({'error': 'page and per_page must be integers'}), 400
+
+        # Admin can search all websites, other users only their own
+        owner_id = None if user.role == 'admin' else current_user_id
+        results, has_more = Website.search(query, user_id=owner_id, page=page, per_page=per_page)
+
         return jsonify({
-            'websites': [website.to_dict() for website in websites]
+            'results': results,
+            'page': page,
+            'per_page': per_page,
+            'has_more': has_more
         }), 200
-        
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@website_bp.route('/export', methods=['GET'])
+@check_permission('read_website')
+def export_websites():
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.find_by_id(current_user_id)
+
+        filters, error = parse_website_filters(user, current_user_id)
+        if error:
+            return jsonify({'error': error}), 400
+
+        batch_size = batch_size_from(request.args.get('batch_size', type=int))
+        return Response(
+            stream_with_context(export_lines(filters, batch_size)),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': 'attachment; filename=websites.ndjson'}
+        )
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@website_bp.route('/import', methods=['POST'])
+@check_permission('create_website')
+def import_websites():
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.find_by_id(current_user_id)
+
+        batch_size = batch_size_from(request.args.get('batch_size', type=int))
+        events = import_events(request.stream, current_user_id,
+                               allow_owner=user.role == 'admin', batch_size=batch_size)
+        return Response(
+            stream_with_context(json_codec.dumps(event) + '\n' for event in events),
+            mimetype='application/x-ndjson'
+        )
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -118,10 +267,9 @@ def update_website(website_id):
     try:
         current_user_id = get_jwt_identity()
         user = User.find_by_id(current_user_id)
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
+        data, error = parse_body('website_update')
+        if error:
+            return error
         
         website = Website.find_by_id(website_id)
         if not website:
@@ -131,6 +279,25 @@ def update_website(website_id):
         if user.role != 'admin' and str(website.user_id) != current_user_id:
             return jsonify({'error': 'Access denied'}), 403
         
+        # Reported with this response, then forgotten once the update goes through
+        failure = autosave_buffer.failure(website.id)
+
+        # Clients that send the version they edited get a strict check; their
+        # own flushed autosaves do not count as someone else's change. Edits
+        # made to an older version are merged with the saves since, unless
+        # they touch the same fields or that version is no longer known.
+        merging = False
+        if data.get('version') is not None:
+            if data['version'] != website.version and not autosave_buffer.own_version(
+                    website.id, current_user_id, data['version'], website.version):
+                merging = website.edit_from(data['version'])
+                if not merging:
+                    body = {'error': 'Website was changed by someone else; reload it and try again',
+                            'current_version': website.version}
+                    if failure:
+                        body['autosave_failure'] = failure
+                    return jsonify(body), 409
+        
         # Update website fields
         if 'title' in data:
             website.title = data['title']
@@ -141,13 +308,22 @@ def update_website(website_id):
         if 'industry' in data:
             website.industry = data['industry']
         
-        website.save()
-        
-        return jsonify({
-            'message': 'Website updated successfully',
-            'website': website.to_dict()
-        }), 200
+        if request.args.get('autosave') in ('1', 'true') and autosave_buffer.enabled() and not merging:
+            # Coalesced with other autosaves and written shortly; a merge
+            # needs the stored version and is saved now
+            autosave_buffer.add(website, current_user_id)
+            body, status = {'message': 'Website changes queued', 'website': website.to_dict()}, 202
+        else:
+            website.save()
+            body, status = {'message': 'Website updated successfully', 'website': website.to_dict()}, 200
+
+        if failure:
+            autosave_buffer.resolve(website.id)
+            body['autosave_failure'] = failure
+        return jsonify(body), status
         
+    except VersionConflict as e:
+        return jsonify({'error': str(e), 'current_version': e.current_version}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -173,3 +349,176 @@ def delete_website(website_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def clone_website_copies(website_id, copies):
+    """Clone ``website_id`` for the current user; returns ``(ids, None)`` or ``(None, (response, status))``."""
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+
+    website = Website.find_by_id(website_id)
+    if not website:
+        return None, (jsonify({'error': 'Website not found'}), 404)
+
+    # Users can only clone websites they can read
+    if user.role != 'admin' and str(website.user_id) != current_user_id:
+        return None, (jsonify({'error': 'Access denied'}), 403)
+
+    try:
+        ids = Website.clone(website, current_user_id, copies)
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    if not ids:
+        return None, (jsonify({'error': 'Website not found'}), 404)
+    return [str(new_id) for new_id in ids], None
+
+@website_bp.route('/<website_id>/clone', methods=['POST'])
+@check_permission('create_website')
+def clone_website(website_id):
+    try:
+        data, error = parse_body('website_clone', required=False)
+        if error:
+            return error
+
+        ids, error = clone_website_copies(website_id, [data])
+        if error:
+            return error
+
+        return jsonify({
+            'message': 'Website cloned successfully',
+            'website': Website.find_by_id(ids[0]).to_dict()
+        }), 201
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@website_bp.route('/<website_id>/clone/bulk', methods=['POST'])
+@check_permission('create_website')
+def bulk_clone_website(website_id):
+    try:
+        data, error = parse_body('website_clone_bulk')
+        if error:
+            return error
+
+        ids, error = clone_website_copies(website_id, data['copies'])
+        if error:
+            return error
+
+        return jsonify({'message': f'{len(ids)} copies created', 'ids': ids}), 201
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@website_bp.route('/<website_id>/revisions', methods=['GET'])
+@check_permission('read_website')
+def get_website_revisions(website_id):
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.find_by_id(current_user_id)
+
+        website = Website.find_by_id(website_id)
+        if not website:
+            return jsonify({'error': 'Website not found'}), 404
+
+        # Check if user can access this website
+        if user.role != 'admin' and str(website.user_id) != current_user_id:
+            return jsonify({'error': 'Access denied'}), 403
+
+        try:
+            limit = min(200, max(1, int(request.args.get('limit', 50))))
+            before = int(request.args['before']) if 'before' in request.args else None
+        except ValueError:
+            return jsonify({'error': 'limit and before must be integers'}), 400
+
+        return jsonify({
+            'revisions': WebsiteRevision.find_by_website_id(website.id, limit=limit, before=before)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@website_bp.route('/<website_id>/revisions/<int:revision>', methods=['GET'])
+@check_permission('read_website')
+def get_website_revision(website_id, revision):
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.find_by_id(current_user_id)
+
+        website = Website.find_by_id(website_id)
+        if not website:
+            return jsonify({'error': 'Website not found'}), 404
+
+        # Check if user can access this website
+        if user.role != 'admin' and str(website.user_id) != current_user_id:
+            return jsonify({'error': 'Access denied'}), 403
+
+        state = WebsiteRevision.get(website.id, revision)
+        if state is None:
+            return jsonify({'error': 'Revision not found'}), 404
+
+        return jsonify({'revision': revision, 'website': state}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@website_bp.route('/<website_id>/revisions/<int:revision>/diff', methods=['GET'])
+@check_permission('read_website')
+def diff_website_revision(website_id, revision):
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.find_by_id(current_user_id)
+
+        website = Website.find_by_id(website_id)
+        if not website:
+            return jsonify({'error': 'Website not found'}), 404
+
+        # Check if user can access this website
+        if user.role != 'admin' and str(website.user_id) != current_user_id:
+            return jsonify({'error': 'Access denied'}), 403
+
+        try:
+            against = int(request.args.get('against', revision - 1))
+        except ValueError:
+            return jsonify({'error': 'against must be a revision number'}), 400
+
+        delta = WebsiteRevision.diff(website.id, revision, against)
+        if delta is None:
+            return jsonify({'error': 'Revision not found'}), 404
+
+        return jsonify({'revision': revision, 'against': against, 'diff': delta}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@website_bp.route('/<website_id>/revisions/<int:revision>/restore', methods=['POST'])
+@check_permission('update_website')
+def restore_website_revision(website_id, revision):
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.find_by_id(current_user_id)
+
+        website = Website.find_by_id(website_id)
+        if not website:
+            return jsonify({'error': 'Website not found'}), 404
+
+        # Check if user can update this website
+        if user.role != 'admin' and str(website.user_id) != current_user_id:
+            return jsonify({'error': 'Access denied'}), 403
+
+        state = WebsiteRevision.get(website.id, revision)
+        if state is None:
+            return jsonify({'error': 'Revision not found'}), 404
+
+        website.title = state['title']
+        website.content = state['content']
+        website.business_type = state['business_type']
+        website.industry = state['industry']
+        website.save()
+
+        return jsonify({
+            'message': f'Website restored to revision {revision}',
+            'website': website.to_dict()
+        }), 200
+
+    except VersionConflict as e:
+        return jsonify({'error': str(e), 'current_version': e.current_version}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,272 @@
+"""Write-behind buffer for editor autosaves.
+
+With ``AUTOSAVE_ENABLED=1``, ``PUT /api/websites/<id>?autosave=1`` does not
+write the website. It parks the edited website here, replacing any edit of
+the same website that is still waiting. A background thread saves each
+website once it has been waiting ``AUTOSAVE_DELAY`` seconds (default 2),
+so a burst of keystroke saves turns into one UPDATE, one revision and one
+commit. When more than ``AUTOSAVE_MAX_PENDING`` websites (default 500) are
+waiting, everything is flushed at once. Whatever is left is flushed when the
+process exits.
+
+Reads in the same process see pending edits: websites loaded by the model
+get the waiting title, content and facets applied on top of the stored row.
+Other worker processes see them once flushed. A normal save or a delete of
+the website supersedes what is waiting.
+
+A flush that conflicts with another save of the same fields is not retried:
+the edit is stored in ``autosave_failures`` together with the error, and
+``GET``/``PUT`` of the website report it as ``autosave_failure`` until the
+editor's next successful ``PUT``. Other errors are retried twice after
+another delay before the edit is stored the same way.
+
+Flushing bumps the stored version past the one the editor was told about
+(the 202 response carries the version the edit was based on). The buffer
+remembers which versions came only from one user's flushed autosaves, so
+``own_version`` lets that user's next strict save through.
+"""
+import atexit
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from src.models.database import db
+from src.services import json_codec
+
+FIELDS = ('title', 'content', 'business_type', 'industry')
+
+# Websites whose autosave version lineage is remembered
+LINEAGE_SIZE = 10000
+
+
+class _Entry:
+    __slots__ = ('website', 'seq', 'since', 'attempts', 'user_id')
+
+    def __init__(self, website, seq, since, user_id):
+        self.website = website
+        self.seq = seq
+        self.since = since
+        self.attempts = 0
+        self.user_id = user_id
+
+
+class AutosaveBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = {}
+        # website id -> (user id, first version, last version) of a run of
+        # versions written only by that user's autosaves
+        self._lineage = OrderedDict()
+        self._seq = 0
+        self._thread = None
+        self._flush_all = False
+        self._counters = {'buffered': 0, 'coalesced': 0, 'flushed': 0, 'failed': 0, 'conflicts': 0, 'unsaved': 0}
+        self._last_error = None
+
+    @staticmethod
+    def enabled():
+        return os.getenv('AUTOSAVE_ENABLED', '0').lower() in ('1', 'true', 'yes', 'on')
+
+    @staticmethod
+    def delay():
+        return max(0.0, float(os.getenv('AUTOSAVE_DELAY', 2)))
+
+    @staticmethod
+    def max_pending():
+        return max(1, int(os.getenv('AUTOSAVE_MAX_PENDING', 500)))
+
+    def add(self, website, user_id=None):
+        """Park an edited (already stored) website of ``user_id`` until the next flush."""
+        snapshot = copy.copy(website)
+        snapshot.content = copy.deepcopy(website.content)
+        with self._lock:
+            self._seq += 1
+            entry = self._pending.get(website.id)
+            if entry:
+                # The window starts with the first unsaved edit, so a steady
+                # stream of edits still reaches the database every delay
+                entry.website, entry.seq, entry.user_id = snapshot, self._seq, user_id
+                self._counters['coalesced'] += 1
+            else:
+                self._pending[website.id] = _Entry(snapshot, self._seq, time.monotonic(), user_id)
+            self._counters['buffered'] += 1
+            if len(self._pending) >= self.max_pending():
+                self._flush_all = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='autosave', daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def overlay(self, website):
+        """Apply a pending edit of ``website`` in place; no-op when none is waiting."""
+        if not self._pending:
+            return website
+        with self._lock:
+            entry = self._pending.get(website.id)
+            if entry is None:
+                return website
+            pending, seq = entry.website, entry.seq
+        website.title = pending.title
+        website.content = copy.deepcopy(pending.content)
+        website.business_type = pending.business_type
+        website.industry = pending.industry
+        website._autosave_seq = seq
+        return website
+
+    def saved(self, website):
+        """``website`` was written directly; drop pending edits it already included."""
+        if not self._pending:
+            return
+        with self._lock:
+            entry = self._pending.get(website.id)
+            if entry and entry.seq <= getattr(website, '_autosave_seq', 0):
+                del self._pending[website.id]
+
+    def discard(self, website_id):
+        with self._lock:
+            self._pending.pop(website_id, None)
+            self._lineage.pop(website_id, None)
+        self.resolve(website_id)
+
+    def failure(self, website_id):
+        """The unsaved autosave of ``website_id`` that could not be written, or None."""
+        row = db.execute('SELECT * FROM autosave_failures WHERE website_id = ?', (website_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'user_id': str(row['user_id']) if row['user_id'] is not None else None,
+            'base_version': row['base_version'],
+            'current_version': row['current_version'],
+            'changes': json_codec.loads(row['changes']),
+            'error': row['error'],
+            'failed_at': row['failed_at']
+        }
+
+    def resolve(self, website_id):
+        """Forget the failed autosave of ``website_id``; the editor has seen it or saved again."""
+        with db.lock:
+            db.execute('DELETE FROM autosave_failures WHERE website_id = ?', (website_id,))
+            db.commit()
+
+    def _store_failure(self, website_id, entry, error):
+        website = entry.website
+        changes = {field: getattr(website, field) for field in FIELDS}
+        with db.lock:
+            db.execute('''
+                INSERT INTO autosave_failures
+                    (website_id, user_id, base_version, current_version, changes, error, failed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (website_id) DO UPDATE SET user_id = excluded.user_id,
+                    base_version = excluded.base_version, current_version = excluded.current_version,
+                    changes = excluded.changes, error = excluded.error, failed_at = excluded.failed_at
+            ''', (website_id, entry.user_id, website.version, getattr(error, 'current_version', None),
+                  json_codec.dumps(changes), str(error), datetime.utcnow().isoformat()))
+            db.commit()
+
+    def own_version(self, website_id, user_id, version, current_version):
+        """Whether ``version`` trails ``current_version`` only by autosaves of ``user_id``."""
+        with self._lock:
+            lineage = self._lineage.get(website_id)
+        if lineage is None or user_id is None:
+            return False
+        owner, first, last = lineage
+        return owner == user_id and last == current_version and first <= version <= last
+
+    def _flushed(self, website_id, user_id, base_version, version):
+        """Record that an autosave based on ``base_version`` was written as ``version``; holds the lock."""
+        lineage = self._lineage.pop(website_id, None)
+        if version != base_version + 1 or user_id is None:
+            # Merged over someone else's save: older versions are not ours
+            return
+        if lineage and lineage[0] == user_id and lineage[2] == base_version:
+            self._lineage[website_id] = (user_id, lineage[1], version)
+        else:
+            self._lineage[website_id] = (user_id, base_version, version)
+        if len(self._lineage) > LINEAGE_SIZE:
+            self._lineage.popitem(last=False)
+
+    def flush(self, website_id=None):
+        """Save pending edits now: one website, or all of them. Returns the number saved."""
+        with self._lock:
+            ids = list(self._pending) if website_id is None else [website_id]
+            entries = [(key, self._pending.pop(key)) for key in ids if key in self._pending]
+        return self._save(entries)
+
+    def _save(self, entries):
+        # Imported here: the model imports this module
+        from src.models.website import VersionConflict
+
+        saved = 0
+        for website_id, entry in entries:
+            base_version = entry.website.version
+            try:
+                entry.website.save()
+                saved += 1
+                with self._lock:
+                    self._counters['flushed'] += 1
+                    self._flushed(website_id, entry.user_id, base_version, entry.website.version)
+            except Exception as e:
+                with self._lock:
+                    self._counters['failed'] += 1
+                    self._last_error = f'website {website_id}: {e}'
+                    entry.attempts += 1
+                    superseded = website_id in self._pending
+                    # A conflict stays a conflict; retry anything else after another delay
+                    retry = not isinstance(e, VersionConflict) and entry.attempts < 3
+                    if retry and not superseded:
+                        entry.since = time.monotonic()
+                        self._pending[website_id] = entry
+                    elif not retry:
+                        self._counters['conflicts' if isinstance(e, VersionConflict) else 'unsaved'] += 1
+                if not retry and not superseded:
+                    # Keep the edit where its editor can see it instead of dropping it
+                    try:
+                        self._store_failure(website_id, entry, e)
+                    except Exception as store_error:
+                        with self._lock:
+                            self._last_error = f'website {website_id}: {e}; not stored: {store_error}'
+        return saved
+
+    def _due(self):
+        """Entries to save now and the seconds until the next one is due; holds the lock."""
+        now = time.monotonic()
+        delay = self.delay()
+        if self._flush_all:
+            self._flush_all = False
+            due = list(self._pending)
+        else:
+            due = [key for key, entry in self._pending.items() if now - entry.since >= delay]
+        entries = [(key, self._pending.pop(key)) for key in due]
+        wait = min((entry.since + delay - now for entry in self._pending.values()), default=None)
+        return entries, wait
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    entries, wait = self._due()
+                    if not entries:
+                        if wait is None:
+                            self._thread = None
+                            return
+                        self._wakeup.wait(wait)
+                        continue
+                self._save(entries)
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._counters, enabled=self.enabled(), pending=len(self._pending),
+                        delay=self.delay(), max_pending=self.max_pending(), last_error=self._last_error)
+
+
+# Global buffer instance
+autosave_buffer = AutosaveBuffer()
+atexit.register(autosave_buffer.flush)
@@ -0,0 +1,131 @@
+"""The JSON codec used for responses, request bodies and stored data.
+
+``JSON_BACKEND`` picks the implementation: ``auto`` (default) uses orjson
+when it is installed and the standard library otherwise; ``orjson`` and
+``stdlib`` force one. Output is compact UTF-8 either way. Values orjson
+cannot encode (e.g. integers beyond 64 bits) and documents it refuses to
+parse (e.g. ``NaN``) are retried with the standard library, so both
+backends accept the same data.
+
+``RawJSON`` wraps text that is already valid JSON, such as website content
+as stored; it is spliced into the output instead of being parsed and
+encoded again. ``JSONProvider`` makes Flask's ``jsonify`` and
+``request.get_json`` use this module.
+"""
+import json
+import os
+import re
+import uuid
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Placeholder string for RawJSON values; random per process so no document can contain it
+_MARKER = f'__raw_json_{uuid.uuid4().hex}_'
+_MARKER_PATTERN = re.compile(f'"{_MARKER}(\\d+)"')
+_MARKER_PATTERN_BYTES = re.compile(f'"{_MARKER}(\\d+)"'.encode())
+
+
+class RawJSON:
+    """Already encoded JSON ``text`` to embed verbatim; the caller vouches that it is valid."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f'RawJSON({self.text[:40]!r})'
+
+
+def backend():
+    name = os.getenv('JSON_BACKEND', 'auto').lower()
+    if name == 'stdlib' or (name == 'auto' and orjson is None):
+        return 'stdlib'
+    if name not in ('auto', 'orjson'):
+        raise ValueError(f'Unknown JSON_BACKEND {name!r}; use auto, orjson or stdlib')
+    if orjson is None:
+        raise RuntimeError('JSON_BACKEND=orjson needs the orjson package: pip install orjson')
+    return 'orjson'
+
+
+def _hook(fragments, default):
+    def encode(value):
+        if isinstance(value, RawJSON):
+            fragments.append(value.text)
+            return f'{_MARKER}{len(fragments) - 1}'
+        if default is not None:
+            return default(value)
+        raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+    return encode
+
+
+def _stdlib_dumps(obj, hook, indent, sort_keys):
+    return json.dumps(obj, default=hook, ensure_ascii=False, sort_keys=sort_keys,
+                      indent=2 if indent else None, separators=None if indent else (',', ':'))
+
+
+def dumps_bytes(obj, default=None, indent=False, sort_keys=False):
+    """Encode ``obj`` to UTF-8 JSON bytes; ``default`` converts unsupported values."""
+    fragments = []
+    hook = _hook(fragments, default)
+    if backend() == 'orjson':
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            data = orjson.dumps(obj, default=hook, option=option)
+        except orjson.JSONEncodeError:
+            fragments.clear()
+            data = _stdlib_dumps(obj, hook, indent, sort_keys).encode()
+    else:
+        data = _stdlib_dumps(obj, hook, indent, sort_keys).encode()
+    if fragments:
+        data = _MARKER_PATTERN_BYTES.sub(lambda match: fragments[int(match.group(1))].encode(), data)
+    return data
+
+
+def dumps(obj, default=None, indent=False, sort_keys=False):
+    """Like ``dumps_bytes`` but returns text."""
+    if backend() == 'orjson':
+        return dumps_bytes(obj, default, indent, sort_keys).decode()
+    fragments = []
+    text = _stdlib_dumps(obj, _hook(fragments, default), indent, sort_keys)
+    if fragments:
+        text = _MARKER_PATTERN.sub(lambda match: fragments[int(match.group(1))], text)
+    return text
+
+
+def loads(data):
+    """Parse JSON from ``str``, ``bytes`` or ``bytearray``; raises ``json.JSONDecodeError``."""
+    if backend() == 'orjson':
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider on top of this module; keeps Flask's ``default`` and ``sort_keys``."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, default=kwargs.get('default', self.default), indent=bool(kwargs.get('indent')),
+                     sort_keys=kwargs.get('sort_keys', self.sort_keys))
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = dumps_bytes(obj, default=self.default, indent=indent, sort_keys=self.sort_keys) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,146 @@
+"""Per-route concurrency limits with a bounded priority queue.
+
+When a route already has ``limit`` requests in flight, new requests wait in a
+queue of at most ``queue_size`` entries for up to ``timeout`` seconds and are
+then shed with a fast 503 instead of piling up until the server times them
+out. Authenticated requests are admitted ahead of anonymous ones.
+
+Limits are per process (per gunicorn worker) and configured per route group
+with ``CONCURRENCY_LIMIT_<NAME>``, ``CONCURRENCY_QUEUE_<NAME>`` and
+``CONCURRENCY_TIMEOUT_<NAME>`` (seconds).
+"""
+import heapq
+import itertools
+import os
+import threading
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import verify_jwt_in_request
+
+DEFAULTS = {
+    'ai': {'limit': 4, 'queue': 16, 'timeout': 10.0},
+    'preview': {'limit': 16, 'queue': 64, 'timeout': 2.0},
+}
+
+PRIORITY_AUTHENTICATED = 0
+PRIORITY_ANONYMOUS = 1
+
+
+class ConcurrencyLimiter:
+    def __init__(self, name, limit, queue_size, timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.max_queue_depth = 0
+
+    def acquire(self, priority=PRIORITY_ANONYMOUS):
+        """Return True once a slot is held, False if the request was shed."""
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                self.admitted += 1
+                return True
+            if len(self._waiters) >= self.queue_size:
+                self.shed_queue_full += 1
+                return False
+            waiter = [priority, next(self._sequence), threading.Event(), False]
+            heapq.heappush(self._waiters, waiter)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+
+        waiter[2].wait(self.timeout)
+
+        with self._lock:
+            if waiter[3]:
+                self.admitted += 1
+                return True
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self.shed_timeout += 1
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the best waiter
+                waiter = heapq.heappop(self._waiters)
+                waiter[3] = True
+                waiter[2].set()
+            else:
+                self.in_flight -= 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'timeout': self.timeout,
+                'in_flight': self.in_flight,
+                'queue_depth': len(self._waiters),
+                'max_queue_depth': self.max_queue_depth,
+                'admitted': self.admitted,
+                'shed_queue_full': self.shed_queue_full,
+                'shed_timeout': self.shed_timeout,
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            defaults = DEFAULTS.get(name, {'limit': 8, 'queue': 32, 'timeout': 5.0})
+            key = name.upper()
+            limiter = ConcurrencyLimiter(
+                name,
+                int(os.getenv(f'CONCURRENCY_LIMIT_{key}', defaults['limit'])),
+                int(os.getenv(f'CONCURRENCY_QUEUE_{key}', defaults['queue'])),
+                float(os.getenv(f'CONCURRENCY_TIMEOUT_{key}', defaults['timeout'])),
+            )
+            _limiters[name] = limiter
+        return limiter
+
+
+def all_metrics():
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.metrics() for limiter in limiters}
+
+
+def _request_priority():
+    try:
+        if verify_jwt_in_request(optional=True):
+            return PRIORITY_AUTHENTICATED
+    except Exception:
+        pass
+    return PRIORITY_ANONYMOUS
+
+
+def limit_concurrency(name):
+    """Decorator bounding the number of concurrent requests in ``name``."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limiter = get_limiter(name)
+            if not limiter.acquire(_request_priority()):
+                response = jsonify({'error': 'Server is busy, please retry shortly'})
+                response.headers['Retry-After'] = '1'
+                return response, 503
+            try:
+                # Async views hold the slot until they finish, too
+                return current_app.ensure_sync(f)(*args, **kwargs)
+            finally:
+                limiter.release()
+        return decorated_function
+    return decorator
@@ -0,0 +1,279 @@
+"""In-process SQLite housekeeping on a schedule.
+
+Every process starts a scheduler thread, but only the holder of the
+``maintenance_lease`` row runs tasks; the lease is renewed on every tick and
+taken over by another process once it expires. Every task runs against each
+database file: the main database, each website shard (``websites-<n>.db``)
+and the archive database once it exists. Results are stored per database in
+the main database's ``maintenance_runs`` so any worker can report them.
+
+Tasks and default intervals (seconds, ``MAINTENANCE_INTERVAL_<TASK>``
+overrides them, 0 disables a task):
+
+- ``optimize`` (3600): ``PRAGMA optimize``.
+- ``checkpoint`` (300): WAL checkpoint; TRUNCATE once the WAL file exceeds
+  ``MAINTENANCE_WAL_MAX_BYTES`` (default 64 MiB). Skipped outside WAL mode.
+- ``analyze`` (86400): ``ANALYZE`` bounded by ``MAINTENANCE_ANALYSIS_LIMIT``.
+- ``incremental_vacuum`` (3600): returns up to ``MAINTENANCE_VACUUM_PAGES``
+  free pages to the filesystem. Needs ``auto_vacuum=INCREMENTAL``; older
+  databases are converted once with ``flask admin maintenance vacuum``.
+- ``integrity_check`` (86400): ``PRAGMA quick_check``.
+
+Heavy tasks only start inside ``MAINTENANCE_WINDOW`` (UTC ``HH:MM-HH:MM``,
+default ``02:00-05:00``). ``MAINTENANCE_ENABLED=0`` turns the scheduler off
+and ``MAINTENANCE_TICK`` sets how often it wakes up (default 60 seconds).
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from src.models import shards
+from src.models.archive import WebsiteArchive
+from src.models.database import db, db_instance
+
+LEASE_NAME = 'scheduler'
+
+# name: (default interval in seconds, only inside the low-traffic window)
+TASKS = {
+    'optimize': (3600, False),
+    'checkpoint': (300, False),
+    'analyze': (86400, True),
+    'incremental_vacuum': (3600, True),
+    'integrity_check': (86400, True),
+}
+
+
+def task_interval(name):
+    return int(os.getenv(f'MAINTENANCE_INTERVAL_{name.upper()}', TASKS[name][0]))
+
+
+def parse_window(spec):
+    """``"HH:MM-HH:MM"`` to ``(start_minute, end_minute)``; None means always."""
+    if not spec:
+        return None
+    start, _, end = spec.partition('-')
+    to_minutes = lambda value: int(value.split(':')[0]) * 60 + int(value.split(':')[1])
+    return to_minutes(start), to_minutes(end)
+
+
+def in_window(window, now):
+    if window is None:
+        return True
+    minute = now.hour * 60 + now.minute
+    start, end = window
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end  # window spans midnight
+
+
+def _optimize(connection):
+    connection.execute('PRAGMA optimize')
+    return 'ok', None
+
+
+def _analyze(connection):
+    limit = int(os.getenv('MAINTENANCE_ANALYSIS_LIMIT', 1000))
+    connection.execute(f'PRAGMA analysis_limit = {limit}')
+    connection.execute('ANALYZE')
+    return 'ok', None
+
+
+def _incremental_vacuum(connection):
+    if connection.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return 'skipped', 'auto_vacuum is not INCREMENTAL; run "flask admin maintenance vacuum" once'
+    before = connection.execute('PRAGMA freelist_count').fetchone()[0]
+    pages = int(os.getenv('MAINTENANCE_VACUUM_PAGES', 2000))
+    # executescript() steps the pragma to completion; execute() frees one page
+    connection.executescript(f'PRAGMA incremental_vacuum({pages})')
+    after = connection.execute('PRAGMA freelist_count').fetchone()[0]
+    return 'ok', f'freed {before - after} pages, {after} free pages left'
+
+
+def _checkpoint(connection):
+    if connection.execute('PRAGMA journal_mode').fetchone()[0] != 'wal':
+        return 'skipped', 'database is not in WAL mode'
+    # Each shard and the archive has its own WAL next to its file
+    wal_path = connection.execute('PRAGMA database_list').fetchone()['file'] + '-wal'
+    wal_bytes = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+    mode = 'TRUNCATE' if wal_bytes > int(os.getenv('MAINTENANCE_WAL_MAX_BYTES', 64 * 1024 * 1024)) else 'PASSIVE'
+    busy, log_pages, checkpointed = connection.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    status = 'ok' if not busy else 'busy'
+    return status, f'{mode.lower()}: {checkpointed}/{log_pages} pages checkpointed, WAL was {wal_bytes} bytes'
+
+
+def _integrity_check(connection):
+    problems = [row[0] for row in connection.execute('PRAGMA quick_check')]
+    if problems == ['ok']:
+        return 'ok', None
+    return 'failed', '; '.join(problems[:20])
+
+
+def _vacuum(connection):
+    # Switching auto_vacuum on an existing database only takes effect after VACUUM
+    connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    connection.execute('VACUUM')
+    return 'ok', None
+
+
+RUNNERS = {
+    'optimize': _optimize,
+    'checkpoint': _checkpoint,
+    'analyze': _analyze,
+    'incremental_vacuum': _incremental_vacuum,
+    'integrity_check': _integrity_check,
+    'vacuum': _vacuum,
+}
+
+
+class MaintenanceScheduler:
+    def __init__(self):
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return os.getenv('MAINTENANCE_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+    @staticmethod
+    def tick_seconds():
+        return float(os.getenv('MAINTENANCE_TICK', 60))
+
+    def start(self):
+        with self._lock:
+            if self.enabled and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='maintenance', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @staticmethod
+    def databases():
+        """``{name: path}`` of every database file to maintain."""
+        found = {'main': db_instance.path}
+        # Shard files on disk, even ones a smaller WEBSITE_SHARDS no longer uses
+        for shard in shards.existing_shards():
+            if shard:
+                found[f'shard-{shard}'] = shards.shard_path(shard)
+        if os.path.exists(WebsiteArchive.path()):
+            found['archive'] = WebsiteArchive.path()
+        return found
+
+    def connect(self, database='main'):
+        """Open a maintenance connection to ``database``, a name from ``databases()``."""
+        connection = db_instance.connect(self.databases()[database])
+        # Autocommit: VACUUM and checkpoints cannot run inside a transaction
+        connection.isolation_level = None
+        connection.execute('PRAGMA busy_timeout = 1000')
+        return connection
+
+    def _acquire_lease(self, connection):
+        now = time.time()
+        row = connection.execute('''
+            INSERT INTO maintenance_lease (name, holder, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+            WHERE maintenance_lease.holder = excluded.holder OR maintenance_lease.expires_at < ?
+            RETURNING holder
+        ''', (LEASE_NAME, self.holder, now + 3 * self.tick_seconds(), now)).fetchone()
+        return row is not None
+
+    def due_tasks(self, connection, now=None):
+        now = now or datetime.utcnow()
+        window_open = in_window(parse_window(os.getenv('MAINTENANCE_WINDOW', '02:00-05:00')), now)
+        last_runs = {(row['database'], row['task']): row['finished_at'] for row in connection.execute(
+            'SELECT database, task, finished_at FROM maintenance_runs')}
+        due = []
+        for database in self.databases():
+            for name, (_, needs_window) in TASKS.items():
+                interval = task_interval(name)
+                if interval <= 0 or (needs_window and not window_open):
+                    continue
+                last = last_runs.get((database, name))
+                if last is None or (now - datetime.fromisoformat(last)).total_seconds() >= interval:
+                    due.append((database, name))
+        return due
+
+    def run_task(self, connection, name, database='main'):
+        """Run one task on ``database`` now and record the outcome.
+
+        ``connection`` is a maintenance connection to the main database, where
+        the outcome is recorded; other databases get a connection of their own.
+        """
+        started = datetime.utcnow()
+        clock = time.perf_counter()
+        target = connection
+        try:
+            if database != 'main':
+                target = self.connect(database)
+            status, detail = RUNNERS[name](target)
+        except sqlite3.Error as e:
+            status, detail = 'failed', str(e)
+        finally:
+            if target is not connection:
+                target.close()
+        duration_ms = int((time.perf_counter() - clock) * 1000)
+        connection.execute('''
+            INSERT INTO maintenance_runs (database, task, status, detail, started_at, finished_at, duration_ms, holder)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (database, task) DO UPDATE SET status = excluded.status, detail = excluded.detail,
+                started_at = excluded.started_at, finished_at = excluded.finished_at,
+                duration_ms = excluded.duration_ms, holder = excluded.holder
+        ''', (database, name, status, detail, started.isoformat(), datetime.utcnow().isoformat(), duration_ms,
+              self.holder))
+        return {'database': database, 'task': name, 'status': status, 'detail': detail, 'duration_ms': duration_ms}
+
+    def run_due(self, connection):
+        """One scheduler tick: run whatever is due if this process leads."""
+        if not self._acquire_lease(connection):
+            return []
+        results = []
+        for database, name in self.due_tasks(connection):
+            if self._stop.is_set():
+                break
+            results.append(self.run_task(connection, name, database))
+        return results
+
+    def _run(self):
+        connection = self.connect()
+        try:
+            # First tick is delayed so startup is not slowed down
+            while not self._stop.wait(self.tick_seconds()):
+                try:
+                    self.run_due(connection)
+                except sqlite3.Error:
+                    # Busy or locked: try again on the next tick
+                    pass
+        finally:
+            connection.close()
+
+    def status(self):
+        lease = db.execute('SELECT holder, expires_at FROM maintenance_lease WHERE name = ?',
+                           (LEASE_NAME,)).fetchone()
+        runs = {(row['database'], row['task']): dict(row) for row in db.execute('SELECT * FROM maintenance_runs')}
+        databases = list(self.databases())
+        databases += sorted({database for database, _ in runs if database not in databases})
+        return {
+            'enabled': self.enabled,
+            'window': os.getenv('MAINTENANCE_WINDOW', '02:00-05:00') or None,
+            'leader': {
+                'holder': lease['holder'],
+                'expires_at': datetime.utcfromtimestamp(lease['expires_at']).isoformat(),
+                'is_this_process': lease['holder'] == self.holder
+            } if lease else None,
+            'tasks': [
+                dict(runs.get((database, name), {'database': database, 'task': name, 'status': 'never_run'}),
+                     interval_seconds=task_interval(name) if name in TASKS else None)
+                for database in databases
+                for name in list(TASKS) + [name for db_name, name in runs if db_name == database and name not in TASKS]
+            ]
+        }
+
+
+# Global scheduler instance
+maintenance_scheduler = MaintenanceScheduler()
@@ -0,0 +1,170 @@
+"""Password hashing on a bounded process pool.
+
+Hashes are stored as ``<algorithm>$<params>$<salt hex>$<hash hex>``, e.g.
+``scrypt$n=16384,r=8,p=1$...$...``. Key derivation is deliberately slow, so
+it runs in worker processes: request threads only wait on a future, and one
+login storm cannot hold the GIL for every other request.
+
+Hashes written by the original implementation (32 hex chars of salt followed
+by a salted SHA-256 digest) are still accepted; ``needs_rehash`` reports them
+so callers can upgrade them after a successful login.
+
+Configuration (environment variables):
+
+- ``PASSWORD_HASH_ALGORITHM``: ``scrypt`` (default) or ``pbkdf2_sha256``
+- ``PASSWORD_SCRYPT_N`` / ``PASSWORD_SCRYPT_R`` / ``PASSWORD_SCRYPT_P``
+- ``PASSWORD_PBKDF2_ITERATIONS``
+- ``PASSWORD_HASH_WORKERS``: pool size; ``0`` hashes inline
+- ``PASSWORD_HASH_MAX_PENDING``: hashes queued before callers block
+"""
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+ALGORITHMS = ('scrypt', 'pbkdf2_sha256')
+
+
+def _default_workers():
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def current_parameters():
+    """Return ``(algorithm, params)`` for newly created hashes."""
+    algorithm = os.getenv('PASSWORD_HASH_ALGORITHM', 'scrypt')
+    if algorithm == 'scrypt':
+        return algorithm, {
+            'n': int(os.getenv('PASSWORD_SCRYPT_N', 2 ** 14)),
+            'r': int(os.getenv('PASSWORD_SCRYPT_R', 8)),
+            'p': int(os.getenv('PASSWORD_SCRYPT_P', 1)),
+        }
+    if algorithm == 'pbkdf2_sha256':
+        return algorithm, {'i': int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 600000))}
+    raise ValueError(f'Unsupported password hash algorithm: {algorithm}')
+
+
+def _derive(algorithm, params, password, salt):
+    """Run the KDF; executed inside the worker processes."""
+    if algorithm == 'scrypt':
+        n, r, p = params['n'], params['r'], params['p']
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p + (1 << 20), dklen=32)
+    if algorithm == 'pbkdf2_sha256':
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params['i'])
+    raise ValueError(f'Unsupported password hash algorithm: {algorithm}')
+
+
+class PasswordHasher:
+    def __init__(self, workers=None, max_pending=None):
+        # Resolved lazily so settings loaded from .env after import still apply
+        self._workers = workers
+        self._max_pending = max_pending
+        self._pending = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    @property
+    def workers(self):
+        if self._workers is None:
+            self._workers = int(os.getenv('PASSWORD_HASH_WORKERS', _default_workers()))
+        return self._workers
+
+    def _get_executor(self):
+        # Pools do not survive fork (e.g. gunicorn --preload); rebuild per process.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                # Forking a process that runs other threads can copy locks they
+                # hold, so fork only while this is the only thread (see
+                # ``start``); otherwise workers start fresh interpreters.
+                methods = multiprocessing.get_all_start_methods()
+                if 'fork' in methods and threading.active_count() == 1:
+                    method = 'fork'
+                else:
+                    method = 'forkserver' if 'forkserver' in methods else 'spawn'
+                context = multiprocessing.get_context(method)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._executor_pid = os.getpid()
+                max_pending = self._max_pending or int(os.getenv('PASSWORD_HASH_MAX_PENDING', self.workers * 8))
+                self._pending = threading.BoundedSemaphore(max_pending)
+            return self._executor
+
+    def start(self):
+        """Start the worker processes now.
+
+        Call before the app starts any threads: forked workers are cheap and
+        do not re-import ``__main__``, which spawned ones do.
+        """
+        if self.workers > 0:
+            # Forking pools launch every worker on the first submit
+            self._get_executor().submit(os.getpid).result()
+
+    def _run(self, algorithm, params, password, salt):
+        if self.workers <= 0:
+            return _derive(algorithm, params, password, salt)
+        executor = self._get_executor()
+        with self._pending:
+            return executor.submit(_derive, algorithm, params, password, salt).result()
+
+    def hash(self, password):
+        algorithm, params = current_parameters()
+        salt = secrets.token_bytes(16)
+        digest = self._run(algorithm, params, password, salt)
+        encoded_params = ','.join(f'{key}={value}' for key, value in params.items())
+        return f'{algorithm}${encoded_params}${salt.hex()}${digest.hex()}'
+
+    def verify(self, password, stored_hash):
+        if not stored_hash:
+            return False
+
+        if '$' not in stored_hash:
+            return self._verify_legacy(password, stored_hash)
+
+        try:
+            algorithm, encoded_params, salt, expected = stored_hash.split('$')
+            params = {key: int(value) for key, value in
+                      (item.split('=') for item in encoded_params.split(','))}
+        except ValueError:
+            return False
+        if algorithm not in ALGORITHMS:
+            return False
+
+        digest = self._run(algorithm, params, password, bytes.fromhex(salt))
+        return hmac.compare_digest(digest.hex(), expected)
+
+    def verify_dummy(self, password):
+        """Take as long as ``verify`` against a current hash; always False."""
+        algorithm, params = current_parameters()
+        self._run(algorithm, params, password, secrets.token_bytes(16))
+        return False
+
+    @staticmethod
+    def _verify_legacy(password, stored_hash):
+        if len(stored_hash) < 32:
+            return False
+        salt = stored_hash[:32]
+        expected = stored_hash[32:]
+        digest = hashlib.sha256((password + salt).encode()).hexdigest()
+        return hmac.compare_digest(digest, expected)
+
+    @staticmethod
+    def needs_rehash(stored_hash):
+        """True when the hash is legacy or uses other algorithm parameters."""
+        if not stored_hash or '$' not in stored_hash:
+            return True
+        algorithm, params = current_parameters()
+        encoded_params = ','.join(f'{key}={value}' for key, value in params.items())
+        return not stored_hash.startswith(f'{algorithm}${encoded_params}$')
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global hasher instance
+password_hasher = PasswordHasher()
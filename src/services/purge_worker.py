@@ -0,0 +1,74 @@
+"""Background thread that works through queued user purges.
+
+The thread runs only while there is work: ``wake`` starts it after a job is
+queued and ``resume`` restarts it on startup if jobs were left unfinished.
+It uses its own database connection and pauses between batches so request
+writers get the write lock in between.
+
+Configuration: ``PURGE_BATCH_SIZE`` (websites per transaction, default 100),
+``PURGE_BATCH_PAUSE`` (seconds between batches, default 0.05) and
+``PURGE_RETRY_DELAY`` (seconds before retrying a failed batch, default 5).
+"""
+import os
+import threading
+import time
+
+from src.models.database import db_instance
+from src.models.purge_job import PurgeJob
+
+
+class PurgeWorker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        """Make sure a worker thread is running."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='purge-worker', daemon=True)
+                self._thread.start()
+
+    def resume(self):
+        """Restart unfinished purges, e.g. after a crash."""
+        if PurgeJob.unfinished():
+            self.wake()
+
+    def _next_user_id(self, connection):
+        # Exit decision and wake() share the lock so a job queued right now
+        # either is seen here or starts a new thread
+        with self._lock:
+            user_ids = PurgeJob.unfinished(connection)
+            if not user_ids:
+                self._thread = None
+                return None
+            return user_ids[0]
+
+    def _run(self):
+        connection = db_instance.connect()
+        batch_size = int(os.getenv('PURGE_BATCH_SIZE', 100))
+        pause = float(os.getenv('PURGE_BATCH_PAUSE', 0.05))
+        retry_delay = float(os.getenv('PURGE_RETRY_DELAY', 5))
+        try:
+            while True:
+                user_id = self._next_user_id(connection)
+                if user_id is None:
+                    return
+                try:
+                    PurgeJob.run_batch(connection, user_id, batch_size)
+                    time.sleep(pause)
+                except Exception as e:
+                    try:
+                        PurgeJob.record_error(connection, user_id, e)
+                    except Exception:
+                        pass
+                    time.sleep(retry_delay)
+        finally:
+            connection.close()
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+
+# Global worker instance
+purge_worker = PurgeWorker()
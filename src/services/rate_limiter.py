@@ -0,0 +1,200 @@
+"""Token-bucket admission control for expensive or abusable endpoints.
+
+Each limit is ``capacity`` requests refilled continuously over ``period``
+seconds (a sliding window without per-request timestamps). Buckets are keyed
+by limit name plus client IP and, when a valid JWT is present, user id.
+
+Two storage backends are available:
+
+- in-process (default): an LRU-bounded dict guarded by a lock; limits apply
+  per worker process.
+- SQLite (``RATE_LIMIT_STORAGE=sqlite:///path/to/ratelimit.db``): one atomic
+  UPSERT per check in a small WAL database shared by every worker on the
+  host. Buckets that have refilled to capacity are deleted every
+  ``RATE_LIMIT_PRUNE_SECONDS`` (default 60), since a missing bucket is full.
+
+Configuration: ``RATE_LIMIT_ENABLED`` (default on), ``RATE_LIMIT_<NAME>`` as
+``<requests>/<seconds>`` (e.g. ``RATE_LIMIT_LOGIN=10/60``) and
+``RATE_LIMIT_MAX_KEYS`` for the in-process backend.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, jsonify
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+DEFAULT_LIMITS = {
+    'login': '10/60',
+    'signup': '5/60',
+    'generate': '30/60',
+}
+
+
+def parse_limit(spec):
+    """Parse ``"<requests>/<seconds>"`` into ``(capacity, refill_per_second)``."""
+    count, _, period = spec.partition('/')
+    capacity = float(count)
+    return capacity, capacity / float(period or 1)
+
+
+class MemoryBackend:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, now):
+        """Take one token; returns ``(allowed, tokens_left)``."""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed, tokens
+
+    def prune(self, name, capacity, rate, now):
+        """Nothing to do; ``max_keys`` already bounds the dict."""
+
+
+class SQLiteBackend:
+    def __init__(self, path, prune_seconds=60):
+        self.path = path
+        self.prune_seconds = prune_seconds
+        self._local = threading.local()
+        self._pruned = {}
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    allowed INTEGER NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            self._local.connection = connection
+        return connection
+
+    def consume(self, key, capacity, rate, now):
+        # Refill, test and take in one statement so concurrent workers cannot
+        # both spend the last token.
+        row = self._connection().execute('''
+            INSERT INTO buckets (key, tokens, updated, allowed) VALUES (?1, ?2 - 1, ?4, 1)
+            ON CONFLICT (key) DO UPDATE SET
+                allowed = MIN(?2, tokens + (?4 - updated) * ?3) >= 1,
+                tokens = MIN(?2, tokens + (?4 - updated) * ?3)
+                         - (MIN(?2, tokens + (?4 - updated) * ?3) >= 1),
+                updated = ?4
+            RETURNING allowed, tokens
+        ''', (key, capacity, rate, now)).fetchone()
+        return bool(row[0]), row[1]
+
+    def prune(self, name, capacity, rate, now):
+        """Delete the ``name`` buckets that have refilled to ``capacity``.
+
+        Runs at most once per ``prune_seconds`` per limit in this process.
+        """
+        with self._lock:
+            if now - self._pruned.get(name, 0) < self.prune_seconds:
+                return
+            self._pruned[name] = now
+        # Keys of a limit sort between '<name>:' and '<name>;'
+        self._connection().execute('''
+            DELETE FROM buckets
+            WHERE key >= ?1 || ':' AND key < ?1 || ';'
+              AND tokens + (?4 - updated) * ?3 >= ?2
+        ''', (name, capacity, rate, now))
+
+
+class RateLimiter:
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return os.getenv('RATE_LIMIT_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+    @property
+    def backend(self):
+        with self._lock:
+            if self._backend is None:
+                storage = os.getenv('RATE_LIMIT_STORAGE', 'memory')
+                if storage.startswith('sqlite:///'):
+                    self._backend = SQLiteBackend(storage[len('sqlite:///'):],
+                                                  float(os.getenv('RATE_LIMIT_PRUNE_SECONDS', 60)))
+                else:
+                    self._backend = MemoryBackend(int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000)))
+            return self._backend
+
+    @staticmethod
+    def limit_for(name):
+        return parse_limit(os.getenv(f'RATE_LIMIT_{name.upper()}', DEFAULT_LIMITS.get(name, '60/60')))
+
+    def check(self, name, keys):
+        """Consume a token from every bucket in ``keys``.
+
+        Returns ``None`` when allowed, otherwise the number of seconds until
+        the most depleted bucket has a token again.
+        """
+        capacity, rate = self.limit_for(name)
+        now = time.time()
+        retry_after = None
+        for key in keys:
+            allowed, tokens = self.backend.consume(f'{name}:{key}', capacity, rate, now)
+            if not allowed:
+                wait = (1 - tokens) / rate if rate else 60
+                retry_after = max(retry_after or 0, wait)
+        self.backend.prune(name, capacity, rate, now)
+        return retry_after
+
+
+# Global limiter instance
+rate_limiter = RateLimiter()
+
+
+def _client_keys():
+    keys = [f'ip:{request.remote_addr or "unknown"}']
+    try:
+        if verify_jwt_in_request(optional=True):
+            keys.append(f'user:{get_jwt_identity()}')
+    except Exception:
+        # Invalid tokens are rejected by the route's own auth decorator
+        pass
+    return keys
+
+
+def rate_limit(name):
+    """Decorator throttling a route with the ``name`` limit.
+
+    Place it above the auth decorators so floods are rejected before any
+    database or password work is done.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if rate_limiter.enabled:
+                retry_after = rate_limiter.check(name, _client_keys())
+                if retry_after is not None:
+                    response = jsonify({'error': 'Too many requests, please retry later'})
+                    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                    return response, 429
+            return current_app.ensure_sync(f)(*args, **kwargs)
+        return decorated_function
+    return decorator
@@ -0,0 +1,318 @@
+"""Host-wide cache shared by every worker process.
+
+``SHARED_CACHE`` selects the store:
+
+- unset (default): no caching, every lookup goes to the database.
+- ``memory``: an LRU dict in each process, for single-worker setups and tests.
+- ``sqlite:///path/to/cache.db``: a small WAL database on local disk that
+  every worker on the host reads and writes, so a value loaded by one worker
+  is a hit for all of them.
+
+Entries expire after ``SHARED_CACHE_TTL`` seconds (default 300). Once the
+stored values exceed ``SHARED_CACHE_MAX_BYTES`` (default 64 MiB), expired
+and least recently used entries are evicted first; recency is refreshed at
+most every ``TOUCH_INTERVAL`` seconds so reads rarely write.
+
+Invalidation is by tag: an entry is stored with the generation of its tag
+(e.g. ``website:42``) and ``invalidate`` bumps that generation in the shared
+store, which every worker sees on its next lookup. Loaders read the
+generation before the database, so a value loaded while another worker
+invalidates it is never served. Values must be JSON-serialisable; bytes are
+allowed.
+"""
+import base64
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src.services import json_codec
+
+TOUCH_INTERVAL = 30
+
+
+def _default(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'__bytes__': base64.b64encode(bytes(value)).decode()}
+    raise TypeError(f'{type(value).__name__} is not cacheable')
+
+
+def _restore(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and '__bytes__' in value:
+            return base64.b64decode(value['__bytes__'])
+        return {key: _restore(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_restore(item) for item in value]
+    return value
+
+
+def dumps(value):
+    return json_codec.dumps_bytes(value, default=_default)
+
+
+def loads(data):
+    return _restore(json_codec.loads(data))
+
+
+class MemoryBackend:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, key, tag, now):
+        """``(data or None, generation of tag)``."""
+        with self._lock:
+            generation = self._generations.get(tag, 0)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, generation
+            data, expires_at, entry_tag, entry_generation = entry
+            if expires_at <= now or entry_tag != tag or entry_generation != generation:
+                return None, generation
+            self._entries.move_to_end(key)
+            return data, generation
+
+    def store(self, key, data, expires_at, tag, generation):
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key)[0])
+            self._entries[key] = (data, expires_at, tag, generation)
+            self._size += len(data)
+            while self._size > self.max_bytes and self._entries:
+                self._size -= len(self._entries.popitem(last=False)[1][0])
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._size -= len(entry[0])
+
+    def invalidate(self, tags, now):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._size = 0
+
+    def usage(self):
+        with self._lock:
+            return len(self._entries), self._size
+
+
+class SQLiteBackend:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    tag TEXT,
+                    generation INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at);
+                CREATE TABLE IF NOT EXISTS tags (
+                    tag TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                ) WITHOUT ROWID;
+                -- Total size of the stored values, kept by triggers
+                CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 1), bytes INTEGER NOT NULL);
+                INSERT OR IGNORE INTO usage (id, bytes) VALUES (1, 0);
+                CREATE TRIGGER IF NOT EXISTS entries_usage_insert AFTER INSERT ON entries BEGIN
+                    UPDATE usage SET bytes = bytes + length(new.value) WHERE id = 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS entries_usage_update AFTER UPDATE OF value ON entries BEGIN
+                    UPDATE usage SET bytes = bytes + length(new.value) - length(old.value) WHERE id = 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS entries_usage_delete AFTER DELETE ON entries BEGIN
+                    UPDATE usage SET bytes = bytes - length(old.value) WHERE id = 1;
+                END;
+            ''')
+            self._local.connection = connection
+        return connection
+
+    def lookup(self, key, tag, now):
+        connection = self._connection()
+        row = connection.execute('''
+            SELECT COALESCE((SELECT generation FROM tags WHERE tag = ?1), 0),
+                   e.value, e.tag IS ?1 AND e.generation = COALESCE((SELECT generation FROM tags WHERE tag = ?1), 0)
+                            AND e.expires_at > ?3,
+                   e.accessed_at
+            FROM (SELECT 1) LEFT JOIN entries e ON e.key = ?2
+        ''', (tag, key, now)).fetchone()
+        generation, data, valid, accessed_at = row
+        if not valid:
+            return None, generation
+        if now - accessed_at > TOUCH_INTERVAL:
+            connection.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+        return data, generation
+
+    def store(self, key, data, expires_at, tag, generation):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('''
+            INSERT INTO entries (key, value, tag, generation, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, tag = excluded.tag,
+                generation = excluded.generation, expires_at = excluded.expires_at,
+                accessed_at = excluded.accessed_at
+        ''', (key, data, tag, generation, expires_at, now))
+        if connection.execute('SELECT bytes FROM usage').fetchone()[0] > self.max_bytes:
+            self._evict(connection, now)
+
+    def _evict(self, connection, now):
+        # Down to 90% so the next few stores do not evict again
+        target = self.max_bytes * 0.9
+        while connection.execute('SELECT bytes FROM usage').fetchone()[0] > target:
+            deleted = connection.execute('''
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entries ORDER BY expires_at > ?, accessed_at LIMIT 100
+                )
+            ''', (now,)).rowcount
+            if not deleted:
+                break
+        # A tag idle for longer than any entry can live has no valid entries left
+        connection.execute('DELETE FROM tags WHERE updated_at < ?', (now - 2 * SharedCache.ttl(),))
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def invalidate(self, tags, now):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('''
+                INSERT INTO tags (tag, generation, updated_at) VALUES (?, 1, ?)
+                ON CONFLICT (tag) DO UPDATE SET generation = generation + 1, updated_at = excluded.updated_at
+            ''', [(tag, now) for tag in tags])
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute('DELETE FROM entries')
+        connection.execute('DELETE FROM tags')
+
+    def usage(self):
+        connection = self._connection()
+        return (connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0],
+                connection.execute('SELECT bytes FROM usage').fetchone()[0])
+
+
+class SharedCache:
+    def __init__(self):
+        self._backend = None
+        self._configured = False
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'errors': 0}
+
+    @staticmethod
+    def ttl():
+        return float(os.getenv('SHARED_CACHE_TTL', 300))
+
+    @property
+    def backend(self):
+        """The configured store, or None when caching is off."""
+        if not self._configured:
+            with self._lock:
+                if not self._configured:
+                    storage = os.getenv('SHARED_CACHE', '')
+                    max_bytes = int(os.getenv('SHARED_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+                    if storage.startswith('sqlite:///'):
+                        self._backend = SQLiteBackend(storage[len('sqlite:///'):], max_bytes)
+                    elif storage == 'memory':
+                        self._backend = MemoryBackend(max_bytes)
+                    self._configured = True
+        return self._backend
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get_or_load(self, key, loader, tag=None):
+        """Cached value of ``key``, calling ``loader`` on a miss.
+
+        ``None`` results are not cached. Database rows must be returned as
+        dicts. Errors of the cache store are
+        counted and fall back to ``loader``, so the cache can never take
+        the app down.
+        """
+        backend = self.backend
+        if backend is None:
+            return loader()
+        now = time.time()
+        try:
+            data, generation = backend.lookup(key, tag, now)
+        except Exception:
+            self._count('errors')
+            return loader()
+        if data is not None:
+            self._count('hits')
+            return loads(data)
+
+        self._count('misses')
+        value = loader()
+        if value is not None:
+            try:
+                backend.store(key, dumps(value), now + self.ttl(), tag, generation)
+            except Exception:
+                self._count('errors')
+        return value
+
+    def delete(self, key):
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def invalidate(self, *tags):
+        """Make entries stored under any of ``tags`` stale in every worker.
+
+        Called after the database write committed, so a failing cache store
+        is counted rather than raised; entries still expire with the TTL.
+        """
+        if self.backend is None or not tags:
+            return
+        try:
+            self.backend.invalidate(tags, time.time())
+        except Exception:
+            self._count('errors')
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._counters)
+        backend = self.backend
+        metrics['enabled'] = backend is not None
+        if backend is not None:
+            metrics['entries'], metrics['bytes'] = backend.usage()
+            metrics['max_bytes'] = backend.max_bytes
+        return metrics
+
+
+# Global cache instance
+shared_cache = SharedCache()
@@ -0,0 +1,248 @@
+"""Section templates for generated websites, loaded from data files.
+
+Every ``*.json`` file in ``CONTENT_TEMPLATE_DIR`` (default
+``src/generation_templates``) describes one vertical::
+
+    {"name": "restaurant", "priority": 30,
+     "business_types": ["restaurant", "food"], "industries": [],
+     "sections": {"services": ["We offer delicious {industry_lower} cuisine ..."]}}
+
+``default.json`` has no keywords and must define every section; the order of
+its sections is the order of generated content. Other verticals override
+the sections they list. Templates are ``str.format`` strings over
+``company_name``, ``business_type``, ``industry``, their ``_lower`` forms and
+``additional_info``; they are parsed and checked when loaded.
+
+Keywords are normalised (lower case, words, trailing plural ``s`` dropped)
+into one index, so finding the verticals for a request costs a few dict
+lookups however many verticals exist. Business type matches win over
+industry matches, then higher ``priority``. Without a seed, generation uses
+the first variant of each section; with one, the variant is picked by a
+stable hash of the seed and section name.
+
+Files are checked for changes at most every ``CONTENT_TEMPLATE_RELOAD``
+seconds (default 2) and reloaded in place. A directory that fails to load
+leaves the previous templates active and is reported in ``metrics()``.
+"""
+import os
+import re
+import string
+import threading
+import time
+import zlib
+
+from src.services import json_codec
+
+FIELDS = ('company_name', 'business_type', 'industry', 'business_type_lower', 'industry_lower',
+          'additional_info')
+_formatter = string.Formatter()
+
+
+def _default_dir():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'generation_templates')
+
+
+def normalize(text):
+    """Keyword tokens of ``text``: lower-case words without a trailing plural ``s``."""
+    words = re.findall(r'[a-z0-9]+', (text or '').lower())
+    return [word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+            for word in words]
+
+
+def _phrases(text, max_words):
+    """Every run of up to ``max_words`` consecutive keyword tokens of ``text``."""
+    words = normalize(text)
+    return {' '.join(words[start:start + size])
+            for size in range(1, max_words + 1) for start in range(len(words) - size + 1)}
+
+
+class Template:
+    __slots__ = ('source',)
+
+    def __init__(self, source):
+        for _, field, _, _ in _formatter.parse(source):
+            if field is not None and field not in FIELDS:
+                raise ValueError(f'unknown placeholder {{{field}}}')
+        self.source = source
+
+    def render(self, values):
+        return self.source.format_map(values)
+
+
+class Vertical:
+    def __init__(self, name, priority, sections, business_types, industries):
+        self.name = name
+        self.priority = priority
+        self.sections = sections
+        self.business_types = business_types
+        self.industries = industries
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            data = json_codec.loads(f.read())
+        name = data.get('name') or os.path.splitext(os.path.basename(path))[0]
+        sections = {}
+        for section, variants in (data.get('sections') or {}).items():
+            if isinstance(variants, str):
+                variants = [variants]
+            if not variants:
+                raise ValueError(f'{name}: section {section!r} has no variants')
+            try:
+                sections[section] = [Template(variant) for variant in variants]
+            except ValueError as e:
+                raise ValueError(f'{name}: section {section!r}: {e}')
+        return Vertical(name, int(data.get('priority', 0)), sections,
+                        [' '.join(normalize(keyword)) for keyword in data.get('business_types', [])],
+                        [' '.join(normalize(keyword)) for keyword in data.get('industries', [])])
+
+
+class TemplateRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._counters = {'reloads': 0, 'failed_reloads': 0}
+        self._last_error = None
+
+    @staticmethod
+    def directory():
+        return os.getenv('CONTENT_TEMPLATE_DIR') or _default_dir()
+
+    @staticmethod
+    def reload_interval():
+        return float(os.getenv('CONTENT_TEMPLATE_RELOAD', 2))
+
+    def _scan(self):
+        directory = self.directory()
+        with os.scandir(directory) as entries:
+            return directory, tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                                           for entry in entries if entry.name.endswith('.json')))
+
+    @staticmethod
+    def _build(directory, files):
+        verticals = [Vertical.load(os.path.join(directory, name)) for name, _, _ in files]
+        default = next((vertical for vertical in verticals if vertical.name == 'default'), None)
+        if default is None:
+            raise ValueError(f'{directory} has no default.json')
+        index = ({}, {})
+        max_words = 1
+        for vertical in verticals:
+            for lookup, keywords in zip(index, (vertical.business_types, vertical.industries)):
+                for keyword in keywords:
+                    lookup.setdefault(keyword, []).append(vertical)
+                    max_words = max(max_words, keyword.count(' ') + 1)
+        return {'default': default, 'index': index, 'max_words': max_words, 'verticals': len(verticals)}
+
+    def _current(self):
+        """The loaded templates, reloading them first if the files changed."""
+        now = time.monotonic()
+        if self._state is not None and now - self._checked_at < self.reload_interval():
+            return self._state
+        with self._lock:
+            if self._state is not None and now - self._checked_at < self.reload_interval():
+                return self._state
+            try:
+                directory, files = self._scan()
+                if (directory, files) != self._signature:
+                    self._state = self._build(directory, files)
+                    self._signature = (directory, files)
+                    self._counters['reloads'] += 1
+                    self._last_error = None
+            except Exception as e:
+                self._counters['failed_reloads'] += 1
+                self._last_error = str(e)
+                if self._state is None:
+                    raise
+            self._checked_at = now
+            return self._state
+
+    def reload(self):
+        """Load the files now, e.g. after editing them; raises if they are invalid."""
+        with self._lock:
+            self._checked_at = 0.0
+            self._signature = None
+        self._current()
+        if self._last_error:
+            raise ValueError(self._last_error)
+
+    def verticals_for(self, business_type, industry):
+        """Matching vertical names, most specific first (without ``default``)."""
+        return [vertical.name for vertical in self._candidates(self._current(), business_type, industry)]
+
+    @staticmethod
+    def _candidates(state, business_type, industry):
+        # Best match per vertical: (0 for business type, 1 for industry), then priority
+        ranks = {}
+        for rank, (lookup, text) in enumerate(zip(state['index'], (business_type, industry))):
+            for phrase in _phrases(text, state['max_words']):
+                for vertical in lookup.get(phrase, ()):
+                    ranks.setdefault(vertical.name, (rank, -vertical.priority, vertical.name, vertical))
+        return [match[3] for match in sorted(ranks.values(), key=lambda match: match[:3])]
+
+    @staticmethod
+    def _values(company_name, business_type, industry, additional_info):
+        return {'company_name': company_name, 'business_type': business_type, 'industry': industry,
+                'business_type_lower': business_type.lower(), 'industry_lower': industry.lower(),
+                'additional_info': additional_info or ''}
+
+    @staticmethod
+    def _variants(state, candidates, section):
+        for vertical in candidates:
+            if section in vertical.sections:
+                return vertical.sections[section]
+        return state['default'].sections.get(section)
+
+    @staticmethod
+    def _pick(variants, seed, section):
+        return 0 if seed is None else zlib.crc32(f'{seed}:{section}'.encode()) % len(variants)
+
+    def sections(self):
+        """Section names in content order."""
+        return list(self._current()['default'].sections)
+
+    def generate(self, business_type, industry, company_name='Your Company', additional_info='', seed=None):
+        """Content dict for a new website."""
+        state = self._current()
+        candidates = self._candidates(state, business_type, industry)
+        values = self._values(company_name, business_type, industry, additional_info)
+        content = {}
+        for section in state['default'].sections:
+            variants = self._variants(state, candidates, section)
+            content[section] = variants[self._pick(variants, seed, section)].render(values)
+        return content
+
+    def regenerate(self, section, current, business_type, industry, company_name, seed):
+        """New text for ``section`` that differs from ``current`` when another variant exists.
+
+        The matching vertical's variants are tried first, then the default
+        ones, so a vertical with a single variant still yields new text.
+        Returns ``current`` when no template renders anything else, and None
+        for sections no template defines.
+        """
+        state = self._current()
+        variants = self._variants(state, self._candidates(state, business_type, industry), section)
+        if not variants:
+            return None
+        pools = [variants]
+        fallback = state['default'].sections.get(section)
+        if fallback and fallback is not variants:
+            pools.append(fallback)
+        values = self._values(company_name, business_type, industry, '')
+        for pool in pools:
+            index = self._pick(pool, seed, section)
+            for step in range(len(pool)):
+                text = pool[(index + step) % len(pool)].render(values)
+                if text != current:
+                    return text
+        return current
+
+    def metrics(self):
+        state = self._state
+        return dict(self._counters, verticals=state['verticals'] if state else 0,
+                    directory=self.directory(), last_error=self._last_error)
+
+
+# Global registry instance
+template_registry = TemplateRegistry()
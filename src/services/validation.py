@@ -0,0 +1,207 @@
+"""Declarative validation of JSON request bodies.
+
+Every payload the API accepts is described once below as a ``pydantic_core``
+schema and compiled into a validator the first time it is used. Parsing and
+validation then happen in a single pass over the raw body, so handlers only
+ever see well-formed data within the size limits, and nothing oversized is
+handed to the models or SQLite.
+
+``parse_body(name)`` returns ``(data, None)`` or ``(None, response)``. Bodies
+declaring more than ``REQUEST_MAX_BYTES`` (default 1 MiB) are refused with
+413 before any of them is read; invalid ones get 400 with the first problem in
+``error`` and all of them in ``errors`` (``field`` and ``message`` each).
+Website content may have up to ``CONTENT_MAX_SECTIONS`` sections (default
+100); text inside a section is limited to ``CONTENT_SECTION_MAX_LENGTH``
+characters (default 65536). A bulk clone makes at most ``CLONE_MAX_COPIES``
+copies (default 1000). Unknown fields are ignored.
+"""
+import os
+from functools import lru_cache
+
+from flask import request, jsonify
+from pydantic_core import SchemaValidator, ValidationError, core_schema as cs
+
+EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+ROLES = ['admin', 'editor', 'viewer']
+TITLE_MAX_LENGTH = 200
+NAME_MAX_LENGTH = 100
+# Hashing cost grows with the password length, so it is capped too
+PASSWORD_MAX_LENGTH = 1024
+
+
+class RequestValidationError(ValueError):
+    """A payload did not match its schema; ``errors`` lists ``{'field', 'message'}``."""
+
+    def __init__(self, errors):
+        first = errors[0]
+        super().__init__(f"{first['field']}: {first['message']}" if first['field'] else first['message'])
+        self.errors = errors
+
+
+def _text(max_length, min_length=1):
+    return cs.str_schema(min_length=min_length, max_length=max_length)
+
+
+def _optional(schema):
+    return cs.typed_dict_field(schema, required=False)
+
+
+def _email():
+    return cs.custom_error_schema(cs.str_schema(pattern=EMAIL_PATTERN, max_length=254),
+                                  custom_error_type='email_invalid',
+                                  custom_error_message='Invalid email format')
+
+
+def _role():
+    return cs.literal_schema(ROLES)
+
+
+def _json_type(value):
+    # Union tags start with '#' so error locations can leave them out
+    if isinstance(value, dict):
+        return '#object'
+    if isinstance(value, list):
+        return '#array'
+    if isinstance(value, str):
+        return '#string'
+    return '#scalar'
+
+
+def _content(sections_only=False):
+    """A dict of sections (or a plain string, as imports allow), within the size limits."""
+    section_length = int(os.getenv('CONTENT_SECTION_MAX_LENGTH', 65536))
+    max_sections = int(os.getenv('CONTENT_MAX_SECTIONS', 100))
+    section = cs.definition_reference_schema('section')
+    value = cs.tagged_union_schema({
+        '#string': cs.str_schema(max_length=section_length),
+        '#scalar': cs.union_schema([cs.int_schema(strict=True), cs.float_schema(strict=True),
+                                    cs.bool_schema(strict=True), cs.none_schema()]),
+        '#array': cs.list_schema(section, max_length=max_sections),
+        '#object': cs.dict_schema(cs.str_schema(max_length=NAME_MAX_LENGTH), section, max_length=max_sections),
+    }, discriminator=_json_type, ref='section')
+    sections = cs.dict_schema(cs.str_schema(max_length=NAME_MAX_LENGTH), section, max_length=max_sections)
+    if sections_only:
+        return cs.definitions_schema(sections, [value])
+    content = cs.tagged_union_schema({
+        '#object': sections,
+        '#string': cs.str_schema(max_length=section_length),
+    }, discriminator=_json_type, custom_error_type='content_invalid',
+        custom_error_message='content must be an object or a string')
+    return cs.definitions_schema(content, [value])
+
+
+def _website_fields():
+    return {
+        'title': cs.typed_dict_field(_text(TITLE_MAX_LENGTH)),
+        'content': _optional(_content()),
+        'business_type': _optional(cs.nullable_schema(_text(NAME_MAX_LENGTH, 0))),
+        'industry': _optional(cs.nullable_schema(_text(NAME_MAX_LENGTH, 0))),
+    }
+
+
+def _clone_fields():
+    # Sections given in ``content`` replace the original's; null removes one
+    return {
+        'title': _optional(_text(TITLE_MAX_LENGTH)),
+        'content': _optional(_content(sections_only=True)),
+    }
+
+
+def _schemas():
+    website_update = dict(_website_fields(), title=_optional(_text(TITLE_MAX_LENGTH)),
+                          version=_optional(cs.nullable_schema(cs.int_schema())))
+    return {
+        'signup': {
+            'email': cs.typed_dict_field(_email()),
+            'password': cs.typed_dict_field(_text(PASSWORD_MAX_LENGTH, 6)),
+            'username': _optional(cs.nullable_schema(_text(NAME_MAX_LENGTH))),
+            'role': _optional(_role()),
+        },
+        'login': {
+            'email': cs.typed_dict_field(_text(254)),
+            'password': cs.typed_dict_field(_text(PASSWORD_MAX_LENGTH)),
+        },
+        'website_create': _website_fields(),
+        'website_update': website_update,
+        # One NDJSON line of an import; owner and timestamps are checked by the importer
+        'website_import': dict(_website_fields(), user_id=_optional(cs.any_schema()),
+                               created_at=_optional(cs.any_schema()), updated_at=_optional(cs.any_schema())),
+        'website_clone': _clone_fields(),
+        'website_clone_bulk': {
+            'copies': cs.typed_dict_field(cs.list_schema(cs.typed_dict_schema(_clone_fields()), min_length=1,
+                                                         max_length=int(os.getenv('CLONE_MAX_COPIES', 1000)))),
+        },
+        'generate': {
+            'business_type': cs.typed_dict_field(_text(NAME_MAX_LENGTH)),
+            'industry': cs.typed_dict_field(_text(NAME_MAX_LENGTH)),
+            'company_name': _optional(_text(NAME_MAX_LENGTH)),
+            'additional_info': _optional(_text(2000, 0)),
+            'seed': _optional(cs.nullable_schema(cs.int_schema(strict=True))),
+        },
+        'regenerate': {
+            'section': _optional(_text(NAME_MAX_LENGTH)),
+            'seed': _optional(cs.nullable_schema(cs.int_schema(strict=True))),
+        },
+        'role_create': {
+            'name': cs.typed_dict_field(_text(NAME_MAX_LENGTH)),
+            'permissions': _optional(cs.list_schema(_text(NAME_MAX_LENGTH), max_length=100)),
+        },
+        'role_update': {
+            'name': _optional(_text(NAME_MAX_LENGTH)),
+            'permissions': _optional(cs.list_schema(_text(NAME_MAX_LENGTH), max_length=100)),
+        },
+        'role_assign': {
+            'user_id': cs.typed_dict_field(cs.union_schema([cs.int_schema(strict=True), _text(20)])),
+            'role': cs.typed_dict_field(_role()),
+        },
+        'user_update': {
+            'username': _optional(_text(NAME_MAX_LENGTH)),
+            'email': _optional(_email()),
+            'role': _optional(_role()),
+        },
+    }
+
+
+@lru_cache(maxsize=None)
+def validator(name):
+    """The compiled validator for payload ``name``; built once per process."""
+    return SchemaValidator(cs.typed_dict_schema(_schemas()[name]))
+
+
+def validate(name, raw):
+    """Parse and validate the JSON document ``raw`` (bytes or str); raises ``RequestValidationError``."""
+    try:
+        return validator(name).validate_json(raw)
+    except ValidationError as e:
+        raise RequestValidationError([
+            {'field': '.'.join(str(part) for part in error['loc'] if not str(part).startswith('#')),
+             'message': 'Invalid JSON' if error['type'] == 'json_invalid' else error['msg']}
+            for error in e.errors(include_url=False, include_input=False)
+        ])
+
+
+def max_body_bytes():
+    return int(os.getenv('REQUEST_MAX_BYTES', 1024 * 1024))
+
+
+def parse_body(name, required=True):
+    """Validate the current request's JSON body against payload ``name``.
+
+    Returns ``(data, None)`` or ``(None, (response, status))``. Without
+    ``required``, an empty body validates as ``{}``.
+    """
+    limit = max_body_bytes()
+    if request.content_length is not None and request.content_length > limit:
+        return None, (jsonify({'error': f'Request body exceeds {limit} bytes'}), 413)
+    raw = request.stream.read(limit + 1)
+    if len(raw) > limit:
+        return None, (jsonify({'error': f'Request body exceeds {limit} bytes'}), 413)
+
+    if not raw.strip() or raw.strip() == b'null':
+        if required:
+            return None, (jsonify({'error': 'No data provided'}), 400)
+        raw = b'{}'
+    try:
+        return validate(name, raw), None
+    except RequestValidationError as e:
+        return None, (jsonify({'error': str(e), 'errors': e.errors}), 400)
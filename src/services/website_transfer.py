@@ -0,0 +1,138 @@
+"""Streaming NDJSON export and import of websites.
+
+Both directions work one line at a time: exports read the table in keyset
+batches and imports parse the request body incrementally, inserting every
+``batch_size`` valid lines in one transaction. Memory use is bounded by the
+batch size, not by the number of websites moved.
+
+Imports report progress as NDJSON events: an ``error`` event for every line
+that could not be imported, a ``progress`` event after every committed batch
+and a final ``done`` event with the totals.
+
+Configuration: ``TRANSFER_BATCH_SIZE`` (default 500) and
+``IMPORT_MAX_LINE_BYTES`` (default 1 MiB).
+"""
+import io
+import os
+from datetime import datetime
+
+from src.models.website import Website
+from src.services import json_codec
+from src.services.validation import validate
+
+MAX_BATCH_SIZE = 5000
+
+
+def batch_size_from(value):
+    """Clamp a requested batch size, falling back to ``TRANSFER_BATCH_SIZE``."""
+    size = value or int(os.getenv('TRANSFER_BATCH_SIZE', 500))
+    return max(1, min(size, MAX_BATCH_SIZE))
+
+
+def export_lines(filters, batch_size):
+    """Yield one NDJSON line per website matching ``filters``."""
+    for website in Website.iter_filtered(batch_size, **filters):
+        yield json_codec.dumps(website.to_dict()) + '\n'
+
+
+def _read_lines(stream, max_bytes):
+    """Yield ``(line_number, line)``; ``line`` is None for over-long lines."""
+    if isinstance(stream, io.RawIOBase):
+        # The WSGI input stream is unbuffered; readline() would read byte by byte
+        stream = io.BufferedReader(stream, 64 * 1024)
+    number = 0
+    while True:
+        line = stream.readline(max_bytes + 1)
+        if not line:
+            return
+        number += 1
+        if len(line) > max_bytes:
+            # Drop the rest of the line without buffering it
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_bytes + 1)
+            yield number, None
+        else:
+            yield number, line
+
+
+def parse_website(line, user_id, allow_owner=False):
+    """Build an unsaved ``Website`` from one NDJSON line (raises ValueError)."""
+    # Same schema and size limits as POST /api/websites
+    data = validate('website_import', line)
+    title = data['title']
+    content = data.get('content', {})
+
+    owner = user_id
+    if allow_owner and data.get('user_id') is not None:
+        try:
+            owner = int(data['user_id'])
+        except (TypeError, ValueError):
+            raise ValueError('user_id must be a user id')
+
+    website = Website(
+        title=title,
+        content=content,
+        user_id=owner,
+        business_type=data.get('business_type'),
+        industry=data.get('industry')
+    )
+    for key in ('created_at', 'updated_at'):
+        if data.get(key):
+            try:
+                datetime.fromisoformat(data[key])
+            except (TypeError, ValueError):
+                raise ValueError(f'{key} must be an ISO datetime')
+            setattr(website, key, data[key])
+    return website
+
+
+def import_events(stream, user_id, allow_owner=False, batch_size=500):
+    """Import NDJSON websites from ``stream`` and yield progress events.
+
+    Only admins should get ``allow_owner``, which honours a ``user_id`` field
+    on each line; everyone else imports into their own account.
+    """
+    max_bytes = int(os.getenv('IMPORT_MAX_LINE_BYTES', 1024 * 1024))
+    totals = {'lines': 0, 'imported': 0, 'failed': 0}
+    batch = []
+
+    def flush():
+        try:
+            Website.bulk_insert([website for _, website in batch])
+            totals['imported'] += len(batch)
+        except Exception:
+            # Retry one by one so a single bad row only fails itself
+            for number, website in batch:
+                if hasattr(website, 'id'):
+                    # Committed with its shard before another shard failed
+                    totals['imported'] += 1
+                    continue
+                try:
+                    Website.bulk_insert([website])
+                    totals['imported'] += 1
+                except Exception as e:
+                    totals['failed'] += 1
+                    yield {'event': 'error', 'line': number, 'error': str(e)}
+        batch.clear()
+        yield dict(totals, event='progress')
+
+    for number, line in _read_lines(stream, max_bytes):
+        totals['lines'] = number
+        if line is None:
+            totals['failed'] += 1
+            yield {'event': 'error', 'line': number, 'error': f'Line exceeds {max_bytes} bytes'}
+            continue
+        if not line.strip():
+            continue
+        try:
+            batch.append((number, parse_website(line, user_id, allow_owner)))
+        except ValueError as e:
+            totals['failed'] += 1
+            yield {'event': 'error', 'line': number, 'error': str(e)}
+            continue
+        if len(batch) >= batch_size:
+            yield from flush()
+
+    if batch:
+        yield from flush()
+    yield dict(totals, event='done')
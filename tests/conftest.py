@@ -0,0 +1,47 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app opens its database on import: point it at a scratch file first
+os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='app-tests-'), 'app.db')
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+os.environ.setdefault('MAINTENANCE_ENABLED', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_emails = itertools.count()
+
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import app
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def signup(client):
+    """Create a user; returns ``(auth headers, user id)``."""
+    def signup(role='editor'):
+        response = client.post('/api/auth/signup', json={
+            'email': f'user{next(_emails)}@example.com', 'password': 'password123', 'role': role})
+        assert response.status_code == 201, response.get_json()
+        body = response.get_json()
+        return {'Authorization': f"Bearer {body['access_token']}"}, body['user']['id']
+    return signup
+
+
+@pytest.fixture
+def website(client, signup):
+    """A generated website and its owner's headers."""
+    headers, _ = signup()
+    response = client.post('/api/ai/generate', json={
+        'business_type': 'Bakery', 'industry': 'Retail', 'company_name': 'Acme'}, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['website'], headers
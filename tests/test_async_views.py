@@ -0,0 +1,53 @@
+"""Async views, the shared event loop behind them and the ASGI entry point."""
+import asyncio
+
+import httpx
+import pytest
+
+from src.models import aio
+
+
+def test_async_to_sync_keeps_the_callers_context_and_errors(app):
+    from flask import request
+
+    async def view():
+        await asyncio.sleep(0)
+        return request.path
+
+    async def broken():
+        raise LookupError('boom')
+
+    with app.test_request_context('/somewhere'):
+        assert aio.async_to_sync(view)() == '/somewhere'
+    with pytest.raises(LookupError):
+        aio.async_to_sync(broken)()
+
+
+def test_async_views_answer_under_wsgi(client, website):
+    site, headers = website
+    response = client.get(f"/api/websites/{site['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['website']['id'] == site['id']
+    assert client.get('/api/websites/999999', headers=headers).status_code == 404
+
+    response = client.post(f"/api/ai/regenerate/{site['id']}", json={'section': 'hero'}, headers=headers)
+    assert response.status_code == 200
+
+
+def test_asgi_app_serves_requests_side_by_side(website):
+    from src.asgi import app as asgi_app
+    site, headers = website
+
+    async def main():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            created = await client.post('/api/ai/generate', headers=headers, json={
+                'business_type': 'Cafe', 'industry': 'Food', 'company_name': 'Beans'})
+            reads = await asyncio.gather(*[client.get(f"/api/websites/{site['id']}", headers=headers)
+                                           for _ in range(10)])
+            return created, reads
+
+    created, reads = asyncio.run(main())
+    assert created.status_code == 201
+    assert created.json()['website']['title'] == 'Beans - Professional Cafe'
+    assert {response.status_code for response in reads} == {200}
@@ -0,0 +1,94 @@
+"""Storage formats of ``websites.content``: TEXT, ZC (zlib) and ZR (deduplicated sections)."""
+import pytest
+
+from src.models import content_codec
+from src.models.database import db
+
+LONG = {
+    'hero': 'Welcome to Acme, your trusted partner in Retail. ' * 4,
+    'about': 'At Acme, we are a leading bakery specializing in retail solutions. ' * 3,
+    'short': 'Hi',
+    'count': 3,
+}
+
+
+@pytest.fixture(autouse=True)
+def defaults(app, monkeypatch):
+    for name in ('CONTENT_COMPRESSION', 'CONTENT_COMPRESSION_MIN_BYTES', 'CONTENT_DEDUP', 'CONTENT_DEDUP_MIN_BYTES'):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_small_content_stays_text():
+    raw = content_codec.encode({'hero': 'Hi'})
+    assert isinstance(raw, str)
+    assert not content_codec.is_encoded(raw)
+    assert content_codec.decode(raw) == {'hero': 'Hi'}
+    assert content_codec.json_text(raw) == raw
+
+
+def test_compressed_round_trip():
+    raw = content_codec.encode(LONG, dedup=False)
+    assert content_codec.is_compressed(raw)
+    assert len(raw) < len(content_codec.json_codec.dumps(LONG))
+    assert content_codec.decode(raw) == LONG
+    assert content_codec.decode(memoryview(raw)) == LONG
+    assert content_codec.json_codec.loads(content_codec.json_text(raw)) == LONG
+
+
+def test_compression_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv('CONTENT_COMPRESSION', '0')
+    raw = content_codec.encode(LONG, dedup=False)
+    assert isinstance(raw, str)
+    assert content_codec.decode(raw) == LONG
+
+
+def test_compressed_with_a_trained_dictionary():
+    samples = [content_codec.json_codec.dumps(dict(LONG, hero=f'{LONG["hero"]} {i}')) for i in range(5)]
+    dictionary_id = content_codec.store_dictionary(content_codec.train_dictionary(samples), '2024-01-01')
+    db.commit()
+    raw = content_codec.encode(LONG, dedup=False)
+    assert content_codec.HEADER.unpack_from(raw)[2] == dictionary_id
+    assert content_codec.decode(raw) == LONG
+
+
+def test_manifest_round_trip_reads_sections_back_from_the_database():
+    raw = content_codec.encode(LONG, dedup=True)
+    assert content_codec.is_manifest(raw)
+    refs = content_codec.json_codec.loads(content_codec.sql_section_refs(raw))
+    assert set(refs) == {'hero', 'about'}
+    assert refs['hero'] == content_codec.section_hash(LONG['hero'])
+
+    content_codec._sections.clear()
+    assert content_codec.decode(raw) == LONG
+    assert content_codec.json_codec.loads(content_codec.decode_text(raw)) == LONG
+
+
+def test_manifest_is_skipped_without_large_sections():
+    raw = content_codec.encode({'hero': 'Hi'}, dedup=True)
+    assert not content_codec.is_manifest(raw)
+    assert content_codec.decode(raw) == {'hero': 'Hi'}
+
+
+@pytest.mark.parametrize('magic', [content_codec.MAGIC, content_codec.SECTION_MAGIC])
+def test_unknown_format_version_is_rejected(magic):
+    raw = content_codec.HEADER.pack(magic, content_codec.FORMAT_VERSION + 1, 0) + b'{}'
+    with pytest.raises(ValueError):
+        content_codec.decode(raw)
+    assert content_codec.json_text(raw) is None
+
+
+def test_legacy_text_and_non_json():
+    assert content_codec.decode('{"hero": "Hi"}') == {'hero': 'Hi'}
+    assert content_codec.decode(b'{"hero": "Hi"}') == {'hero': 'Hi'}
+    assert content_codec.decode('plain text') == 'plain text'
+    assert content_codec.decode(None) == {}
+    assert content_codec.json_text('plain text') is None
+
+
+def test_websites_read_back_in_every_format(signup, monkeypatch):
+    from src.models.website import Website
+    _, owner = signup()
+    for dedup in ('0', '1'):
+        monkeypatch.setenv('CONTENT_DEDUP', dedup)
+        website = Website('Site', LONG, owner).save()
+        assert Website.find_by_id(website.id, cached=False).content == LONG
@@ -0,0 +1,75 @@
+"""Token buckets, in process and shared through SQLite."""
+import pytest
+
+from src.services import rate_limiter as module
+from src.services.rate_limiter import MemoryBackend, SQLiteBackend, RateLimiter, parse_limit
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / 'ratelimit.db'), prune_seconds=0)
+
+
+def test_parse_limit():
+    assert parse_limit('10/60') == (10.0, 10 / 60)
+    assert parse_limit('5') == (5.0, 5.0)
+
+
+def test_burst_then_refill(backend):
+    capacity, rate = 3.0, 1.0  # three requests, one token a second
+    assert [backend.consume('login:ip:a', capacity, rate, 100.0)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, tokens = backend.consume('login:ip:a', capacity, rate, 100.5)
+    assert not allowed and tokens == pytest.approx(0.5)
+    assert backend.consume('login:ip:a', capacity, rate, 101.5)[0]
+    # Refills never exceed capacity
+    assert backend.consume('login:ip:a', capacity, rate, 1000.0) == (True, pytest.approx(2.0))
+
+
+def test_buckets_are_independent(backend):
+    assert backend.consume('login:ip:a', 1.0, 0.1, 100.0)[0]
+    assert not backend.consume('login:ip:a', 1.0, 0.1, 100.0)[0]
+    assert backend.consume('login:ip:b', 1.0, 0.1, 100.0)[0]
+
+
+def test_memory_backend_forgets_least_recent_keys():
+    backend = MemoryBackend(max_keys=2)
+    for key in ('a', 'b', 'c'):
+        backend.consume(key, 1.0, 0.1, 100.0)
+    assert list(backend._buckets) == ['b', 'c']
+    # A forgotten bucket starts full again
+    assert backend.consume('a', 1.0, 0.1, 100.0)[0]
+
+
+def test_sqlite_prune_deletes_only_refilled_buckets_of_the_limit(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'ratelimit.db'), prune_seconds=0)
+    backend.consume('login:ip:old', 2.0, 1.0, 100.0)
+    backend.consume('login:ip:new', 2.0, 1.0, 109.5)
+    backend.consume('signup:ip:old', 2.0, 1.0, 100.0)
+    backend.prune('login', 2.0, 1.0, 110.0)
+    keys = [row[0] for row in backend._connection().execute('SELECT key FROM buckets ORDER BY key')]
+    assert keys == ['login:ip:new', 'signup:ip:old']
+
+
+def test_check_reports_retry_after_of_the_most_depleted_key(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_GENERATE', '2/10')
+    limiter = RateLimiter()
+    limiter._backend = MemoryBackend()
+    assert limiter.check('generate', ['ip:a', 'user:1']) is None
+    assert limiter.check('generate', ['ip:a']) is None
+    retry_after = limiter.check('generate', ['ip:a', 'user:1'])
+    assert retry_after == pytest.approx(5.0, abs=0.1)
+
+
+def test_route_answers_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', '1')
+    monkeypatch.setenv('RATE_LIMIT_LOGIN', '2/60')
+    monkeypatch.setattr(module.rate_limiter, '_backend', MemoryBackend())
+    body = {'email': 'nobody@example.com', 'password': 'wrong-password'}
+    statuses = [client.post('/api/auth/login', json=body).status_code for _ in range(3)]
+    assert statuses[:2] == [401, 401]
+    assert statuses[2] == 429
+    response = client.post('/api/auth/login', json=body)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 60
@@ -0,0 +1,100 @@
+"""Delta-compressed website history: reconstruction and retention."""
+import pytest
+
+from src.models.revision import WebsiteRevision, flatten_state, unflatten_state, diff_states, apply_delta
+
+
+@pytest.fixture
+def owner(app, signup):
+    _, user_id = signup()
+    return user_id
+
+
+def new_website(owner):
+    from src.models.website import Website
+    return Website('Site', {'hero': 'Hello', 'about': 'About us'}, owner, 'Bakery', 'Retail').save()
+
+
+def edit(website, revision):
+    website.title = f'Site {revision}'
+    website.content = dict(website.content, hero=f'Hello {revision}')
+    if revision % 3 == 0:
+        website.content.pop('about', None)
+    return website.save()
+
+
+def state(website):
+    return flatten_state(website.title, website.content, website.business_type, website.industry)
+
+
+def test_flatten_round_trip_and_deltas():
+    old = flatten_state('Site', {'hero': 'Hi', 'about': 'Us'}, 'Bakery', None)
+    new = flatten_state('Site 2', {'hero': 'Hi'}, 'Bakery', 'Retail')
+    delta = diff_states(old, new)
+    assert delta == {'set': {'title': 'Site 2', 'industry': 'Retail'}, 'unset': ['content.about']}
+    assert apply_delta(old, delta) == new
+    assert unflatten_state(new) == {'title': 'Site 2', 'content': {'hero': 'Hi'},
+                                    'business_type': 'Bakery', 'industry': 'Retail'}
+
+
+def test_every_revision_is_rebuilt(owner, monkeypatch):
+    monkeypatch.setenv('REVISION_SNAPSHOT_INTERVAL', '4')
+    website = new_website(owner)
+    states = {1: state(website)}
+    for revision in range(2, 12):
+        states[revision] = state(edit(website, revision))
+
+    for revision, expected in states.items():
+        WebsiteRevision.forget(website.id)  # replay from the table, not the cache
+        assert WebsiteRevision.state_at(website.id, revision) == expected
+
+    kinds = {row['revision']: row['kind'] for row in WebsiteRevision.find_by_website_id(website.id)}
+    assert [revision for revision, kind in sorted(kinds.items()) if kind == 'snapshot'] == [1, 5, 9]
+
+
+def test_unchanged_save_records_nothing(owner):
+    website = new_website(owner)
+    website.save()
+    assert [row['revision'] for row in WebsiteRevision.find_by_website_id(website.id)] == [1]
+    assert website.version == 2
+    assert WebsiteRevision.state_at_version(website.id, 2) == state(website)
+
+
+def test_diff_between_revisions(owner):
+    website = new_website(owner)
+    edit(website, 2)
+    assert WebsiteRevision.diff(website.id, 2, 1) == {'set': {'title': 'Site 2', 'content.hero': 'Hello 2'}}
+    assert WebsiteRevision.diff(website.id, 2, 99) is None
+
+
+def test_retention_drops_old_revisions_and_keeps_the_rest_readable(owner, monkeypatch):
+    monkeypatch.setenv('REVISION_RETENTION', '5')
+    monkeypatch.setenv('REVISION_SNAPSHOT_INTERVAL', '3')
+    website = new_website(owner)
+    states = {1: state(website)}
+    for revision in range(2, 21):
+        states[revision] = state(edit(website, revision))
+
+    rows = WebsiteRevision.find_by_website_id(website.id)
+    kept = sorted(row['revision'] for row in rows)
+    # Compaction runs every snapshot interval once past retention
+    assert 5 <= len(kept) < 5 + 3
+    assert kept[-1] == 20
+    assert {row['revision']: row['kind'] for row in rows}[kept[0]] == 'snapshot'
+
+    WebsiteRevision.forget(website.id)
+    for revision in range(1, kept[0]):
+        assert WebsiteRevision.state_at(website.id, revision) is None
+        assert WebsiteRevision.state_at_version(website.id, revision) is None
+    for revision in kept:
+        assert WebsiteRevision.state_at(website.id, revision) == states[revision]
+        assert WebsiteRevision.state_at_version(website.id, revision) == states[revision]
+
+
+def test_deleting_a_website_drops_its_history(owner):
+    website = new_website(owner)
+    edit(website, 2)
+    website_id = website.id
+    website.delete()
+    assert WebsiteRevision.find_by_website_id(website_id) == []
+    assert WebsiteRevision.state_at(website_id, 1) is None
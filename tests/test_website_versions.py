@@ -0,0 +1,69 @@
+"""Optimistic concurrency on ``PUT /api/websites/<id>`` with a ``version``."""
+
+
+def put(client, website_id, headers, **body):
+    response = client.put(f'/api/websites/{website_id}', json=body, headers=headers)
+    return response.status_code, response.get_json()
+
+
+def test_current_version_saves(client, website):
+    site, headers = website
+    status, body = put(client, site['id'], headers, title='New', version=site['version'])
+    assert status == 200
+    assert body['website']['version'] == site['version'] + 1
+
+
+def test_stale_version_with_disjoint_edits_is_merged(client, website):
+    site, headers = website
+    status, _ = put(client, site['id'], headers, title='Theirs', version=site['version'])
+    assert status == 200
+
+    content = dict(site['content'], hero='Mine')
+    status, body = put(client, site['id'], headers, content=content, version=site['version'])
+    assert status == 200
+    assert body['website']['title'] == 'Theirs'
+    assert body['website']['content']['hero'] == 'Mine'
+    assert body['website']['content']['about'] == site['content']['about']
+    assert body['website']['version'] == site['version'] + 2
+
+
+def test_stale_version_with_overlapping_edits_conflicts(client, website):
+    site, headers = website
+    put(client, site['id'], headers, title='Theirs', version=site['version'])
+
+    status, body = put(client, site['id'], headers, title='Mine', version=site['version'])
+    assert status == 409
+    assert body['current_version'] == site['version'] + 1
+    _, stored = put(client, site['id'], headers)
+    assert stored['website']['title'] == 'Theirs'
+
+
+def test_stale_version_after_a_save_that_changed_nothing(client, website):
+    site, headers = website
+    _, body = put(client, site['id'], headers, title=site['title'], version=site['version'])
+    unchanged = body['website']['version']
+    put(client, site['id'], headers, industry='Hospitality', version=unchanged)
+
+    status, body = put(client, site['id'], headers, title='Mine', version=unchanged)
+    assert status == 200
+    assert (body['website']['title'], body['website']['industry']) == ('Mine', 'Hospitality')
+
+
+def test_stale_version_no_longer_kept_conflicts(client, website, monkeypatch):
+    monkeypatch.setenv('REVISION_RETENTION', '1')
+    monkeypatch.setenv('REVISION_SNAPSHOT_INTERVAL', '1')
+    site, headers = website
+    version = site['version']
+    for industry in ('One', 'Two', 'Three'):
+        _, body = put(client, site['id'], headers, industry=industry, version=version)
+        version = body['website']['version']
+
+    status, body = put(client, site['id'], headers, title='Mine', version=site['version'])
+    assert status == 409
+    assert body['current_version'] == version
+
+
+def test_unknown_future_version_conflicts(client, website):
+    site, headers = website
+    status, _ = put(client, site['id'], headers, title='Mine', version=site['version'] + 5)
+    assert status == 409